@@ -0,0 +1,86 @@
+"""
+Costo de la persistencia del motor en memoria (data/persistencia.py):
+- escritura: pedidos creados por segundo sin persistencia, con fsync en
+  grupo y con fsync en cada escritura;
+- arranque: tiempo de recuperar N registros desde snapshot y desde journal.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_persistencia
+    python -m benchmarks.bench_persistencia -n 50000
+"""
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from data.memoria import MemoriaAlmacen
+from benchmarks.datos import doc_pedido
+
+
+def _pedido(i: int) -> dict:
+    doc = doc_pedido(i)
+    del doc["_id"]
+    doc["usuario_id"] = i % 100
+    return doc
+
+
+async def escribir(almacen: MemoriaAlmacen, n: int) -> float:
+    """Pedidos por segundo creando n pedidos."""
+    docs = [_pedido(i) for i in range(n)]
+    inicio = time.perf_counter()
+    for doc in docs:
+        await almacen.pedidos.crear(doc)
+    if almacen.persistencia is not None:
+        almacen.persistencia.sincronizar()
+    return n / (time.perf_counter() - inicio)
+
+
+async def bench_escritura(n: int) -> None:
+    casos = [("sin persistencia", None), ("fsync en grupo (20 ms)", 20), ("fsync por escritura", 0)]
+    for nombre, fsync_ms in casos:
+        directorio = tempfile.mkdtemp(prefix="doggys-bench-") if fsync_ms is not None else None
+        almacen = MemoriaAlmacen(directorio, fsync_ms=fsync_ms or 0, snapshot_cada=10**9)
+        await almacen.iniciar()
+        # fsync por escritura es lento: se mide con menos pedidos
+        ops = await escribir(almacen, n if fsync_ms != 0 else max(100, n // 50))
+        await almacen.cerrar()
+        if directorio:
+            shutil.rmtree(directorio)
+        print(f"escritura {nombre:<24} {ops:>12,.0f} pedidos/s")
+
+
+async def bench_arranque(n: int) -> None:
+    directorio = tempfile.mkdtemp(prefix="doggys-bench-")
+    try:
+        # 1. Todo en el journal (caída sin cierre ordenado)
+        almacen = MemoriaAlmacen(directorio, fsync_ms=20, snapshot_cada=10**9)
+        await almacen.iniciar()
+        await escribir(almacen, n)
+        almacen.persistencia._detener.set()
+        almacen.persistencia._liberar_directorio()  # lo haría el sistema al morir el proceso
+
+        recuperado = MemoriaAlmacen(directorio, snapshot_cada=10**9)
+        stats = recuperado.persistencia.abrir()
+        print(f"arranque desde journal   {n:>8} pedidos en {stats['segundos'] * 1000:>9.1f} ms")
+
+        # 2. Todo en el snapshot (después de un cierre ordenado)
+        recuperado.persistencia.cerrar()
+        recuperado = MemoriaAlmacen(directorio)
+        stats = recuperado.persistencia.abrir()
+        print(f"arranque desde snapshot  {n:>8} pedidos en {stats['segundos'] * 1000:>9.1f} ms")
+        recuperado.persistencia.cerrar()
+    finally:
+        shutil.rmtree(directorio)
+
+
+def main_bench() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de persistencia del motor en memoria")
+    parser.add_argument("-n", type=int, default=20_000, help="pedidos a escribir / recuperar")
+    args = parser.parse_args()
+    asyncio.run(bench_escritura(args.n))
+    asyncio.run(bench_arranque(args.n))
+
+
+if __name__ == "__main__":
+    main_bench()
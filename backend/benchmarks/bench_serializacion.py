@@ -0,0 +1,59 @@
+"""
+Compara la serialización normal (modelos Pydantic + response_model) con la
+ruta rápida de services/serializacion.py sobre documentos de pedidos y
+productos como los que devuelve Mongo.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_serializacion
+"""
+import json
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+import main
+from services import serializacion
+from benchmarks.datos import doc_pedido, doc_producto
+
+
+def ruta_pydantic(docs, convertir, adapter) -> bytes:
+    # Lo que hace el endpoint + FastAPI: construir modelos, revalidar contra
+    # response_model y luego codificar a JSON.
+    modelos = [convertir(doc) for doc in docs]
+    validados = adapter.validate_python(modelos, from_attributes=True)
+    return json.dumps(adapter.dump_python(validados, mode="json")).encode("utf-8")
+
+
+def ruta_rapida(docs, convertir) -> bytes:
+    return serializacion.dumps([convertir(doc) for doc in docs])
+
+
+def medir(fn, repeticiones: int) -> float:
+    """Mejor tiempo (s) de varias repeticiones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main_bench(n_docs: int = 2000, repeticiones: int = 15) -> None:
+    casos = [
+        ("/pedidos", [doc_pedido(i) for i in range(n_docs)], main.pedido_doc_to_out,
+         serializacion.pedido_doc_a_dict, TypeAdapter(List[main.PedidoOut])),
+        ("/productos", [doc_producto(i) for i in range(n_docs)], main.producto_doc_to_out,
+         serializacion.producto_doc_a_dict, TypeAdapter(List[main.ProductoOut])),
+    ]
+    for nombre, docs, conv_pyd, conv_rapido, adapter in casos:
+        t_pyd = medir(lambda: ruta_pydantic(docs, conv_pyd, adapter), repeticiones)
+        t_rap = medir(lambda: ruta_rapida(docs, conv_rapido), repeticiones)
+        print(
+            f"{nombre:<11} {n_docs} docs | pydantic: {n_docs / t_pyd:>10,.0f} docs/s"
+            f" | rápida: {n_docs / t_rap:>10,.0f} docs/s | x{t_pyd / t_rap:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,102 @@
+"""
+Escalamiento con varios workers: levanta `uvicorn main:app --workers N` para
+N = 1, 2 y 4 y mide peticiones por segundo con varios procesos cliente.
+
+A diferencia de suite.py, aquí hay red (localhost) y procesos reales, así
+que el resultado depende de los núcleos disponibles: con C núcleos se espera
+una mejora casi lineal hasta N = C (los clientes también ocupan CPU).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --segundos 10
+    python -m benchmarks.bench_workers --almacen mongo      # usa MONGODB_URI
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+
+import httpx
+
+PUERTO = 8765
+
+
+def _esperar_listo(url: str, proceso: subprocess.Popen, limite: float = 60) -> None:
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise SystemExit(f"uvicorn terminó con código {proceso.returncode}")
+        try:
+            if httpx.get(f"{url}/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("El servidor no quedó listo a tiempo")
+
+
+async def _cargar(url: str, ruta: str, conexiones: int, segundos: float) -> int:
+    completadas = 0
+    fin = time.monotonic() + segundos
+
+    async def cliente(http: httpx.AsyncClient):
+        nonlocal completadas
+        while time.monotonic() < fin:
+            r = await http.get(ruta)
+            r.raise_for_status()
+            completadas += 1
+
+    limites = httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as http:
+        await asyncio.gather(*(cliente(http) for _ in range(conexiones)))
+    return completadas
+
+
+def _proceso_cliente(args) -> int:
+    return asyncio.run(_cargar(*args))
+
+
+def medir(workers: int, args) -> float:
+    url = f"http://127.0.0.1:{PUERTO}"
+    entorno = {**os.environ, "ALMACENAMIENTO": args.almacen, "WEB_CONCURRENCY": str(workers)}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PUERTO), "--log-level", "warning"],
+        env=entorno, stdout=subprocess.DEVNULL,
+    )
+    try:
+        _esperar_listo(url, servidor)
+        time.sleep(1)  # /ready lo contestó un worker; se da tiempo al resto
+        with multiprocessing.Pool(args.clientes) as pool:
+            pool.map(_proceso_cliente, [(url, args.ruta, args.conexiones, 1)] * args.clientes)  # calentamiento
+            inicio = time.perf_counter()
+            totales = pool.map(_proceso_cliente, [(url, args.ruta, args.conexiones, args.segundos)] * args.clientes)
+            return sum(totales) / (time.perf_counter() - inicio)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def main_bench() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de throughput con varios workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--almacen", choices=["memoria", "mongo"], default="memoria",
+                        help="memoria: cada worker con sus datos semilla (solo lectura)")
+    parser.add_argument("--ruta", default="/productos")
+    parser.add_argument("--clientes", type=int, default=4, help="procesos que generan carga")
+    parser.add_argument("--conexiones", type=int, default=16, help="conexiones por proceso cliente")
+    parser.add_argument("--segundos", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} núcleos, GET {args.ruta}, {args.clientes}x{args.conexiones} conexiones")
+    base = None
+    for workers in args.workers:
+        rps = medir(workers, args)
+        base = base or rps
+        print(f"workers={workers:<3} {rps:>10,.0f} req/s   x{rps / base:.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
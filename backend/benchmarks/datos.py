@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+
+# Documentos con la forma que tienen en Mongo, para alimentar los benchmarks.
+
+
+def doc_producto(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "nombre": f"Completo {i}",
+        "descripcion": "Palta, tomate y mayo casera",
+        "precio": 2800.0,
+        "stock": 120,
+        "img": "completo1.jpg",
+        "disponible": True,
+    }
+
+
+def doc_pedido(i: int, n_items: int = 4, productos: Optional[list] = None) -> dict:
+    """productos: ids del catálogo a usar (por defecto, ids nuevos en cada ítem)."""
+    items = [
+        {
+            "producto_id": productos[(i + j) % len(productos)] if productos else ObjectId(),
+            "nombre": f"Hot Dog {j}",
+            "cantidad": 2,
+            "precio_unitario": 2500.0,
+            "subtotal": 5000.0,
+        }
+        for j in range(n_items)
+    ]
+    return {
+        "_id": ObjectId(),
+        "usuario_id": ObjectId(),
+        "items": items,
+        "estado": "pagado",
+        "total": 5000.0 * n_items,
+        "fecha": datetime.now().isoformat(),
+    }
@@ -0,0 +1,43 @@
+import main
+from data.mongo import MongoAlmacen
+from data.memoria import MemoriaAlmacen
+
+# Reemplazo en memoria de MongoDB para correr la API sin base de datos.
+# Usa mongomock-motor (ver benchmarks/requirements.txt) y reemplaza el
+# almacenamiento de main.py sin pasar por el lifespan.
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+    import mongomock.collection as _mongomock_collection
+except ImportError:  # dependencia solo de benchmarks
+    AsyncMongoMockClient = None
+
+
+def _compatibilidad_pymongo() -> None:
+    # pymongo >= 4.11 envía "sort" en UpdateOne y mongomock aún no lo acepta.
+    builder = _mongomock_collection.BulkOperationBuilder
+    if getattr(builder.add_update, "_acepta_sort", False):
+        return
+    original = builder.add_update
+
+    def add_update(self, *args, sort=None, **kwargs):
+        return original(self, *args, **kwargs)
+
+    add_update._acepta_sort = True
+    builder.add_update = add_update
+
+
+def conectar_memoria(motor: str = "mongomock", db_name: str = "DoggysBench"):
+    """
+    Reemplaza el almacenamiento de main.py y lo devuelve.
+    motor: "mongomock" (MongoAlmacen sobre mongomock) o "memoria" (MemoriaAlmacen).
+    """
+    if motor == "memoria":
+        main.almacen = MemoriaAlmacen()
+    else:
+        if AsyncMongoMockClient is None:
+            raise SystemExit("Falta mongomock-motor: pip install -r benchmarks/requirements.txt")
+        _compatibilidad_pymongo()
+        main.almacen = MongoAlmacen(main.MONGODB_URI, db_name, client=AsyncMongoMockClient())
+    main.catalogo_cache.invalidar()
+    return main.almacen
@@ -0,0 +1,243 @@
+"""
+Suite de microbenchmarks de las funciones y endpoints más usados.
+
+Los endpoints se ejecutan en proceso (cliente ASGI) contra una base MongoDB
+en memoria (mongomock) o el motor en memoria (--almacen memoria), así que los
+números miden el código de la API y no la red.
+Los resultados se guardan en JSON y se pueden comparar con un baseline.
+
+Uso (desde backend/):
+    python -m benchmarks.suite                          # corre y muestra resultados
+    python -m benchmarks.suite --salida resultados.json
+    python -m benchmarks.suite --comparar benchmarks/baseline.json --umbral 0.4
+    python -m benchmarks.suite --guardar-baseline
+    python -m benchmarks.suite --almacen memoria
+"""
+import gc
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+import main
+from models.pedido import DetallePedido
+from models.producto import ProductoIn
+from data.db import db_productos
+from services.pedido_service import calcular_total
+from benchmarks.datos import doc_pedido, doc_producto
+from benchmarks.mongo_memoria import conectar_memoria
+
+BASELINE = Path(__file__).with_name("baseline.json")
+LOTE_DOCS = 100  # documentos convertidos por operación en los conversores
+
+
+def resumir(tiempos: list) -> dict:
+    """Estadísticas de una lista de duraciones (segundos) por operación."""
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+    media = statistics.fmean(ordenados)
+    return {
+        "n": len(ordenados),
+        "ops_s": round(1 / media, 2),
+        "media_ms": round(media * 1000, 6),
+        "p50_ms": round(statistics.median(ordenados) * 1000, 6),
+        "p95_ms": round(p95 * 1000, 6),
+    }
+
+
+@contextmanager
+def sin_gc():
+    """Sin pausas del recolector dentro de las mediciones (el ruido no es del código medido)."""
+    gc.collect()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def medir(fn, n: int, calentamiento: int = 3) -> dict:
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    with sin_gc():
+        for _ in range(n):
+            inicio = time.perf_counter()
+            fn()
+            tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos)
+
+
+async def medir_async(fn, n: int, calentamiento: int = 3) -> dict:
+    for _ in range(calentamiento):
+        await fn()
+    tiempos = []
+    with sin_gc():
+        for _ in range(n):
+            inicio = time.perf_counter()
+            await fn()
+            tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos)
+
+
+# ---------------------------------------------------------
+# Funciones
+# ---------------------------------------------------------
+def bench_funciones(n: int) -> dict:
+    resultados = {}
+
+    pedidos = [doc_pedido(i) for i in range(LOTE_DOCS)]
+    productos = [doc_producto(i) for i in range(LOTE_DOCS)]
+    resultados[f"pedido_doc_to_out x{LOTE_DOCS}"] = medir(
+        lambda: [main.pedido_doc_to_out(d) for d in pedidos], n
+    )
+    resultados[f"producto_doc_to_out x{LOTE_DOCS}"] = medir(
+        lambda: [main.producto_doc_to_out(d) for d in productos], n
+    )
+
+    # calcular_total trabaja sobre el almacenamiento en memoria (data/db.py)
+    for pid in range(1, 11):
+        db_productos[pid] = ProductoIn(nombre=f"Producto {pid}", precio=2500.0, stock_actual=100)
+    items = [DetallePedido(producto_id=i % 10 + 1, cantidad=2) for i in range(8)]
+    resultados[f"calcular_total 8 items x{LOTE_DOCS}"] = medir(
+        lambda: [calcular_total(items) for _ in range(LOTE_DOCS)], n
+    )
+
+    # Lo que agrega la autenticación a cada petición protegida (sin I/O)
+    token = main.tokens.emitir("0" * 24, True)
+    resultados[f"verificar token de acceso x{LOTE_DOCS}"] = medir(
+        lambda: [main.tokens.verificar(token) for _ in range(LOTE_DOCS)], n
+    )
+
+    # bcrypt es lento a propósito: pocas repeticiones al costo configurado
+    rondas = max(3, n // 100)
+    hashed = main.get_password_hash("admin123")
+    resultados[f"get_password_hash (costo {main.BCRYPT_ROUNDS})"] = medir(
+        lambda: main.get_password_hash("admin123"), rondas, calentamiento=1
+    )
+    resultados[f"verify_password (costo {main.BCRYPT_ROUNDS})"] = medir(
+        lambda: main.verify_password("admin123", hashed), rondas, calentamiento=1
+    )
+    return resultados
+
+
+# ---------------------------------------------------------
+# Endpoints (en proceso, almacenamiento en memoria)
+# ---------------------------------------------------------
+async def bench_endpoints(n: int, motor: str = "mongomock") -> dict:
+    almacen = conectar_memoria(motor)
+    productos = await almacen.productos.crear_varios(
+        [{**doc_producto(i), "stock": 10**9} for i in range(20)]
+    )
+    prod_ids = [str(doc["_id"]) for doc in productos]
+    usuario = await almacen.usuarios.crear(
+        {"nombre": "Bench", "email": "bench@doggys.com", "password": "x", "is_admin": False}
+    )
+    # Pedidos del mismo catálogo, como en la tienda: ventas_diarias queda con
+    # una fila por producto y no con una por ítem (mongomock no usa índices y
+    # recorrería miles de filas en cada pago)
+    catalogo = [doc["_id"] for doc in productos]
+    for i in range(500):
+        await almacen.pedidos.crear({**doc_pedido(i, productos=catalogo), "usuario_id": usuario["_id"]})
+
+    # Los endpoints de pedidos piden sesión: el cliente dueño de los pedidos
+    sesion = {"Authorization": f"Bearer {main.tokens.emitir(str(usuario['_id']), False)}"}
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", headers=sesion) as cliente:
+        payload = {
+            "usuario_id": str(usuario["_id"]),
+            "items": [{"producto_id": pid, "cantidad": 1} for pid in prod_ids[:3]],
+        }
+
+        async def crear():
+            res = await cliente.post("/pedidos", json=payload)
+            res.raise_for_status()
+            return res.json()["id"]
+
+        resultados = {}
+        resultados["GET /productos"] = await medir_async(lambda: cliente.get("/productos"), n)
+        resultados["GET /pedidos?limit=50"] = await medir_async(lambda: cliente.get("/pedidos?limit=50"), n)
+        resultados["POST /pedidos (3 items)"] = await medir_async(crear, n)
+
+        # Cada PATCH paga un pedido distinto, creado antes de medir
+        pendientes = [await crear() for _ in range(n + 3)]
+
+        async def pagar():
+            res = await cliente.patch(f"/pedidos/{pendientes.pop()}/estado?nuevo_estado=pagado")
+            res.raise_for_status()
+
+        resultados["PATCH /pedidos/{id}/estado pagado"] = await medir_async(pagar, n)
+    return resultados
+
+
+# ---------------------------------------------------------
+# Baseline
+# ---------------------------------------------------------
+def comparar(actual: dict, baseline: dict, umbral: float) -> list:
+    """Devuelve los benchmarks cuyo p50 empeoró más que el umbral (ej: 0.25 = 25%)."""
+    regresiones = []
+    print(f"\n{'benchmark':<42} {'base p50':>10} {'actual p50':>11} {'cambio':>8}")
+    for nombre, base in baseline["resultados"].items():
+        if nombre not in actual:
+            continue
+        cambio = actual[nombre]["p50_ms"] / base["p50_ms"] - 1
+        marca = ""
+        if cambio > umbral:
+            regresiones.append(nombre)
+            marca = "  <-- regresión"
+        print(f"{nombre:<42} {base['p50_ms']:>9.3f}ms {actual[nombre]['p50_ms']:>9.3f}ms {cambio:>+7.0%}{marca}")
+    return regresiones
+
+
+def main_suite() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de Doggy's")
+    parser.add_argument("-n", type=int, default=200, help="repeticiones por benchmark")
+    parser.add_argument("--salida", type=Path, help="archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, help="baseline JSON contra el que comparar")
+    parser.add_argument("--umbral", type=float, default=0.4, help="empeoramiento tolerado del p50 (0.4 = 40%%)")
+    parser.add_argument("--almacen", choices=["mongomock", "memoria"], default="mongomock",
+                        help="motor de almacenamiento para los endpoints")
+    parser.add_argument("--guardar-baseline", action="store_true", help=f"escribe {BASELINE.name}")
+    args = parser.parse_args()
+
+    resultados = bench_funciones(args.n)
+    resultados.update(asyncio.run(bench_endpoints(args.n, args.almacen)))
+
+    for nombre, r in resultados.items():
+        print(f"{nombre:<42} {r['ops_s']:>12,.1f} ops/s  p50 {r['p50_ms']:>9.3f}ms  p95 {r['p95_ms']:>9.3f}ms")
+
+    informe = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "bcrypt_rounds": main.BCRYPT_ROUNDS,
+            "almacen": args.almacen,
+            "n": args.n,
+        },
+        "resultados": resultados,
+    }
+    if args.salida:
+        args.salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+    if args.guardar_baseline:
+        BASELINE.write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+
+    if args.comparar:
+        regresiones = comparar(resultados, json.loads(args.comparar.read_text()), args.umbral)
+        if regresiones:
+            print(f"\n❌ {len(regresiones)} regresión(es) sobre el {args.umbral:.0%} tolerado")
+            return 1
+        print("\n✅ Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_suite())
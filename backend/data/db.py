@@ -1,17 +1,234 @@
-from typing import Any, Dict
-from itertools import count
+import threading
+from typing import Any, Dict, Iterable, List, Set
+from itertools import count, islice
 
 # Simulación de base de datos en memoria.
-# Se almacenan instancias de modelos Pydantic (ProductoIn, UsuarioIn, PedidoIn, Boleta).
+# Cada Tabla guarda sus registros por id, la secuencia que genera los ids y
+# sus índices secundarios. Las tablas de este módulo almacenan instancias de
+# modelos Pydantic (ProductoIn, UsuarioIn, PedidoIn, Boleta) y las usan
+# routers/ y services/. El motor en memoria de la API (data/memoria.py) crea
+# sus propias tablas con documentos (dicts).
+#
+# Los índices (y el journal, si la tabla es persistente, ver
+# data/persistencia.py) se mantienen solos al asignar o borrar en tabla.filas
+# (filas[id] = registro, del filas[id], pop). Si un registro se modifica en
+# el lugar hay que llamar tabla.guardar(id).
 
-db_productos: Dict[int, Any] = {}
-seq_productos = count(start=1)
 
-db_usuarios: Dict[int, Any] = {}
-seq_usuarios = count(start=1)
+def _leer(registro, campo: str):
+    return registro[campo] if isinstance(registro, dict) else getattr(registro, campo)
 
-db_pedidos: Dict[int, Any] = {}
-seq_pedidos = count(start=1)
 
-db_boletas: Dict[int, Any] = {}
-seq_boletas = count(start=1)
+class IndiceHash:
+    """valor del campo -> ids de los registros con ese valor (búsqueda O(1))."""
+
+    def __init__(self, campo: str):
+        self.campo = campo
+        self._ids: Dict[Any, Set[int]] = {}
+        self._valor: Dict[int, Any] = {}
+
+    def agregar(self, rid: int, registro) -> None:
+        valor = _leer(registro, self.campo)
+        self._valor[rid] = valor
+        self._ids.setdefault(valor, set()).add(rid)
+
+    def quitar(self, rid: int) -> None:
+        if rid not in self._valor:
+            return
+        valor = self._valor.pop(rid)
+        ids = self._ids[valor]
+        ids.discard(rid)
+        if not ids:
+            del self._ids[valor]
+
+    def limpiar(self) -> None:
+        self._ids.clear()
+        self._valor.clear()
+
+    def buscar(self, valor) -> Set[int]:
+        """Ids con ese valor. El set es del índice: no modificarlo."""
+        return self._ids.get(valor, set())
+
+    def primero(self, valor):
+        """Id más antiguo con ese valor, o None."""
+        ids = self._ids.get(valor)
+        return min(ids) if ids else None
+
+
+def _trigramas(texto: str) -> Set[str]:
+    return {texto[i : i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceTexto:
+    """
+    Índice de trigramas para "el campo contiene q" sin distinguir mayúsculas.
+    Los candidatos salen de intersectar los trigramas de q y solo esos se
+    verifican; con q de menos de 3 letras se revisan los textos ya en minúscula.
+    """
+
+    def __init__(self, campo: str):
+        self.campo = campo
+        self._texto: Dict[int, str] = {}
+        self._trigramas: Dict[str, Set[int]] = {}
+
+    def agregar(self, rid: int, registro) -> None:
+        texto = str(_leer(registro, self.campo)).lower()
+        self._texto[rid] = texto
+        for tri in _trigramas(texto):
+            self._trigramas.setdefault(tri, set()).add(rid)
+
+    def quitar(self, rid: int) -> None:
+        texto = self._texto.pop(rid, None)
+        if texto is None:
+            return
+        for tri in _trigramas(texto):
+            ids = self._trigramas[tri]
+            ids.discard(rid)
+            if not ids:
+                del self._trigramas[tri]
+
+    def limpiar(self) -> None:
+        self._texto.clear()
+        self._trigramas.clear()
+
+    def buscar(self, q: str) -> List[int]:
+        """Ids cuyo campo contiene q, en orden de id (orden de inserción)."""
+        q = q.lower()
+        trigramas = _trigramas(q)
+        if trigramas:
+            grupos = sorted((self._trigramas.get(tri, set()) for tri in trigramas), key=len)
+            candidatos: Iterable[int] = set.intersection(*grupos) if grupos[0] else ()
+        else:
+            candidatos = self._texto
+        return sorted(rid for rid in candidatos if q in self._texto[rid])
+
+
+class Secuencia:
+    """Como itertools.count(1), pero recuerda el último id entregado."""
+
+    def __init__(self):
+        self._contador = count(start=1)
+        self.ultimo = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> int:
+        self.ultimo = next(self._contador)
+        return self.ultimo
+
+    def avanzar(self, ultimo: int) -> None:
+        """Continúa después de ultimo (al recuperar desde disco)."""
+        if ultimo > self.ultimo:
+            self.ultimo = ultimo
+            self._contador = count(start=ultimo + 1)
+
+
+class Filas(dict):
+    """Dict de registros que mantiene los índices (y el journal) de su tabla."""
+
+    def __init__(self, tabla: "Tabla"):
+        super().__init__()
+        self._tabla = tabla
+
+    def __setitem__(self, rid, registro) -> None:
+        tabla = self._tabla
+        with tabla.candado:
+            if rid in self:
+                tabla._quitar_de_indices(rid)
+            super().__setitem__(rid, registro)
+            tabla._agregar_a_indices(rid, registro)
+            if tabla.persistencia is not None:
+                tabla.persistencia.registrar(("set", tabla.nombre, rid, registro, tabla.seq.ultimo))
+
+    def __delitem__(self, rid) -> None:
+        tabla = self._tabla
+        with tabla.candado:
+            super().__delitem__(rid)
+            tabla._quitar_de_indices(rid)
+            if tabla.persistencia is not None:
+                tabla.persistencia.registrar(("del", tabla.nombre, rid))
+
+    def pop(self, rid, *default):
+        with self._tabla.candado:
+            if rid in self:
+                registro = self[rid]
+                del self[rid]
+                return registro
+            return super().pop(rid, *default)
+
+    def update(self, *args, **kwargs) -> None:
+        for rid, registro in dict(*args, **kwargs).items():
+            self[rid] = registro
+
+    def clear(self) -> None:
+        tabla = self._tabla
+        with tabla.candado:
+            super().clear()
+            for indice in tabla.indices.values():
+                indice.limpiar()
+            if tabla.persistencia is not None:
+                tabla.persistencia.registrar(("clear", tabla.nombre))
+
+
+class Tabla:
+    def __init__(self, **indices):
+        self.indices: Dict[str, Any] = indices
+        self.filas: Dict[int, Any] = Filas(self)
+        self.seq = Secuencia()
+        self.candado = threading.RLock()
+        self.persistencia = None  # data.persistencia.Persistencia
+        self.nombre = None
+
+    def nuevo_id(self) -> int:
+        return next(self.seq)
+
+    def persistir(self, persistencia, nombre) -> None:
+        """Engancha (o desengancha, con None) la tabla a un journal."""
+        self.persistencia = persistencia
+        self.nombre = nombre
+        if persistencia is not None:
+            self.candado = persistencia.candado
+
+    def guardar(self, rid: int) -> None:
+        """Registra un registro modificado en el lugar (índices y journal)."""
+        if rid in self.filas:
+            self.filas[rid] = self.filas[rid]
+
+    def _agregar_a_indices(self, rid: int, registro) -> None:
+        for indice in self.indices.values():
+            indice.agregar(rid, registro)
+
+    def _quitar_de_indices(self, rid: int) -> None:
+        for indice in self.indices.values():
+            indice.quitar(rid)
+
+    def pagina(self, skip: int, limit: int, q: str | None = None, campo: str = "nombre") -> List[int]:
+        """
+        Ids de una página, filtrando por "campo contiene q" con su IndiceTexto.
+        Solo devuelve ids: cada endpoint materializa únicamente lo que responde.
+        """
+        if q is None:
+            return list(islice(self.filas, skip, skip + limit))
+        return self.indices[campo].buscar(q)[skip : skip + limit]
+
+
+productos = Tabla(nombre=IndiceTexto("nombre"))
+db_productos = productos.filas
+seq_productos = productos.seq
+
+usuarios = Tabla(email=IndiceHash("email"), nombre=IndiceTexto("nombre"))
+db_usuarios = usuarios.filas
+seq_usuarios = usuarios.seq
+
+pedidos = Tabla(usuario_id=IndiceHash("usuario_id"))
+db_pedidos = pedidos.filas
+seq_pedidos = pedidos.seq
+
+boletas = Tabla()
+db_boletas = boletas.filas
+seq_boletas = boletas.seq
+
+# Para persistir las tablas de este módulo:
+#     Persistencia(directorio, tablas).abrir()
+tablas = {"productos": productos, "usuarios": usuarios, "pedidos": pedidos, "boletas": boletas}
@@ -0,0 +1,496 @@
+import re
+import heapq
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from data.db import IndiceHash, IndiceTexto, Tabla
+from data.persistencia import Persistencia
+from data.repositorio import (
+    Almacen, BoletasRepo, CandadosRepo, Duplicado, IdempotenciaRepo, IdInvalido, PedidosRepo, ProductosRepo, UsuariosRepo,
+    RevocacionesRepo, VentasRepo, VersionesRepo, agrupar_ventas, es_venta, lineas_venta, signo_venta,
+)
+from services.stock_service import StockInsuficienteError
+
+# Motor de almacenamiento en proceso.
+# Guarda documentos con la misma forma que en Mongo dentro de Tablas de
+# data/db.py, con ids enteros de sus secuencias. Todas las operaciones son
+# síncronas por dentro (no hay await entre leer y escribir), así que cada una
+# es atómica respecto de las demás peticiones del event loop.
+# Los documentos devueltos son los almacenados: no se deben modificar.
+# Los cambios hechos en el lugar se confirman con tabla.guardar(id) para
+# que lleguen a los índices y al journal.
+
+
+_ESPECIALES_REGEX = set(".^$*+?{}[]\\|()")
+
+
+def _es_literal(q: str) -> bool:
+    # Sin metacaracteres, "$regex q, i" equivale a "contiene q" (índice de texto)
+    return not any(c in _ESPECIALES_REGEX for c in q)
+
+
+def _patron(q: str):
+    try:
+        return re.compile(q, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(q), re.IGNORECASE)
+
+
+class MemoriaUsuarios(UsuariosRepo):
+    def __init__(self, tabla: Tabla):
+        self.tabla = tabla
+
+    def _email_en_uso(self, email: str, excepto=None) -> bool:
+        return any(uid != excepto for uid in self.tabla.indices["email"].buscar(email))
+
+    async def contar(self) -> int:
+        return len(self.tabla.filas)
+
+    async def crear(self, doc: dict) -> dict:
+        if self._email_en_uso(doc["email"]):
+            raise Duplicado("email")
+        doc["_id"] = self.tabla.nuevo_id()
+        self.tabla.filas[doc["_id"]] = dict(doc)
+        return doc
+
+    async def obtener(self, uid) -> Optional[dict]:
+        return self.tabla.filas.get(uid)
+
+    async def por_email(self, email: str) -> Optional[dict]:
+        uid = self.tabla.indices["email"].primero(email)
+        return self.tabla.filas[uid] if uid is not None else None
+
+    async def actualizar(self, uid, cambios: dict) -> Optional[dict]:
+        doc = self.tabla.filas.get(uid)
+        if doc is None:
+            return None
+        if "email" in cambios and self._email_en_uso(cambios["email"], excepto=uid):
+            raise Duplicado("email")
+        doc.update(cambios)
+        self.tabla.guardar(uid)
+        return doc
+
+
+class MemoriaProductos(ProductosRepo):
+    def __init__(self, tabla: Tabla):
+        self.tabla = tabla
+
+    async def contar(self) -> int:
+        return len(self.tabla.filas)
+
+    async def crear(self, doc: dict) -> dict:
+        doc["_id"] = self.tabla.nuevo_id()
+        self.tabla.filas[doc["_id"]] = dict(doc)
+        return doc
+
+    async def crear_varios(self, docs: List[dict]) -> List[dict]:
+        return [await self.crear(doc) for doc in docs]
+
+    async def listar(self, q: Optional[str], skip: int, limit: int) -> List[dict]:
+        filas = self.tabla.filas
+        if not q or _es_literal(q):
+            return [filas[pid] for pid in self.tabla.pagina(skip, limit, q or None)]
+        patron = _patron(q)
+        docs = (d for d in filas.values() if patron.search(d["nombre"]))
+        return list(islice(docs, skip, skip + limit))
+
+    async def obtener(self, pid) -> Optional[dict]:
+        return self.tabla.filas.get(pid)
+
+    async def obtener_varios(self, pids: list) -> Dict[Any, dict]:
+        filas = self.tabla.filas
+        return {pid: filas[pid] for pid in pids if pid in filas}
+
+    async def actualizar(self, pid, cambios: dict) -> Optional[dict]:
+        doc = self.tabla.filas.get(pid)
+        if doc is not None:
+            doc.update(cambios)
+            self.tabla.guardar(pid)
+        return doc
+
+    async def eliminar(self, pid) -> bool:
+        return self.tabla.filas.pop(pid, None) is not None
+
+    async def actualizar_varios(self, pids: list, cambios: dict) -> set:
+        encontrados = set()
+        for pid in pids:
+            if await self.actualizar(pid, cambios) is not None:
+                encontrados.add(pid)
+        return encontrados
+
+
+def _clave_orden(doc) -> tuple:
+    # Mismo orden que Mongo con sort (fecha -1, _id -1): sin fecha al final
+    fecha = doc.get("fecha")
+    return (fecha is not None, fecha or "", doc["_id"])
+
+
+class MemoriaPedidos(PedidosRepo):
+    def __init__(self, almacen: "MemoriaAlmacen"):
+        self.almacen = almacen
+        self.tabla = almacen.tablas["pedidos"]
+
+    async def crear(self, doc: dict) -> dict:
+        doc["_id"] = self.tabla.nuevo_id()
+        self.tabla.filas[doc["_id"]] = dict(doc)
+        if es_venta(doc.get("estado")):
+            self.almacen.ventas.sumar_lineas(doc, 1)
+        return doc
+
+    async def obtener(self, pid) -> Optional[dict]:
+        return self.tabla.filas.get(pid)
+
+    def _candidatos(self, usuario_id, despues: Optional[Tuple[Optional[str], Any]]):
+        filas = self.tabla.filas
+        if usuario_id is None:
+            docs = filas.values()
+        else:
+            docs = (filas[i] for i in self.tabla.indices["usuario_id"].buscar(usuario_id))
+        if despues is not None:
+            fecha, pid = despues
+            limite = (fecha is not None, fecha or "", pid)
+            docs = (d for d in docs if _clave_orden(d) < limite)
+        return docs
+
+    async def listar(self, usuario_id, despues, limit: int) -> List[dict]:
+        return heapq.nlargest(limit, self._candidatos(usuario_id, despues), key=_clave_orden)
+
+    async def iterar(self, usuario_id, despues):
+        for doc in sorted(self._candidatos(usuario_id, despues), key=_clave_orden, reverse=True):
+            yield doc
+
+    async def cambiar_estado(self, pid, nuevo_estado: str, estado_esperado=None) -> Optional[dict]:
+        if isinstance(estado_esperado, str):
+            estado_esperado = (estado_esperado,)
+        with self.tabla.candado:
+            doc = self.tabla.filas.get(pid)
+            if doc is None or (estado_esperado is not None and doc["estado"] not in estado_esperado):
+                return None
+            signo = signo_venta(doc["estado"], nuevo_estado)
+            doc["estado"] = nuevo_estado
+            self.tabla.guardar(pid)
+            if signo:
+                self.almacen.ventas.sumar_lineas(doc, signo)
+        return doc
+
+    async def cambiar_estado_varios(self, pids: list, nuevo_estado: str,
+                                    estados_origen: Optional[Collection[str]] = None) -> Tuple[List[dict], List[dict]]:
+        cambiados, sin_cambio = [], []
+        for pid in pids:
+            actual = self.tabla.filas.get(pid)
+            if actual is None:
+                continue
+            doc = None
+            if actual["estado"] != nuevo_estado:
+                doc = await self.cambiar_estado(pid, nuevo_estado, estados_origen)
+            if doc is not None:
+                cambiados.append(doc)
+            else:
+                sin_cambio.append(actual)  # se devuelve como está
+        return cambiados, sin_cambio
+
+    async def normalizar_estados(self, estados: Collection[str]) -> int:
+        por_minuscula = {e.lower(): e for e in estados}
+        cambiados = 0
+        with self.tabla.candado:
+            for pid, doc in self.tabla.filas.items():
+                estado = por_minuscula.get(str(doc.get("estado")).lower())
+                if estado is not None and doc["estado"] != estado:
+                    doc["estado"] = estado  # es_venta ya ignoraba mayúsculas: el rollup no cambia
+                    self.tabla.guardar(pid)
+                    cambiados += 1
+        return cambiados
+
+    async def cola(self, estados: List[str], limit: int) -> List[dict]:
+        indice = self.tabla.indices["estado"]
+        ids = set().union(*(indice.buscar(estado) for estado in estados))
+        return heapq.nsmallest(
+            limit, (self.tabla.filas[i] for i in ids), key=lambda d: (d.get("fecha") or "", d["_id"])
+        )
+
+    async def pagar(self, pid, estado_anterior: str, nuevo_estado: str, cantidades: Dict[Any, int]) -> dict:
+        doc = self.tabla.filas.get(pid)
+        if doc is None or doc["estado"] != estado_anterior:
+            raise HTTPException(status_code=409, detail="El pedido cambió de estado, intente nuevamente")
+
+        productos = self.almacen.tablas["productos"].filas
+        faltantes = []
+        for prod_id, cantidad in cantidades.items():
+            prod = productos.get(prod_id)
+            # Los productos que ya no existen se ignoran, igual que en Mongo
+            if prod is not None and prod.get("stock", 0) < cantidad:
+                faltantes.append(
+                    {
+                        "producto_id": str(prod_id),
+                        "nombre": prod.get("nombre", "Producto sin nombre"),
+                        "pedido": cantidad,
+                        "disponible": prod.get("stock", 0),
+                    }
+                )
+        if faltantes:
+            raise StockInsuficienteError(faltantes)
+
+        # Mismo candado que el journal: el stock y el estado quedan en el mismo grupo
+        tabla_productos = self.almacen.tablas["productos"]
+        with self.tabla.candado:
+            for prod_id, cantidad in cantidades.items():
+                if prod_id in productos:
+                    productos[prod_id]["stock"] = productos[prod_id].get("stock", 0) - cantidad
+                    tabla_productos.guardar(prod_id)
+            signo = signo_venta(doc["estado"], nuevo_estado)
+            doc["estado"] = nuevo_estado
+            self.tabla.guardar(pid)
+            if signo:
+                self.almacen.ventas.sumar_lineas(doc, signo)
+        return doc
+
+    async def detalle(self, pid) -> Optional[dict]:
+        doc = self.tabla.filas.get(pid)
+        if doc is None:
+            return None
+        usuario = self.almacen.tablas["usuarios"].filas.get(doc["usuario_id"])
+        productos = self.almacen.tablas["productos"].filas
+        ids = {item["producto_id"] for item in doc.get("items", [])}
+        boleta = self.almacen.boletas.por_pedido(pid)
+        return {
+            **doc,
+            "cliente": [{k: v for k, v in usuario.items() if k != "password"}] if usuario else [],
+            "productos": [productos[i] for i in ids if i in productos],
+            "boleta": [boleta] if boleta else [],
+        }
+
+    async def reporte_ventas(self, estados, desde, hasta, producto, agrupar) -> List[dict]:
+        patron = _patron(re.escape(producto)) if producto else None
+        grupos: Dict[tuple, dict] = {}
+        for doc in self.tabla.filas.values():
+            if doc["estado"] not in estados:
+                continue
+            fecha = doc.get("fecha", doc.get("fecha_pedido"))
+            if (desde or hasta) and fecha is None:
+                continue
+            if (desde and fecha < desde) or (hasta and fecha >= hasta):
+                continue
+            for item in doc.get("items", []):
+                nombre = item.get("nombre", "Producto sin nombre")
+                if patron and not patron.search(nombre):
+                    continue
+                prod_id = item["producto_id"] if agrupar in ("producto", "producto_dia") else None
+                dia = fecha[:10] if fecha and agrupar in ("dia", "producto_dia") else None
+                fila = grupos.setdefault(
+                    (prod_id, dia),
+                    {
+                        "producto": nombre if prod_id is not None else "Todos",
+                        "producto_id": prod_id,
+                        "fecha": dia,
+                        "cantidad": 0,
+                        "subtotal": 0.0,
+                    },
+                )
+                fila["cantidad"] += item["cantidad"]
+                fila["subtotal"] += item["subtotal"]
+        return sorted(grupos.values(), key=lambda f: (f["fecha"] or "", f["producto"]))
+
+
+class MemoriaBoletas(BoletasRepo):
+    def __init__(self, tabla: Tabla):
+        self.tabla = tabla
+
+    def por_pedido(self, pedido_id) -> Optional[dict]:
+        bid = self.tabla.indices["pedido_id"].primero(pedido_id)
+        return self.tabla.filas[bid] if bid is not None else None
+
+    async def crear(self, doc: dict) -> dict:
+        if self.tabla.indices["pedido_id"].buscar(doc["pedido_id"]):
+            raise Duplicado("pedido_id")
+        doc["_id"] = self.tabla.nuevo_id()
+        self.tabla.filas[doc["_id"]] = dict(doc)
+        return doc
+
+    async def obtener(self, bid) -> Optional[dict]:
+        return self.tabla.filas.get(bid)
+
+
+class MemoriaVentas(VentasRepo):
+    def __init__(self, tabla: Tabla, pedidos: Tabla):
+        self.tabla = tabla
+        self.pedidos = pedidos
+
+    def sumar_lineas(self, doc: dict, signo: int) -> None:
+        with self.tabla.candado:
+            for (dia, prod_id), linea in lineas_venta(doc).items():
+                rid = self.tabla.indices["clave"].primero((dia, prod_id))
+                if rid is None:
+                    rid = self.tabla.nuevo_id()
+                    self.tabla.filas[rid] = {
+                        "_id": rid, "clave": (dia, prod_id), "fecha": dia, "producto_id": prod_id,
+                        "cantidad": 0, "subtotal": 0.0,
+                    }
+                fila = self.tabla.filas[rid]
+                fila["producto"] = linea["producto"]
+                fila["cantidad"] += signo * linea["cantidad"]
+                fila["subtotal"] += signo * linea["subtotal"]
+                self.tabla.guardar(rid)
+
+    async def sumar(self, doc: dict, signo: int) -> None:
+        self.sumar_lineas(doc, signo)
+
+    async def reconstruir(self) -> int:
+        with self.tabla.candado:
+            self.tabla.filas.clear()
+            for doc in self.pedidos.filas.values():
+                if es_venta(doc.get("estado")):
+                    self.sumar_lineas(doc, 1)
+            return len(self.tabla.filas)
+
+    async def consultar(self, desde, hasta, producto, agrupar) -> List[dict]:
+        patron = _patron(re.escape(producto)) if producto else None
+        docs = (
+            doc for doc in self.tabla.filas.values()
+            if not ((desde or hasta) and doc["fecha"] is None)
+            and not (desde and doc["fecha"] < desde[:10])
+            and not (hasta and doc["fecha"] >= hasta[:10])
+            and not (patron and not patron.search(doc["producto"]))
+        )
+        return agrupar_ventas(docs, agrupar)
+
+
+class MemoriaIdempotencia(IdempotenciaRepo):
+    # No se persiste: las claves solo protegen reintentos cercanos
+    def __init__(self):
+        self._registros: Dict[str, dict] = {}
+
+    def _purgar(self, ahora: datetime) -> None:
+        # Orden de inserción ~ orden de vencimiento: basta con mirar el comienzo
+        while self._registros:
+            clave, registro = next(iter(self._registros.items()))
+            if registro["expira_en"] >= ahora:
+                break
+            del self._registros[clave]
+
+    async def reservar(self, clave: str, huella: str, expira_en: datetime) -> Optional[dict]:
+        ahora = datetime.now(timezone.utc)
+        self._purgar(ahora)
+        existente = self._registros.get(clave)
+        if existente is not None and existente["expira_en"] >= ahora:
+            return dict(existente)
+        self._registros.pop(clave, None)
+        self._registros[clave] = {"_id": clave, "huella": huella, "status": None, "body": None, "expira_en": expira_en}
+        return None
+
+    async def completar(self, clave: str, status: int, body: bytes, expira_en: datetime) -> None:
+        registro = self._registros.pop(clave, None)
+        if registro is not None:
+            # Se reinserta al final para mantener el orden por vencimiento
+            self._registros[clave] = {**registro, "status": status, "body": body, "expira_en": expira_en}
+
+    async def liberar(self, clave: str) -> None:
+        registro = self._registros.get(clave)
+        if registro is not None and registro["status"] is None:
+            del self._registros[clave]
+
+
+class MemoriaCandados(CandadosRepo):
+    # Un solo proceso usa el motor en memoria (Persistencia bloquea el
+    # directorio), así que basta con un dict.
+    def __init__(self):
+        self._registros: Dict[str, dict] = {}
+
+    async def tomar(self, nombre: str, dueno: str, expira_en: datetime) -> bool:
+        actual = self._registros.get(nombre)
+        if actual is not None and actual["dueno"] != dueno and actual["expira_en"] >= datetime.now(timezone.utc):
+            return False
+        self._registros[nombre] = {"_id": nombre, "dueno": dueno, "expira_en": expira_en}
+        return True
+
+    async def liberar(self, nombre: str, dueno: str) -> None:
+        actual = self._registros.get(nombre)
+        if actual is not None and actual["dueno"] == dueno:
+            del self._registros[nombre]
+
+
+class MemoriaVersiones(VersionesRepo):
+    # Igual que los candados: un solo proceso, y la caché que las usa no
+    # sobrevive a un reinicio, así que no hace falta persistirlas
+    def __init__(self):
+        self._versiones: Dict[str, int] = {}
+
+    async def leer(self, nombre: str) -> int:
+        return self._versiones.get(nombre, 0)
+
+    async def incrementar(self, nombre: str) -> int:
+        self._versiones[nombre] = self._versiones.get(nombre, 0) + 1
+        return self._versiones[nombre]
+
+
+class MemoriaRevocaciones(RevocacionesRepo):
+    # En una Tabla para que, con directorio, sobrevivan a reinicios
+    def __init__(self, tabla: Tabla):
+        self.tabla = tabla
+
+    async def revocar(self, jti: str, expira_en: datetime) -> bool:
+        with self.tabla.candado:
+            if self.tabla.indices["jti"].primero(jti) is not None:
+                return False
+            rid = self.tabla.nuevo_id()
+            self.tabla.filas[rid] = {"_id": rid, "jti": jti, "expira_en": expira_en}
+            return True
+
+    async def vigentes(self) -> List[Tuple[str, int]]:
+        ahora = datetime.now(timezone.utc)
+        with self.tabla.candado:
+            for rid in [rid for rid, r in self.tabla.filas.items() if r["expira_en"] <= ahora]:
+                del self.tabla.filas[rid]
+            return [(r["jti"], int(r["expira_en"].timestamp())) for r in self.tabla.filas.values()]
+
+
+class MemoriaAlmacen(Almacen):
+    """
+    Con directorio, los datos sobreviven a reinicios: journal + snapshots
+    (data/persistencia.py). Sin directorio se pierden al apagar.
+    """
+
+    def __init__(self, directorio: Optional[str] = None, fsync_ms: float = 20, snapshot_cada: int = 50_000):
+        self.tablas = {
+            "usuarios": Tabla(email=IndiceHash("email")),
+            "productos": Tabla(nombre=IndiceTexto("nombre")),
+            "pedidos": Tabla(usuario_id=IndiceHash("usuario_id"), estado=IndiceHash("estado")),
+            "boletas": Tabla(pedido_id=IndiceHash("pedido_id")),  # una boleta por pedido
+            "ventas_diarias": Tabla(clave=IndiceHash("clave")),  # clave = (fecha, producto_id)
+            "tokens_revocados": Tabla(jti=IndiceHash("jti")),
+        }
+        self.usuarios = MemoriaUsuarios(self.tablas["usuarios"])
+        self.productos = MemoriaProductos(self.tablas["productos"])
+        self.boletas = MemoriaBoletas(self.tablas["boletas"])
+        self.pedidos = MemoriaPedidos(self)
+        self.idempotencia = MemoriaIdempotencia()
+        self.candados = MemoriaCandados()
+        self.ventas = MemoriaVentas(self.tablas["ventas_diarias"], self.tablas["pedidos"])
+        self.revocaciones = MemoriaRevocaciones(self.tablas["tokens_revocados"])
+        self.versiones = MemoriaVersiones()
+        self.persistencia = (
+            Persistencia(directorio, self.tablas, fsync_ms=fsync_ms, snapshot_cada=snapshot_cada)
+            if directorio else None
+        )
+
+    def parse_id(self, id_str: str) -> int:
+        if not id_str.isdigit():
+            raise IdInvalido(id_str)
+        return int(id_str)
+
+    async def iniciar(self) -> None:
+        if self.persistencia is not None:
+            stats = self.persistencia.abrir()
+            print(
+                f"💾 Datos recuperados de {self.persistencia.directorio}: {stats['snapshot']} registros del snapshot"
+                f" + {stats['journal']} operaciones del journal en {stats['segundos'] * 1000:.0f} ms"
+            )
+            # Datos guardados antes de existir el rollup de ventas
+            if not self.tablas["ventas_diarias"].filas and self.tablas["pedidos"].filas:
+                print(f"📊 ventas_diarias reconstruido: {await self.ventas.reconstruir()} registros")
+
+    async def cerrar(self) -> None:
+        if self.persistencia is not None:
+            self.persistencia.cerrar()
@@ -0,0 +1,631 @@
+import os
+import re
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from data.repositorio import (
+    Almacen, BoletasRepo, CandadosRepo, Duplicado, IdempotenciaRepo, IdInvalido, PedidosRepo, ProductosRepo, UsuariosRepo,
+    ESTADOS_VENTA, RevocacionesRepo, VentasRepo, VersionesRepo, agrupar_ventas, es_venta, lineas_venta, signo_venta,
+)
+from services import indices, stock_service
+from services.eventos import escuchar_change_stream
+
+# Motor de almacenamiento MongoDB (Motor).
+
+
+class MongoUsuarios(UsuariosRepo):
+    def __init__(self, col):
+        self.col = col
+
+    async def contar(self) -> int:
+        return await self.col.count_documents({})
+
+    async def crear(self, doc: dict) -> dict:
+        try:
+            # insert_one agrega el _id generado al mismo diccionario
+            await self.col.insert_one(doc)
+        except DuplicateKeyError:
+            raise Duplicado("email")
+        return doc
+
+    async def obtener(self, uid) -> Optional[dict]:
+        return await self.col.find_one({"_id": uid})
+
+    async def por_email(self, email: str) -> Optional[dict]:
+        return await self.col.find_one({"email": email})
+
+    async def actualizar(self, uid, cambios: dict) -> Optional[dict]:
+        try:
+            return await self.col.find_one_and_update(
+                {"_id": uid}, {"$set": cambios}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise Duplicado("email")
+
+
+class MongoProductos(ProductosRepo):
+    def __init__(self, col):
+        self.col = col
+
+    async def contar(self) -> int:
+        return await self.col.count_documents({})
+
+    async def crear(self, doc: dict) -> dict:
+        await self.col.insert_one(doc)
+        return doc
+
+    async def crear_varios(self, docs: List[dict]) -> List[dict]:
+        await self.col.insert_many(docs)
+        return docs
+
+    async def listar(self, q: Optional[str], skip: int, limit: int) -> List[dict]:
+        query = {}
+        if q:
+            query["nombre"] = {"$regex": q, "$options": "i"}
+        return await self.col.find(query).skip(skip).limit(limit).to_list(length=limit)
+
+    async def obtener(self, pid) -> Optional[dict]:
+        return await self.col.find_one({"_id": pid})
+
+    async def obtener_varios(self, pids: list) -> Dict[Any, dict]:
+        """Trae en una sola consulta los productos pedidos, indexados por _id."""
+        cursor = self.col.find(
+            {"_id": {"$in": pids}},
+            {"nombre": 1, "precio": 1, "stock": 1},
+        )
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def actualizar(self, pid, cambios: dict) -> Optional[dict]:
+        return await self.col.find_one_and_update(
+            {"_id": pid}, {"$set": cambios}, return_document=ReturnDocument.AFTER
+        )
+
+    async def eliminar(self, pid) -> bool:
+        res = await self.col.delete_one({"_id": pid})
+        return res.deleted_count > 0
+
+    async def actualizar_varios(self, pids: list, cambios: dict) -> set:
+        # Dos comandos: saber cuáles existen (resultado por item) y un update_many
+        encontrados = {doc["_id"] async for doc in self.col.find({"_id": {"$in": pids}}, {"_id": 1})}
+        if encontrados:
+            await self.col.update_many({"_id": {"$in": list(encontrados)}}, {"$set": cambios})
+        return encontrados
+
+
+class MongoPedidos(PedidosRepo):
+    ORDEN = [("fecha", -1), ("_id", -1)]
+
+    def __init__(self, almacen: "MongoAlmacen"):
+        self.almacen = almacen
+        self.col = almacen.db["pedidos"]
+
+    async def crear(self, doc: dict) -> dict:
+        await self.col.insert_one(doc)
+        if es_venta(doc.get("estado")):
+            await self.almacen.ventas.sumar(doc, 1)
+        return doc
+
+    async def obtener(self, pid) -> Optional[dict]:
+        return await self.col.find_one({"_id": pid})
+
+    def _query(self, usuario_id, despues: Optional[Tuple[Optional[str], Any]]) -> dict:
+        query: dict = {}
+        if usuario_id is not None:
+            query["usuario_id"] = usuario_id
+        if despues is None:
+            return query
+
+        # Orden descendente: fecha menor, o misma fecha con _id menor.
+        # Los pedidos sin fecha (null) quedan al final y solo se paginan por _id.
+        fecha, oid = despues
+        if fecha is None:
+            continuar = {"fecha": None, "_id": {"$lt": oid}}
+        else:
+            continuar = {
+                "$or": [
+                    {"fecha": {"$lt": fecha}},
+                    {"fecha": fecha, "_id": {"$lt": oid}},
+                    {"fecha": None},
+                ]
+            }
+        return {"$and": [query, continuar]} if query else continuar
+
+    async def listar(self, usuario_id, despues, limit: int) -> List[dict]:
+        cursor = self.col.find(self._query(usuario_id, despues)).sort(self.ORDEN).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def iterar(self, usuario_id, despues):
+        async for doc in self.col.find(self._query(usuario_id, despues)).sort(self.ORDEN).batch_size(500):
+            yield doc
+
+    async def cambiar_estado(self, pid, nuevo_estado: str, estado_esperado=None) -> Optional[dict]:
+        filtro: dict = {"_id": pid}
+        if isinstance(estado_esperado, str):
+            filtro["estado"] = estado_esperado
+        elif estado_esperado is not None:
+            filtro["estado"] = {"$in": list(estado_esperado)}
+        # Se lee el estado anterior para saber si el rollup de ventas cambia
+        # (ej: anular un pedido pagado). Sin transacción: si el proceso cae
+        # entre ambos pasos, --backfill-ventas recalcula el rollup.
+        anterior = await self.col.find_one_and_update(
+            filtro, {"$set": {"estado": nuevo_estado}}, return_document=ReturnDocument.BEFORE
+        )
+        if anterior is None:
+            return None
+        signo = signo_venta(anterior.get("estado"), nuevo_estado)
+        if signo:
+            await self.almacen.ventas.sumar(anterior, signo)
+        return {**anterior, "estado": nuevo_estado}
+
+    async def cambiar_estado_varios(self, pids: list, nuevo_estado: str,
+                                    estados_origen: Optional[Collection[str]] = None) -> Tuple[List[dict], List[dict]]:
+        docs = await self.col.find({"_id": {"$in": pids}}).to_list(length=None)
+        origen = set(estados_origen) if estados_origen is not None else None
+        sin_cambio = [
+            doc for doc in docs
+            if (origen is not None and doc.get("estado") not in origen) or doc.get("estado") == nuevo_estado
+        ]
+        elegibles = [
+            doc for doc in docs
+            if (origen is None or doc.get("estado") in origen) and doc.get("estado") != nuevo_estado
+        ]
+
+        # Los que entran o salen de las ventas van de a uno, condicionados al
+        # estado leído, para no contarlos dos veces en el rollup. El resto
+        # va en un update_many que solo toca pedidos del mismo lado.
+        cruzan = [doc for doc in elegibles if signo_venta(doc.get("estado"), nuevo_estado)]
+        resto = [doc for doc in elegibles if not signo_venta(doc.get("estado"), nuevo_estado)]
+        cambiados = []
+        if resto:
+            if origen is not None:
+                condicion = {"$in": [e for e in origen if es_venta(e) == es_venta(nuevo_estado)]}
+            else:
+                condicion = {"$in" if es_venta(nuevo_estado) else "$nin": list(ESTADOS_VENTA)}
+            ids = [doc["_id"] for doc in resto]
+            res = await self.col.update_many(
+                {"_id": {"$in": ids}, "estado": condicion},
+                {"$set": {"estado": nuevo_estado}},
+            )
+            if res.modified_count == len(resto):
+                for doc in resto:
+                    doc["estado"] = nuevo_estado
+                cambiados.extend(resto)
+            else:
+                # Alguno cambió entre el find y el update y update_many no dice
+                # cuáles tocó: se releen. Ninguno estaba en el estado nuevo al
+                # leerlos, así que los que ahora lo están se cuentan como cambiados.
+                releidos = await self.col.find({"_id": {"$in": ids}}).to_list(length=None)
+                for doc in releidos:
+                    (cambiados if doc.get("estado") == nuevo_estado else sin_cambio).append(doc)
+        for doc in cruzan:
+            actualizado = await self.cambiar_estado(doc["_id"], nuevo_estado, estado_esperado=doc["estado"])
+            if actualizado is not None:
+                cambiados.append(actualizado)
+            else:
+                sin_cambio.append(await self.col.find_one({"_id": doc["_id"]}) or doc)
+        return cambiados, sin_cambio
+
+    async def normalizar_estados(self, estados: Collection[str]) -> int:
+        por_minuscula = {e.lower(): e for e in estados}
+        # Los pedidos en un estado válido (casi todos) se descartan por índice
+        ids_por_estado: Dict[str, list] = {}
+        async for doc in self.col.find({"estado": {"$nin": list(estados)}}, {"estado": 1}):
+            estado = por_minuscula.get(str(doc.get("estado")).lower())
+            if estado is not None:
+                ids_por_estado.setdefault(estado, []).append(doc["_id"])
+        cambiados = 0
+        for estado, ids in ids_por_estado.items():
+            res = await self.col.update_many({"_id": {"$in": ids}}, {"$set": {"estado": estado}})
+            cambiados += res.modified_count
+        return cambiados
+
+    async def cola(self, estados: List[str], limit: int) -> List[dict]:
+        # Índice estado_fecha: un rango por estado, mezclados por fecha sin ordenar en memoria
+        cursor = self.col.find({"estado": {"$in": estados}}).sort("fecha", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def pagar(self, pid, estado_anterior: str, nuevo_estado: str, cantidades: Dict[Any, int]) -> dict:
+        """
+        El cambio de estado se condiciona al estado leído, así dos cajeros
+        no pueden pagar el mismo pedido dos veces.
+        """
+        productos_col = self.almacen.db["productos"]
+
+        async def cambiar_estado(session=None) -> dict:
+            doc = await self.col.find_one_and_update(
+                {"_id": pid, "estado": estado_anterior},
+                {"$set": {"estado": nuevo_estado}},
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            if doc is None:
+                raise HTTPException(status_code=409, detail="El pedido cambió de estado, intente nuevamente")
+            return doc
+
+        async def aplicar(session):
+            doc = await cambiar_estado(session)
+            await stock_service.descontar_stock(productos_col, pid, cantidades, session=session)
+            if signo_venta(estado_anterior, nuevo_estado) > 0:
+                await self.almacen.ventas.sumar(doc, 1, session=session)
+            return doc
+
+        if self.almacen.transacciones:
+            async with await self.almacen.client.start_session() as session:
+                return await session.with_transaction(aplicar)
+
+        # Sin transacciones: el estado se cambia primero (solo quien lo cambia
+        # toca el stock) y las marcas de reserva quedan hasta el final. Si algo
+        # falla entremedio (falta stock, la red, el rollup), se devuelve lo
+        # reservado según las marcas y el pedido vuelve a su estado anterior.
+        doc = await cambiar_estado()
+        try:
+            await stock_service.reservar_stock(productos_col, pid, cantidades)
+            if signo_venta(estado_anterior, nuevo_estado) > 0:
+                await self.almacen.ventas.sumar(doc, 1)
+        except Exception:
+            # El estado se devuelve aunque falle la devolución del stock: las
+            # marcas que queden hacen que un nuevo pago no descuente dos veces.
+            try:
+                await stock_service.revertir_reservas(productos_col, pid, cantidades)
+            finally:
+                await self.col.update_one(
+                    {"_id": pid, "estado": nuevo_estado},
+                    {"$set": {"estado": estado_anterior}},
+                )
+            raise
+        await stock_service.liberar_reservas(productos_col, pid, cantidades)
+        return doc
+
+    async def detalle(self, pid) -> Optional[dict]:
+        pipeline = [
+            {"$match": {"_id": pid}},
+            {"$lookup": {
+                "from": "usuarios",
+                "localField": "usuario_id",
+                "foreignField": "_id",
+                "as": "cliente",
+            }},
+            {"$lookup": {
+                "from": "productos",
+                "localField": "items.producto_id",
+                "foreignField": "_id",
+                "as": "productos",
+            }},
+            {"$lookup": {
+                "from": "boletas",
+                "localField": "_id",
+                "foreignField": "pedido_id",
+                "as": "boleta",
+            }},
+            # El hash de la contraseña nunca sale de la base de datos
+            {"$project": {"cliente.password": 0}},
+        ]
+        docs = await self.col.aggregate(pipeline).to_list(length=1)
+        return docs[0] if docs else None
+
+    async def reporte_ventas(self, estados, desde, hasta, producto, agrupar) -> List[dict]:
+        match: dict = {"estado": {"$in": estados}}
+
+        # Las fechas se guardan como ISO string, por lo que se comparan como texto.
+        rango = {}
+        if desde:
+            rango["$gte"] = desde
+        if hasta:
+            rango["$lt"] = hasta
+        if rango:
+            # Pedidos antiguos guardaban la fecha en "fecha_pedido"
+            match["$or"] = [{"fecha": rango}, {"fecha_pedido": rango}]
+
+        pipeline: list = [{"$match": match}, {"$unwind": "$items"}]
+
+        if producto:
+            pipeline.append(
+                {"$match": {"items.nombre": {"$regex": re.escape(producto), "$options": "i"}}}
+            )
+
+        dia = {"$substrCP": [{"$ifNull": ["$fecha", "$fecha_pedido"]}, 0, 10]}
+        group_id: dict = {}
+        if agrupar in ("producto", "producto_dia"):
+            group_id["producto_id"] = "$items.producto_id"
+        if agrupar in ("dia", "producto_dia"):
+            group_id["dia"] = dia
+
+        pipeline += [
+            {
+                "$group": {
+                    "_id": group_id,
+                    "producto": {"$first": {"$ifNull": ["$items.nombre", "Producto sin nombre"]}},
+                    "cantidad": {"$sum": "$items.cantidad"},
+                    "subtotal": {"$sum": "$items.subtotal"},
+                }
+            },
+            {"$sort": {"_id.dia": 1, "producto": 1}},
+        ]
+
+        filas = []
+        async for doc in self.col.aggregate(pipeline):
+            clave = doc["_id"]
+            filas.append(
+                {
+                    "producto": doc["producto"] if "producto_id" in clave else "Todos",
+                    "producto_id": clave.get("producto_id"),
+                    "fecha": clave.get("dia"),
+                    "cantidad": doc["cantidad"],
+                    "subtotal": doc["subtotal"],
+                }
+            )
+        return filas
+
+
+class MongoVentas(VentasRepo):
+    # Índice único (fecha, producto_id) en services/indices.py: el upsert
+    # de dos workers sobre la misma fila no la duplica.
+    def __init__(self, col, pedidos_col):
+        self.col = col
+        self.pedidos_col = pedidos_col
+
+    async def sumar(self, doc: dict, signo: int, session=None) -> None:
+        operaciones = [
+            UpdateOne(
+                {"fecha": dia, "producto_id": prod_id},
+                {
+                    "$inc": {"cantidad": signo * linea["cantidad"], "subtotal": signo * linea["subtotal"]},
+                    "$set": {"producto": linea["producto"]},
+                },
+                upsert=True,
+            )
+            for (dia, prod_id), linea in lineas_venta(doc).items()
+        ]
+        if operaciones:
+            await self.col.bulk_write(operaciones, ordered=False, session=session)
+
+    async def reconstruir(self) -> int:
+        """
+        Recalcula el rollup con una agregación y lo reemplaza con $out
+        (los índices de la colección se conservan). Los cambios de estado
+        hechos mientras corre se pierden: usar con poco tráfico.
+        """
+        pipeline = [
+            {"$match": {"estado": {"$in": list(ESTADOS_VENTA)}}},
+            {"$unwind": "$items"},
+            # Misma clave de día que lineas_venta (la de sumar): sin fecha, None
+            {"$addFields": {"_fecha": {"$cond": [{"$in": ["$fecha", [None, ""]]}, "$fecha_pedido", "$fecha"]}}},
+            {
+                "$group": {
+                    "_id": {
+                        # Fechas ISO (ASCII): $substr corta igual que $substrCP
+                        "fecha": {"$cond": [
+                            {"$in": ["$_fecha", [None, ""]]}, None, {"$substr": ["$_fecha", 0, 10]},
+                        ]},
+                        "producto_id": "$items.producto_id",
+                    },
+                    "producto": {"$last": {"$ifNull": ["$items.nombre", "Producto sin nombre"]}},
+                    "cantidad": {"$sum": "$items.cantidad"},
+                    "subtotal": {"$sum": "$items.subtotal"},
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "fecha": {"$ifNull": ["$_id.fecha", None]},
+                    "producto_id": "$_id.producto_id",
+                    "producto": 1,
+                    "cantidad": 1,
+                    "subtotal": 1,
+                }
+            },
+            {"$out": self.col.name},
+        ]
+        await self.pedidos_col.aggregate(pipeline).to_list(length=None)
+        return await self.col.count_documents({})
+
+    async def consultar(self, desde, hasta, producto, agrupar) -> List[dict]:
+        filtro: dict = {}
+        rango = {}
+        if desde:
+            rango["$gte"] = desde[:10]
+        if hasta:
+            rango["$lt"] = hasta[:10]
+        if rango:
+            filtro["fecha"] = rango
+        if producto:
+            filtro["producto"] = {"$regex": re.escape(producto), "$options": "i"}
+        docs = await self.col.find(filtro, {"_id": 0}).to_list(length=None)
+        return agrupar_ventas(docs, agrupar)
+
+
+class MongoBoletas(BoletasRepo):
+    def __init__(self, col):
+        self.col = col
+
+    async def crear(self, doc: dict) -> dict:
+        try:
+            await self.col.insert_one(doc)
+        except DuplicateKeyError:
+            raise Duplicado("pedido_id")
+        return doc
+
+    async def obtener(self, bid) -> Optional[dict]:
+        return await self.col.find_one({"_id": bid})
+
+
+class MongoIdempotencia(IdempotenciaRepo):
+    # Los documentos vencidos los borra el índice TTL sobre expira_en
+    # (services/indices.py); el monitor TTL corre cada ~60 s, por eso las
+    # consultas también comparan expira_en.
+    def __init__(self, col):
+        self.col = col
+
+    async def reservar(self, clave: str, huella: str, expira_en: datetime) -> Optional[dict]:
+        ahora = datetime.now(timezone.utc)
+        try:
+            await self.col.insert_one({"_id": clave, "huella": huella, "status": None, "expira_en": expira_en})
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # Reserva vencida (el worker que la tomó se cayó) o respuesta expirada: se toma
+        tomada = await self.col.find_one_and_update(
+            {"_id": clave, "expira_en": {"$lt": ahora}},
+            {"$set": {"huella": huella, "status": None, "body": None, "expira_en": expira_en}},
+        )
+        if tomada is not None:
+            return None
+        existente = await self.col.find_one({"_id": clave})
+        if existente is None:
+            # Se borró entre medio: se vuelve a intentar
+            return await self.reservar(clave, huella, expira_en)
+        return existente
+
+    async def completar(self, clave: str, status: int, body: bytes, expira_en: datetime) -> None:
+        await self.col.update_one(
+            {"_id": clave}, {"$set": {"status": status, "body": body, "expira_en": expira_en}}
+        )
+
+    async def liberar(self, clave: str) -> None:
+        await self.col.delete_one({"_id": clave, "status": None})
+
+
+class MongoCandados(CandadosRepo):
+    # _id único: dos workers no pueden insertar el mismo candado, y el
+    # find_one_and_update sobre uno vencido es atómico (solo uno lo toma).
+    def __init__(self, col):
+        self.col = col
+
+    async def tomar(self, nombre: str, dueno: str, expira_en: datetime) -> bool:
+        try:
+            await self.col.insert_one({"_id": nombre, "dueno": dueno, "expira_en": expira_en})
+            return True
+        except DuplicateKeyError:
+            pass
+        tomado = await self.col.find_one_and_update(
+            {"_id": nombre, "$or": [{"expira_en": {"$lt": datetime.now(timezone.utc)}}, {"dueno": dueno}]},
+            {"$set": {"dueno": dueno, "expira_en": expira_en}},
+        )
+        return tomado is not None
+
+    async def liberar(self, nombre: str, dueno: str) -> None:
+        await self.col.delete_one({"_id": nombre, "dueno": dueno})
+
+
+class MongoVersiones(VersionesRepo):
+    # Un documento por contador; $inc con upsert es atómico entre workers
+    def __init__(self, col):
+        self.col = col
+
+    async def leer(self, nombre: str) -> int:
+        doc = await self.col.find_one({"_id": nombre})
+        return doc["version"] if doc else 0
+
+    async def incrementar(self, nombre: str) -> int:
+        doc = await self.col.find_one_and_update(
+            {"_id": nombre}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+
+class MongoRevocaciones(RevocacionesRepo):
+    # Colección chica: el índice TTL borra cada registro cuando vence su token
+    def __init__(self, col):
+        self.col = col
+
+    async def revocar(self, jti: str, expira_en: datetime) -> bool:
+        try:
+            await self.col.insert_one({"_id": jti, "expira_en": expira_en})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def vigentes(self) -> List[Tuple[str, int]]:
+        cursor = self.col.find({"expira_en": {"$gt": datetime.now(timezone.utc)}})
+        return [
+            (doc["_id"], int(doc["expira_en"].replace(tzinfo=timezone.utc).timestamp()))
+            async for doc in cursor
+        ]
+
+
+class MongoAlmacen(Almacen):
+    def __init__(self, uri: str, db_name: str, client=None, usar_change_stream: bool = True,
+                 event_listeners: Sequence = (), opciones_cliente: Optional[Dict[str, Any]] = None):
+        self.uri = uri
+        self.client = client
+        self.event_listeners = list(event_listeners)  # p. ej. métricas de comandos
+        self.opciones_cliente = opciones_cliente or {}  # pool, timeouts, read/write concern
+        self._pid_cliente: Optional[int] = None  # proceso que creó self.client
+        self.db_name = db_name
+        self.usar_change_stream = usar_change_stream
+        self.transacciones = False  # Se detecta al iniciar (replica set / sharded)
+        self._conectar_colecciones()
+
+    def _conectar_colecciones(self) -> None:
+        if self.client is None:
+            self.db = None
+            return
+        self.db = self.client[self.db_name]
+        self.usuarios = MongoUsuarios(self.db["usuarios"])
+        self.productos = MongoProductos(self.db["productos"])
+        self.pedidos = MongoPedidos(self)
+        self.boletas = MongoBoletas(self.db["boletas"])
+        self.idempotencia = MongoIdempotencia(self.db["idempotencia"])
+        self.candados = MongoCandados(self.db["candados"])
+        self.ventas = MongoVentas(self.db["ventas_diarias"], self.db["pedidos"])
+        self.revocaciones = MongoRevocaciones(self.db["tokens_revocados"])
+        self.versiones = MongoVersiones(self.db["versiones"])
+
+    def parse_id(self, id_str: str) -> ObjectId:
+        if not ObjectId.is_valid(id_str):
+            raise IdInvalido(id_str)
+        return ObjectId(id_str)
+
+    async def iniciar(self) -> None:
+        # pymongo no es fork-safe: si el cliente propio se creó en otro proceso
+        # (p. ej. gunicorn --preload), cada worker abre el suyo después del fork.
+        if self._pid_cliente is not None and self._pid_cliente != os.getpid():
+            self.client = None
+        creado = self.client is None
+        if creado:
+            self.client = AsyncIOMotorClient(
+                self.uri, event_listeners=self.event_listeners, **self.opciones_cliente
+            )
+            self._pid_cliente = os.getpid()
+            self._conectar_colecciones()
+        self.transacciones = await stock_service.soporta_transacciones(self.client)
+        await indices.asegurar_indices(self.db)
+        if creado:
+            abiertas = await self.calentar_pool()
+            if abiertas:
+                print(f"🔌 Pool de MongoDB: {abiertas} conexiones abiertas al iniciar")
+
+    async def calentar_pool(self) -> int:
+        """
+        Abre minPoolSize conexiones antes de recibir tráfico. pymongo las
+        completa solo en segundo plano, así que las primeras peticiones
+        pagarían el handshake; pings concurrentes obligan a abrirlas ya.
+        """
+        minimo = self.client.options.pool_options.min_pool_size
+        if minimo:
+            await asyncio.gather(*(self.client.admin.command("ping") for _ in range(minimo)))
+        return minimo
+
+    async def ping(self) -> None:
+        await self.client.admin.command("ping")
+
+    async def cerrar(self) -> None:
+        if self.client is not None:
+            self.client.close()
+
+    @property
+    def comparte_cambios(self) -> bool:
+        # El change stream requiere replica set / sharded, igual que las transacciones
+        return self.usar_change_stream and self.transacciones
+
+    async def escuchar_cambios(self, publicar) -> None:
+        if self.comparte_cambios:
+            await escuchar_change_stream(self.db["pedidos"], publicar)
@@ -0,0 +1,286 @@
+import gc
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from data.db import Tabla
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo del directorio
+    fcntl = None
+
+# Persistencia de las Tablas en memoria: journal binario de solo escritura al
+# final + snapshots compactos.
+#
+# Cada mutación de tabla.filas se agrega al journal como un frame
+#     <largo:uint32><crc32:uint32><pickle de la operación>
+# Las operaciones son ("set", tabla, id, registro, seq), ("del", tabla, id) y
+# ("clear", tabla). "seq" es el último id entregado por la secuencia, así que
+# los ids no se reutilizan aunque se borre el último registro.
+#
+# Escritura: los frames se acumulan en memoria y un hilo los escribe y hace
+# un solo fsync cada fsync_ms (commit en grupo). Con fsync_ms=0 cada mutación
+# se escribe y sincroniza antes de volver (más lento, sin ventana de pérdida).
+#
+# Snapshot: cada snapshot_cada operaciones se serializa el estado completo y
+# se abre un journal nuevo (journal-<gen>.bin). El snapshot con generación G
+# contiene todo lo anterior a journal-G, así que al iniciar se carga el
+# snapshot y se reproducen solo los journals con generación >= G. Un frame
+# incompleto al final (caída a mitad de escritura) se descarta.
+#
+# El directorio es de un solo proceso: abrir() toma un flock exclusivo y un
+# segundo worker falla al iniciar en vez de intercalar frames en el journal.
+
+CABECERA = struct.Struct("<II")
+SNAPSHOT = "snapshot.bin"
+BLOQUEO = "lock"
+
+
+def _frame(op: tuple) -> bytes:
+    datos = pickle.dumps(op, protocol=pickle.HIGHEST_PROTOCOL)
+    return CABECERA.pack(len(datos), zlib.crc32(datos)) + datos
+
+
+def _leer_frames(ruta: str) -> Tuple[List[tuple], int]:
+    """Operaciones válidas del journal y el offset donde terminan."""
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    ops, pos = [], 0
+    while pos + CABECERA.size <= len(contenido):
+        largo, crc = CABECERA.unpack_from(contenido, pos)
+        inicio, fin = pos + CABECERA.size, pos + CABECERA.size + largo
+        datos = contenido[inicio:fin]
+        if len(datos) < largo or zlib.crc32(datos) != crc:
+            break
+        ops.append(pickle.loads(datos))
+        pos = fin
+    return ops, pos
+
+
+def _escribir(journal, lote: List[bytes]) -> None:
+    if not lote:
+        return
+    journal.write(b"".join(lote))
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def _fsync_directorio(directorio: str) -> None:
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Persistencia:
+    def __init__(self, directorio: str, tablas: Dict[str, Tabla],
+                 fsync_ms: float = 20, snapshot_cada: int = 50_000):
+        self.directorio = directorio
+        self.tablas = tablas
+        self.fsync_ms = fsync_ms
+        self.snapshot_cada = snapshot_cada
+
+        # Un solo candado para todas las tablas: una mutación y su frame en
+        # el journal ocurren juntas, y el snapshot ve un estado consistente.
+        # Lo toma el event loop en cada escritura, así que con él tomado solo
+        # se mueven listas y referencias: el write, el fsync y el pickle del
+        # snapshot van fuera. _escritura ordena los lotes entre el hilo del
+        # journal y el snapshot (siempre se toma antes que candado).
+        self.candado = threading.RLock()
+        self._escritura = threading.Lock()
+        self.generacion = 0
+        self.ops_desde_snapshot = 0
+        self._pendientes: List[bytes] = []
+        self._journal = None
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._snapshot_en_curso = threading.Lock()
+        self._bloqueo = None
+
+    # -----------------------------------------------------
+    # Inicio y cierre
+    # -----------------------------------------------------
+    def abrir(self) -> dict:
+        """Recupera el estado del disco, engancha las tablas y devuelve estadísticas de la carga."""
+        os.makedirs(self.directorio, exist_ok=True)
+        self._bloquear_directorio()
+        inicio = time.perf_counter()
+        # Cargar crea muchos dicts de una vez; sin pausar el GC se recorren
+        # una y otra vez todos los objetos ya cargados.
+        gc_activo = gc.isenabled()
+        gc.disable()
+        try:
+            stats = self._recuperar()
+        finally:
+            if gc_activo:
+                gc.enable()
+        stats["segundos"] = time.perf_counter() - inicio
+
+        self._journal = open(self._ruta_journal(self.generacion), "ab")
+        for nombre, tabla in self.tablas.items():
+            tabla.persistir(self, nombre)
+        if self.fsync_ms > 0:
+            self._hilo = threading.Thread(target=self._ciclo, name="journal-fsync", daemon=True)
+            self._hilo.start()
+        return stats
+
+    def cerrar(self) -> None:
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        # Un cierre ordenado deja todo en un snapshot y el journal vacío
+        self.snapshot()
+        with self.candado:
+            for tabla in self.tablas.values():
+                tabla.persistir(None, None)
+            self._journal.close()
+            self._journal = None
+        self._liberar_directorio()
+
+    def _bloquear_directorio(self) -> None:
+        self._bloqueo = open(os.path.join(self.directorio, BLOQUEO), "a+b")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._bloqueo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._bloqueo.close()
+            self._bloqueo = None
+            raise RuntimeError(
+                f"{self.directorio} está en uso por otro proceso: el motor en memoria admite un solo worker"
+            )
+
+    def _liberar_directorio(self) -> None:
+        if self._bloqueo is not None:
+            self._bloqueo.close()  # cerrar el archivo suelta el flock
+            self._bloqueo = None
+
+    def _ruta_journal(self, generacion: int) -> str:
+        return os.path.join(self.directorio, f"journal-{generacion}.bin")
+
+    def _journals(self) -> List[Tuple[int, str]]:
+        encontrados = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith("journal-") and nombre.endswith(".bin"):
+                encontrados.append((int(nombre[len("journal-"):-len(".bin")]), os.path.join(self.directorio, nombre)))
+        return sorted(encontrados)
+
+    # -----------------------------------------------------
+    # Recuperación
+    # -----------------------------------------------------
+    def _recuperar(self) -> dict:
+        stats = {"snapshot": 0, "journal": 0}
+        ruta_snapshot = os.path.join(self.directorio, SNAPSHOT)
+        if os.path.exists(ruta_snapshot):
+            with open(ruta_snapshot, "rb") as f:
+                estado = pickle.loads(f.read())  # de una vez: load() sobre el archivo lee de a poco
+            self.generacion = estado["generacion"]
+            for nombre, (filas, seq) in estado["tablas"].items():
+                tabla = self.tablas[nombre]
+                tabla.filas.clear()
+                for rid, registro in filas.items():
+                    tabla.filas[rid] = registro
+                tabla.seq.avanzar(seq)
+                stats["snapshot"] += len(filas)
+
+        for gen, ruta in self._journals():
+            if gen < self.generacion:
+                os.remove(ruta)  # ya incluido en el snapshot
+                continue
+            ops, valido = _leer_frames(ruta)
+            for op in ops:
+                self._aplicar(op)
+            stats["journal"] += len(ops)
+            self.ops_desde_snapshot += len(ops)
+            if valido < os.path.getsize(ruta):
+                print(f"⚠️  Journal {os.path.basename(ruta)} con un frame incompleto al final; se descarta")
+                with open(ruta, "r+b") as f:
+                    f.truncate(valido)
+            self.generacion = gen
+        return stats
+
+    def _aplicar(self, op: tuple) -> None:
+        tipo, tabla = op[0], self.tablas[op[1]]
+        if tipo == "set":
+            _, _, rid, registro, seq = op
+            tabla.filas[rid] = registro
+            tabla.seq.avanzar(max(seq, rid))
+        elif tipo == "del":
+            tabla.filas.pop(op[2], None)
+        elif tipo == "clear":
+            tabla.filas.clear()
+
+    # -----------------------------------------------------
+    # Escritura
+    # -----------------------------------------------------
+    def registrar(self, op: tuple) -> None:
+        """Agrega una operación al journal. Se llama con self.candado tomado."""
+        self._pendientes.append(_frame(op))
+        self.ops_desde_snapshot += 1
+        if self.fsync_ms <= 0:
+            # Sin hilo del journal: durable antes de volver, aun con el candado tomado
+            lote, self._pendientes = self._pendientes, []
+            _escribir(self._journal, lote)
+
+    def _tomar_pendientes(self):
+        """Con self.candado tomado: el lote por escribir y el journal al que va."""
+        lote, self._pendientes = self._pendientes, []
+        return lote, self._journal
+
+    def sincronizar(self) -> None:
+        with self._escritura:
+            with self.candado:
+                lote, journal = self._tomar_pendientes()
+            if journal is not None:
+                _escribir(journal, lote)
+
+    def _ciclo(self) -> None:
+        while not self._detener.wait(self.fsync_ms / 1000):
+            try:
+                self.sincronizar()
+                if self.ops_desde_snapshot >= self.snapshot_cada:
+                    self.snapshot()
+            except Exception as exc:
+                print(f"⚠️  Error escribiendo el journal: {exc}")
+
+    def snapshot(self) -> None:
+        """Guarda el estado completo y empieza un journal nuevo."""
+        with self._snapshot_en_curso, self._escritura:
+            with self.candado:
+                # Copia superficial y el pickle fuera del candado. Un registro
+                # cambiado en el lugar entretanto (tabla.guardar) también tiene
+                # su frame en el journal nuevo, que se reproduce encima del
+                # snapshot: el resultado al recuperar es el mismo.
+                estado = {
+                    "generacion": self.generacion + 1,
+                    "tablas": {n: (dict(t.filas), t.seq.ultimo) for n, t in self.tablas.items()},
+                }
+                lote, journal_anterior = self._tomar_pendientes()
+                anterior = self.generacion
+                self.generacion += 1
+                self.ops_desde_snapshot = 0
+                self._journal = open(self._ruta_journal(self.generacion), "ab")
+
+            _escribir(journal_anterior, lote)
+            journal_anterior.close()
+            datos = pickle.dumps(estado, protocol=pickle.HIGHEST_PROTOCOL)
+
+            # Escritura atómica: archivo temporal + fsync + rename
+            ruta = os.path.join(self.directorio, SNAPSHOT)
+            with open(ruta + ".tmp", "wb") as f:
+                f.write(datos)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(ruta + ".tmp", ruta)
+            _fsync_directorio(self.directorio)
+            for gen, ruta_journal in self._journals():
+                if gen <= anterior:
+                    os.remove(ruta_journal)
@@ -0,0 +1,340 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Tuple, Union
+
+# Interfaz de almacenamiento de la API.
+# Los endpoints de main.py solo hablan con un Almacen (almacen.usuarios,
+# almacen.productos, ...) y reciben documentos con la forma de Mongo: dicts
+# con "_id" y los mismos campos. Hay dos motores:
+#   - data/mongo.py:   MongoDB vía Motor (producción)
+#   - data/memoria.py: en proceso, sobre las tablas de data/db.py
+# Se elige con la variable de entorno ALMACENAMIENTO ("mongo" o "memoria").
+# Las interfaces son clases abstractas: a un motor que le falte un método le
+# falla la construcción (TypeError), no la primera petición que lo usa.
+
+
+class Duplicado(Exception):
+    """Se violó una restricción de unicidad (email de usuario, boleta por pedido)."""
+
+
+class IdInvalido(Exception):
+    """El texto recibido no es un identificador válido para el motor."""
+
+
+# ---------------------------------------------------------
+# Ventas diarias (rollup por día y producto)
+# ---------------------------------------------------------
+# Un pedido cuenta como venta desde que se paga hasta que se anula. Los repos
+# de pedidos suman (+1) o restan (-1) sus líneas en almacen.ventas cada vez
+# que un cambio de estado cruza ese límite. El día es el de la fecha del
+# pedido, igual que en reporte_ventas.
+ESTADOS_VENTA = frozenset({"pagado", "preparando", "despachado", "entregado"})
+
+
+def es_venta(estado: Optional[str]) -> bool:
+    return (estado or "").lower() in ESTADOS_VENTA
+
+
+def signo_venta(estado_anterior: Optional[str], estado_nuevo: Optional[str]) -> int:
+    """+1 si el cambio convierte el pedido en venta, -1 si la deshace, 0 si no cambia."""
+    return int(es_venta(estado_nuevo)) - int(es_venta(estado_anterior))
+
+
+def lineas_venta(doc: dict) -> Dict[Tuple[Optional[str], Any], dict]:
+    """Líneas del pedido agrupadas por (día, producto_id)."""
+    fecha = doc.get("fecha") or doc.get("fecha_pedido")
+    dia = fecha[:10] if fecha else None
+    lineas: Dict[Tuple[Optional[str], Any], dict] = {}
+    for item in doc.get("items", []):
+        linea = lineas.setdefault(
+            (dia, item["producto_id"]),
+            {"producto": item.get("nombre", "Producto sin nombre"), "cantidad": 0, "subtotal": 0.0},
+        )
+        linea["cantidad"] += item["cantidad"]
+        linea["subtotal"] += item["subtotal"]
+    return lineas
+
+
+def agrupar_ventas(docs, agrupar: str) -> List[dict]:
+    """Agrupa documentos de ventas_diarias en filas de reporte (como reporte_ventas)."""
+    grupos: Dict[tuple, dict] = {}
+    for doc in docs:
+        prod_id = doc["producto_id"] if agrupar in ("producto", "producto_dia") else None
+        dia = doc["fecha"] if agrupar in ("dia", "producto_dia") else None
+        fila = grupos.setdefault(
+            (prod_id, dia),
+            {
+                "producto": doc["producto"] if prod_id is not None else "Todos",
+                "producto_id": prod_id,
+                "fecha": dia,
+                "cantidad": 0,
+                "subtotal": 0.0,
+            },
+        )
+        fila["cantidad"] += doc["cantidad"]
+        fila["subtotal"] += doc["subtotal"]
+    # Un pedido anulado deja su fila en cero: no se informa
+    filas = [f for f in grupos.values() if f["cantidad"]]
+    return sorted(filas, key=lambda f: (f["fecha"] or "", f["producto"]))
+
+
+class UsuariosRepo(ABC):
+    @abstractmethod
+    async def contar(self) -> int: ...
+
+    @abstractmethod
+    async def crear(self, doc: dict) -> dict: ...
+
+    @abstractmethod
+    async def obtener(self, uid) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def por_email(self, email: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def actualizar(self, uid, cambios: dict) -> Optional[dict]: ...
+
+
+class ProductosRepo(ABC):
+    @abstractmethod
+    async def contar(self) -> int: ...
+
+    @abstractmethod
+    async def crear(self, doc: dict) -> dict: ...
+
+    @abstractmethod
+    async def crear_varios(self, docs: List[dict]) -> List[dict]: ...
+
+    @abstractmethod
+    async def listar(self, q: Optional[str], skip: int, limit: int) -> List[dict]: ...
+
+    @abstractmethod
+    async def obtener(self, pid) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def obtener_varios(self, pids: list) -> Dict[Any, dict]: ...
+
+    @abstractmethod
+    async def actualizar(self, pid, cambios: dict) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def eliminar(self, pid) -> bool: ...
+
+    @abstractmethod
+    async def actualizar_varios(self, pids: list, cambios: dict) -> set:
+        """Aplica los mismos cambios a varios productos; devuelve los ids encontrados."""
+        raise NotImplementedError
+
+
+class PedidosRepo(ABC):
+    @abstractmethod
+    async def crear(self, doc: dict) -> dict: ...
+
+    @abstractmethod
+    async def obtener(self, pid) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def listar(self, usuario_id, despues: Optional[Tuple[Optional[str], Any]], limit: int) -> List[dict]:
+        """Pedidos más recientes primero, ordenados por (fecha, _id) y continuando después de esa clave."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iterar(self, usuario_id, despues: Optional[Tuple[Optional[str], Any]]) -> AsyncIterator[dict]:
+        """Igual que listar pero sin límite y sin cargar todo en memoria."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cambiar_estado(self, pid, nuevo_estado: str,
+                             estado_esperado: Union[str, Collection[str], None] = None) -> Optional[dict]:
+        """
+        Cambia el estado solo si el actual es estado_esperado (o uno de ellos,
+        si es una lista) y devuelve el pedido actualizado; None si no cambió.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cambiar_estado_varios(self, pids: list, nuevo_estado: str,
+                                    estados_origen: Optional[Collection[str]] = None) -> Tuple[List[dict], List[dict]]:
+        """
+        Cambia el estado de los pedidos que están en estados_origen (todos, si
+        es None). Devuelve (cambiados, sin_cambio): en el primero solo los que
+        este llamado cambió; en el segundo el resto de los encontrados (incluso
+        los que ya estaban en nuevo_estado), con el estado que tienen.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cola(self, estados: List[str], limit: int) -> List[dict]:
+        """Pedidos en esos estados, los más antiguos primero (cola de cocina)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def normalizar_estados(self, estados: Collection[str]) -> int:
+        """
+        Pasa a la forma de `estados` los guardados con otra capitalización
+        ("Pagado" -> "pagado", de antes del enum). Devuelve cuántos cambió.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def pagar(self, pid, estado_anterior: str, nuevo_estado: str, cantidades: Dict[Any, int]) -> dict:
+        """
+        Cambia el estado y descuenta el stock de forma atómica. Lanza 409 si el
+        pedido ya cambió de estado y StockInsuficienteError si falta stock.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def detalle(self, pid) -> Optional[dict]:
+        """Pedido con las listas "cliente", "productos" y "boleta" (como un $lookup)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reporte_ventas(self, estados: List[str], desde: Optional[str], hasta: Optional[str],
+                             producto: Optional[str], agrupar: str) -> List[dict]:
+        """Filas {producto, producto_id, fecha, cantidad, subtotal}; hasta es exclusivo."""
+        raise NotImplementedError
+
+
+class BoletasRepo(ABC):
+    @abstractmethod
+    async def crear(self, doc: dict) -> dict: ...
+
+    @abstractmethod
+    async def obtener(self, bid) -> Optional[dict]: ...
+
+
+class IdempotenciaRepo(ABC):
+    """
+    Respuestas guardadas por Idempotency-Key (ver services/idempotencia.py).
+    Un registro es {"_id": clave, "huella", "status", "body", "expira_en"};
+    status None significa que la petición original sigue en curso.
+    """
+
+    @abstractmethod
+    async def reservar(self, clave: str, huella: str, expira_en: datetime) -> Optional[dict]:
+        """
+        Reserva la clave para esta petición y devuelve None, o devuelve el
+        registro existente. Una reserva vencida (worker caído) se toma.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def completar(self, clave: str, status: int, body: bytes, expira_en: datetime) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def liberar(self, clave: str) -> None:
+        """Borra la reserva de una petición que falló, para que se pueda reintentar."""
+        raise NotImplementedError
+
+
+class VentasRepo(ABC):
+    """
+    Rollup ventas_diarias: un registro por (fecha, producto_id) con
+    {"fecha", "producto_id", "producto", "cantidad", "subtotal"}.
+    """
+
+    @abstractmethod
+    async def sumar(self, doc: dict, signo: int) -> None:
+        """Suma (signo=1) o resta (signo=-1) las líneas del pedido."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reconstruir(self) -> int:
+        """Recalcula todo desde los pedidos; devuelve la cantidad de registros."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def consultar(self, desde: Optional[str], hasta: Optional[str], producto: Optional[str],
+                        agrupar: str) -> List[dict]:
+        """Mismas filas que PedidosRepo.reporte_ventas con ESTADOS_VENTA; hasta es exclusivo."""
+        raise NotImplementedError
+
+
+class CandadosRepo(ABC):
+    """
+    Candados con vencimiento (lease) entre procesos, p. ej. para que un solo
+    worker cargue los datos semilla. Un registro es {"_id": nombre, "dueno", "expira_en"};
+    si el dueño se cae, el candado queda libre cuando vence.
+    """
+
+    @abstractmethod
+    async def tomar(self, nombre: str, dueno: str, expira_en: datetime) -> bool:
+        """True si el candado quedó a nombre de dueno (estaba libre, vencido o ya era suyo)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def liberar(self, nombre: str, dueno: str) -> None:
+        raise NotImplementedError
+
+
+class RevocacionesRepo(ABC):
+    """
+    Tokens de sesión revocados antes de vencer (ver services/tokens.py).
+    Un registro es {"_id": jti, "expira_en"}; sirve hasta que el token vence.
+    """
+
+    @abstractmethod
+    async def revocar(self, jti: str, expira_en: datetime) -> bool:
+        """False si ya estaba revocado (p. ej. un token de refresco ya usado)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def vigentes(self) -> List[Tuple[str, int]]:
+        """(jti, vencimiento en segundos epoch) de las revocaciones no vencidas."""
+        raise NotImplementedError
+
+
+class VersionesRepo(ABC):
+    """
+    Contadores compartidos por todos los procesos, p. ej. la versión del
+    catálogo: quien lo cambia la incrementa y cada worker la compara con la
+    de su caché. Un registro es {"_id": nombre, "version"}.
+    """
+
+    @abstractmethod
+    async def leer(self, nombre: str) -> int:
+        """Versión actual (0 si nunca se incrementó)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def incrementar(self, nombre: str) -> int:
+        """Incrementa la versión y devuelve la nueva."""
+        raise NotImplementedError
+
+
+class Almacen(ABC):
+    usuarios: UsuariosRepo
+    productos: ProductosRepo
+    pedidos: PedidosRepo
+    boletas: BoletasRepo
+    idempotencia: IdempotenciaRepo
+    candados: CandadosRepo
+    ventas: VentasRepo
+    revocaciones: RevocacionesRepo
+    versiones: VersionesRepo
+
+    @abstractmethod
+    def parse_id(self, id_str: str):
+        """Convierte el id recibido en la URL al tipo del motor; lanza IdInvalido."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def iniciar(self) -> None: ...
+
+    @abstractmethod
+    async def cerrar(self) -> None: ...
+
+    async def ping(self) -> None:
+        """Verifica que el motor responda (readiness); lanza una excepción si no."""
+        return None
+
+    async def escuchar_cambios(self, publicar) -> None:
+        """Llama publicar(doc) por cada cambio de estado hecho por otros procesos (si el motor lo permite)."""
+        return None
+
+    @property
+    def comparte_cambios(self) -> bool:
+        """True si escuchar_cambios entrega los cambios de todos los procesos."""
+        return False
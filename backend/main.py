@@ -1,23 +1,59 @@
-from typing import List, Optional
+import os
+import json
+import sys
+import time
+import socket
+import asyncio
+import base64
+import hashlib
+import secrets
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Literal
 from contextlib import asynccontextmanager
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta, timezone
 
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Header, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, EmailStr
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter, ValidationError
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
 
 import bcrypt  # Importamos la librería directa para seguridad
 
+from data.repositorio import Almacen, Duplicado, IdInvalido
+from data.mongo import MongoAlmacen
+from data.memoria import MemoriaAlmacen
+from services import indices
+from services.eventos import Aviso, BusPedidos
+from services import serializacion
+from services import estaticos
+from services.catalogo_cache import CatalogoCache, etag_coincide
+from services.idempotencia import Idempotencia, calcular_huella
+from services.metricas import Metricas, MiddlewareMetricas
+from services.stock_service import StockInsuficienteError
+from services.tokens import ACCESO, REFRESCO, Sesion, TokenInvalido, Tokens, expira_en
+from models.pedido import EstadoPedido, ESTADOS_CLIENTE, ESTADOS_COCINA, estados_origen, transicion_valida
+
 # ---------------------------------------------------------
 # SEGURIDAD (Hashing de contraseñas)
 # ---------------------------------------------------------
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))          # Factor de costo
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))              # Hilos dedicados a bcrypt
+HASH_MAX_PENDIENTES = int(os.getenv("HASH_MAX_PENDIENTES", "64"))  # Tope de cola
+
+# bcrypt libera el GIL, así que un pool de hilos propio saca el hashing del
+# event loop sin competir con el executor por defecto de asyncio.
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_pendientes = 0
+
+
 def get_password_hash(password: str) -> str:
     """Encripta la contraseña usando bcrypt."""
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(pwd_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -30,30 +66,181 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
+def hash_necesita_rehash(hashed_password: str) -> bool:
+    """True si el hash fue generado con un costo distinto al configurado."""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+async def _en_hash_executor(fn, *args):
+    """Ejecuta fn en el pool de bcrypt; rechaza con 503 si la cola está llena."""
+    global hash_pendientes
+    if hash_pendientes >= HASH_MAX_PENDIENTES:
+        raise HTTPException(status_code=503, detail="Servidor ocupado, intente nuevamente")
+    hash_pendientes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, fn, *args)
+    finally:
+        hash_pendientes -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _en_hash_executor(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _en_hash_executor(verify_password, plain_password, hashed_password)
+
+
+# Workers del servidor (uvicorn y gunicorn leen WEB_CONCURRENCY). Cada worker
+# es un proceso con su propio cliente de MongoDB, abierto en el lifespan.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+# ----- Tokens de sesión (services/tokens.py) -----
+# TOKENS_SECRETO tiene que ser el mismo en todos los workers y no cambiar entre
+# reinicios; sin él se genera uno al azar, que solo sirve para desarrollo con
+# un solo worker (con varios, un token de un worker sería inválido en otro).
+TOKENS_SECRETO = os.getenv("TOKENS_SECRETO", "")
+if not TOKENS_SECRETO:
+    if WORKERS > 1:
+        raise RuntimeError("TOKENS_SECRETO es obligatorio con WEB_CONCURRENCY > 1 (el mismo en todos los workers)")
+    print("⚠️  TOKENS_SECRETO no definido: las sesiones no sobreviven a un reinicio")
+tokens = Tokens(
+    TOKENS_SECRETO.encode("utf-8") if TOKENS_SECRETO else secrets.token_bytes(32),
+    ttl_acceso=float(os.getenv("TOKEN_ACCESO_MINUTOS", "15")) * 60,
+    ttl_refresco=float(os.getenv("TOKEN_REFRESCO_DIAS", "7")) * 24 * 3600,
+)
+# Cada cuánto se traen las revocaciones hechas por otros workers
+TOKENS_SYNC_SEGUNDOS = float(os.getenv("TOKENS_SYNC_SEGUNDOS", "10"))
+revocaciones_task: asyncio.Task | None = None
+
 
 # ---------------------------------------------------------
-# Configuración MongoDB
+# Configuración de almacenamiento
 # ---------------------------------------------------------
-MONGODB_URI = "mongodb://localhost:27017"
-DB_NAME = "Doggys"
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "Doggys")
+
+# Pool de conexiones y timeouts del cliente de MongoDB. Al iniciar se abren
+# MONGO_MIN_POOL conexiones para que las primeras peticiones no las paguen.
+MONGO_MIN_POOL = int(os.getenv("MONGO_MIN_POOL", "10"))
+MONGO_MAX_POOL = int(os.getenv("MONGO_MAX_POOL", "100"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "")  # "majority", "1"... vacío = el del servidor
+
+# Tiempo máximo del ping de /ready
+READY_TIMEOUT_MS = int(os.getenv("READY_TIMEOUT_MS", "2000"))
+
+
+def opciones_mongo() -> Dict[str, Any]:
+    opciones: Dict[str, Any] = {
+        "minPoolSize": MONGO_MIN_POOL,
+        "maxPoolSize": MONGO_MAX_POOL,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+    }
+    if MONGO_WRITE_CONCERN:
+        opciones["w"] = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    return opciones
+
+
+# "mongo" (producción) o "memoria" (pruebas de carga / CI, sin base de datos)
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "mongo")
+# Solo "memoria": directorio del journal y snapshots (vacío = sin persistencia)
+# y cada cuántos ms se hace fsync del journal (0 = en cada escritura).
+ALMACENAMIENTO_DIR = os.getenv("ALMACENAMIENTO_DIR") or None
+ALMACENAMIENTO_FSYNC_MS = float(os.getenv("ALMACENAMIENTO_FSYNC_MS", "20"))
+
+# Eventos de estado de pedidos (SSE). Con replica set se alimentan desde el
+# change stream para que todos los workers vean los cambios de los demás.
+bus_pedidos = BusPedidos()
+# Despierta los long-poll de /cocina/cola con cada cambio de estado
+aviso_cocina = Aviso()
+USAR_CHANGE_STREAM = os.getenv("PEDIDOS_CHANGE_STREAM", "1") == "1"
+change_stream_task: asyncio.Task | None = None
+
+# True cuando terminó el arranque (pool abierto, datos semilla); lo usa /ready
+listo = False
+
+
+# Métricas Prometheus en GET /metrics (METRICAS=0 las desactiva)
+METRICAS = os.getenv("METRICAS", "1") == "1"
+metricas = Metricas()
+event_loop_task: asyncio.Task | None = None
+
+
+# Frontend servido por la API en /app (ESTATICOS=0 lo desactiva): nombres con
+# hash y caché inmutable, variantes .br/.gz y miniaturas WebP de las imágenes.
+# Se prepara al iniciar en ESTATICOS_DIR, o antes con `python main.py --build-static`.
+ESTATICOS = os.getenv("ESTATICOS", "1") == "1"
+ESTATICOS_PREFIJO = "/app"
+_RAIZ = Path(__file__).resolve().parent.parent
+FRONTEND_DIR = Path(os.getenv("FRONTEND_DIR", _RAIZ / "frontend"))
+ESTATICOS_DIR = Path(os.getenv("ESTATICOS_DIR", _RAIZ / "build" / "frontend"))
+manifiesto_estaticos = estaticos.Manifiesto(prefijo=ESTATICOS_PREFIJO)
+
+
+def crear_almacen() -> Almacen:
+    if ALMACENAMIENTO == "memoria":
+        if WORKERS > 1:
+            print("⚠️  ALMACENAMIENTO=memoria con varios workers: cada worker tiene sus propios datos")
+        return MemoriaAlmacen(ALMACENAMIENTO_DIR, fsync_ms=ALMACENAMIENTO_FSYNC_MS)
+    if ALMACENAMIENTO != "mongo":
+        raise ValueError(f"ALMACENAMIENTO desconocido: {ALMACENAMIENTO}")
+    return MongoAlmacen(
+        MONGODB_URI, DB_NAME, usar_change_stream=USAR_CHANGE_STREAM,
+        event_listeners=[metricas.monitor_mongo()] if METRICAS else (),
+        opciones_cliente=opciones_mongo(),
+    )
+
+
+almacen: Almacen = crear_almacen()
 
-client: AsyncIOMotorClient | None = None
-db = None
-usuarios_col = None
-productos_col = None
-pedidos_col = None
-boletas_col = None
+# Ruta rápida (opt-in): documentos Mongo -> JSON con orjson, sin Pydantic
+SERIALIZACION_RAPIDA = os.getenv("SERIALIZACION_RAPIDA", "0") == "1" and serializacion.orjson is not None
+
+catalogo_cache = CatalogoCache(ttl=float(os.getenv("CATALOGO_CACHE_TTL", "60")))
+# Contador en almacen.versiones que comparten todos los workers
+VERSION_CATALOGO = "catalogo"
+
+# Respuestas de POST /pedidos y POST /boletas por Idempotency-Key (horas de vigencia)
+idempotencia = Idempotencia(ttl=float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24")) * 3600)
 
 
 # ---------------------------------------------------------
 # DATOS SEMILLA (Carga inicial automática)
 # ---------------------------------------------------------
+async def con_candado(nombre: str, funcion, duracion: float = 60, espera: float = 0.2):
+    """
+    Ejecuta funcion() con el candado `nombre` tomado en el almacenamiento.
+    Con varios workers, el resto espera su turno; si el dueño se cae, el
+    candado vence a los `duracion` segundos y otro lo toma.
+    """
+    dueno = f"{socket.gethostname()}:{os.getpid()}"
+    while not await almacen.candados.tomar(
+        nombre, dueno, datetime.now(timezone.utc) + timedelta(seconds=duracion)
+    ):
+        await asyncio.sleep(espera)
+    try:
+        return await funcion()
+    finally:
+        await almacen.candados.liberar(nombre, dueno)
+
+
 async def cargar_datos_iniciales():
-    """Carga usuario admin y productos si las colecciones están vacías."""
+    """
+    Carga usuario admin y productos si las colecciones están vacías.
+    Se llama con el candado "semilla" (ver lifespan): los workers revisan y
+    cargan de a uno, así que solo el primero inserta.
+    """
     print("--- Verificando datos iniciales ---")
 
     # 1. Verificar/Crear ADMIN
-    if await usuarios_col.count_documents({}) == 0:
+    if await almacen.usuarios.contar() == 0:
         admin_user = {
             "nombre": "Administrador",
             "email": "admin@doggys.com",
@@ -61,13 +248,16 @@ async def cargar_datos_iniciales():
             "direccion": "Sucursal Central",
             "is_admin": True,
             # Contraseña encriptada por defecto: admin123
-            "password": get_password_hash("admin123")
+            "password": await hash_password_async("admin123")
         }
-        await usuarios_col.insert_one(admin_user)
-        print("✅ Usuario Admin creado: admin@doggys.com / Pass: admin123")
+        try:
+            await almacen.usuarios.crear(admin_user)
+            print("✅ Usuario Admin creado: admin@doggys.com / Pass: admin123")
+        except Duplicado:
+            pass  # el índice único de email ya lo tenía (otro worker)
     
     # 2. Verificar/Crear PRODUCTOS
-    if await productos_col.count_documents({}) == 0:
+    if await almacen.productos.contar() == 0:
         productos_iniciales = [
             {
                 "nombre": "Hot Dog Americano",
@@ -102,34 +292,72 @@ async def cargar_datos_iniciales():
                 "disponible": True
             }
         ]
-        await productos_col.insert_many(productos_iniciales)
+        await almacen.productos.crear_varios(productos_iniciales)
         print("✅ 4 Productos iniciales cargados")
 
 
+async def preparar_estaticos():
+    """Construye el frontend si cambió (fuera del event loop) y carga el manifiesto."""
+    if not FRONTEND_DIR.is_dir():
+        print(f"⚠️  No existe {FRONTEND_DIR}: no se sirve el frontend")
+        return
+    inicio = time.perf_counter()
+    datos = await asyncio.to_thread(estaticos.construir, FRONTEND_DIR, ESTATICOS_DIR)
+    manifiesto_estaticos.cargar(datos)
+    print(f"🖼️  Frontend en {ESTATICOS_DIR}: {len(datos['archivos'])} archivos, "
+          f"{sum(len(m) for m in datos['miniaturas'].values())} miniaturas ({time.perf_counter() - inicio:.1f}s)")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Se ejecuta al iniciar y apagar FastAPI.
-    Aquí abrimos la conexión y cargamos datos semilla.
+    Aquí abrimos el almacenamiento y cargamos datos semilla.
     """
-    global client, db, usuarios_col, productos_col, pedidos_col, boletas_col
-    
-    # 1. Conectar a Mongo
-    client = AsyncIOMotorClient(MONGODB_URI)
-    db = client[DB_NAME]
+    global change_stream_task, event_loop_task, revocaciones_task, listo
+
+    # 1. Conectar (en Mongo también detecta transacciones, asegura índices y abre el pool)
+    await almacen.iniciar()
 
-    usuarios_col = db["usuarios"]
-    productos_col = db["productos"]
-    pedidos_col = db["pedidos"]
-    boletas_col = db["boletas"]
+    # 2. Cargar datos iniciales (un worker a la vez)
+    await con_candado("semilla", cargar_datos_iniciales)
 
-    # 2. Cargar datos iniciales
-    await cargar_datos_iniciales()
+    # 3. Estados guardados antes del enum ("Pagado" -> "pagado"); no hace nada si no hay
+    normalizados = await almacen.pedidos.normalizar_estados([e.value for e in EstadoPedido])
+    if normalizados:
+        print(f"🔤 {normalizados} pedidos con el estado normalizado a minúsculas")
 
+    # 4. Frontend estático (un worker construye, el resto reutiliza el resultado)
+    if ESTATICOS:
+        await con_candado("estaticos", preparar_estaticos, duracion=300)
+
+    # 5. Eventos de pedidos hechos por otros workers (change stream de Mongo)
+    if almacen.comparte_cambios:
+        change_stream_task = asyncio.create_task(almacen.escuchar_cambios(publicar_cambio_pedido))
+
+    # 6. Retraso del event loop para /metrics
+    if METRICAS:
+        event_loop_task = asyncio.create_task(metricas.medir_event_loop())
+
+    # 7. Tokens revocados (cierres de sesión de cualquier worker)
+    revocaciones_task = asyncio.create_task(tokens.sincronizar(almacen.revocaciones, TOKENS_SYNC_SEGUNDOS))
+
+    listo = True
     try:
         yield
     finally:
-        client.close()
+        listo = False
+        if change_stream_task:
+            change_stream_task.cancel()
+            change_stream_task = None
+        if event_loop_task:
+            event_loop_task.cancel()
+            event_loop_task = None
+        if revocaciones_task:
+            revocaciones_task.cancel()
+            revocaciones_task = None
+        await almacen.cerrar()
+        hash_executor.shutdown(wait=False)
 
 
 app = FastAPI(title="API Doggy's - MongoDB", version="2.0.0", lifespan=lifespan)
@@ -143,16 +371,140 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "X-Cola-Version"],
 )
 
+# Métricas: se agrega después de CORS para quedar por fuera y medir todo
+if METRICAS:
+    app.add_middleware(MiddlewareMetricas, metricas=metricas)
+
+# Frontend: /app/index.html, /app/js/menu.<hash>.js...
+if ESTATICOS and FRONTEND_DIR.is_dir():
+    app.mount(ESTATICOS_PREFIJO, estaticos.Estaticos(ESTATICOS_DIR, manifiesto_estaticos), name="frontend")
+
 
 # ---------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------
-def ensure_objectid(id_str: str) -> ObjectId:
-    if not ObjectId.is_valid(id_str):
+def ensure_id(id_str: str):
+    try:
+        return almacen.parse_id(id_str)
+    except IdInvalido:
         raise HTTPException(status_code=400, detail="ID inválido")
-    return ObjectId(id_str)
+
+
+# ----- Autenticación -----
+# Authorization: Bearer <token de acceso>. Se verifica en proceso (firma,
+# vencimiento y revocaciones en memoria), sin consultar la base.
+bearer = HTTPBearer(auto_error=False)
+
+
+def no_autenticado(detalle: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detalle, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def sesion_opcional(
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+) -> Optional[Sesion]:
+    """Sesión del token enviado, o None si no vino ninguno (un token inválido es 401)."""
+    if credenciales is None:
+        return None
+    try:
+        return tokens.verificar(credenciales.credentials, ACCESO)
+    except TokenInvalido as exc:
+        raise no_autenticado(str(exc))
+
+
+async def sesion_actual(sesion: Optional[Sesion] = Depends(sesion_opcional)) -> Sesion:
+    if sesion is None:
+        raise no_autenticado("No autenticado")
+    return sesion
+
+
+async def solo_admin(sesion: Sesion = Depends(sesion_actual)) -> Sesion:
+    if not sesion.is_admin:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    return sesion
+
+
+async def sesion_eventos(
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+    access_token: Optional[str] = Query(None, description="Token de acceso (EventSource no envía headers)"),
+) -> Sesion:
+    """Como sesion_actual, pero acepta el token de acceso también en ?access_token=."""
+    token = credenciales.credentials if credenciales is not None else access_token
+    if not token:
+        raise no_autenticado("No autenticado")
+    try:
+        return tokens.verificar(token, ACCESO)
+    except TokenInvalido as exc:
+        raise no_autenticado(str(exc))
+
+
+def exigir_propio(sesion: Sesion, usuario_id) -> None:
+    """Un cliente solo accede a lo suyo; un administrador, a todo."""
+    if not sesion.is_admin and sesion.usuario_id != str(usuario_id):
+        raise HTTPException(status_code=403, detail="No tiene permiso sobre datos de otro usuario")
+
+
+def publicar_cambio_pedido(doc) -> None:
+    bus_pedidos.publicar(str(doc["_id"]), pedido_doc_to_out(doc))
+    aviso_cocina.avisar()
+
+
+def parsear_ids_bulk(ids: List[str]) -> tuple:
+    """
+    Para las operaciones masivas: devuelve id -> posición de su primera
+    aparición (los repetidos se procesan una vez) y un dict id -> id del motor
+    solo con los válidos. Un id inválido no invalida la petición completa; se
+    informa en su resultado.
+    """
+    unicos: Dict[str, int] = {}
+    for i, id_str in enumerate(ids):
+        unicos.setdefault(id_str, i)
+    validos = {}
+    for id_str in unicos:
+        try:
+            validos[id_str] = almacen.parse_id(id_str)
+        except IdInvalido:
+            pass
+    return unicos, validos
+
+
+def resultados_bulk(unicos: Dict[str, int], validos: dict, hechos: set, no_encontrado: str,
+                    errores: Optional[dict] = None) -> List["ResultadoBulkOut"]:
+    resultados = []
+    for id_str, i in unicos.items():
+        if id_str not in validos:
+            error = "ID inválido"
+        elif errores and id_str in errores:
+            error = errores[id_str]
+        elif validos[id_str] not in hechos:
+            error = no_encontrado
+        else:
+            error = None
+        resultados.append(ResultadoBulkOut(indice=i, id=id_str, ok=error is None, error=error))
+    return resultados
+
+
+# ----- Paginación por cursor (keyset) -----
+PEDIDOS_PAGE_MAX = 200
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(doc) -> str:
+    """Token opaco con la clave (fecha, _id) del último documento de la página."""
+    raw = json.dumps({"f": doc.get("fecha"), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str) -> tuple:
+    """Devuelve la clave (fecha, _id) después de la cual continúa la página."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return raw["f"], almacen.parse_id(raw["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
 
 
 # ----- Conversores -----
@@ -175,7 +527,8 @@ def producto_doc_to_out(doc) -> "ProductoOut":
         precio=doc["precio"],
         stock=doc.get("stock", 0),
         img=doc.get("img"),
-        disponible=doc.get("disponible", True)
+        disponible=doc.get("disponible", True),
+        **manifiesto_estaticos.imagen(doc.get("img")),
     )
 
 
@@ -211,6 +564,17 @@ def boleta_doc_to_out(doc) -> "BoletaOut":
     )
 
 
+def venta_fila_to_out(fila) -> "VentaReporteOut":
+    """Fila de reporte_ventas o del rollup ventas_diarias (misma forma en ambos)."""
+    return VentaReporteOut(
+        producto=fila["producto"],
+        producto_id=str(fila["producto_id"]) if fila["producto_id"] is not None else None,
+        fecha=fila["fecha"],
+        cantidad=fila["cantidad"],
+        subtotal=fila["subtotal"],
+    )
+
+
 # ---------------------------------------------------------
 # Modelos Pydantic
 # ---------------------------------------------------------
@@ -243,6 +607,9 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+class RefrescoIn(BaseModel):
+    refresh_token: str
+
 class ProductoIn(BaseModel):
     nombre: str
     descripcion: Optional[str] = None
@@ -251,8 +618,15 @@ class ProductoIn(BaseModel):
     img: Optional[str] = Field(default=None)
     disponible: bool = True
 
+class MiniaturaOut(BaseModel):
+    ancho: int
+    url: str
+
 class ProductoOut(ProductoIn):
     id: str
+    # Servidas en /app por la API: imagen con hash y miniaturas WebP (para srcset)
+    img_url: Optional[str] = None
+    miniaturas: List[MiniaturaOut] = []
 
 class PedidoItemIn(BaseModel):
     producto_id: str
@@ -264,9 +638,11 @@ class PedidoItemOut(PedidoItemIn):
     subtotal: float
 
 class PedidoIn(BaseModel):
-    usuario_id: str
+    # Se toma de la sesión; solo un administrador puede crear pedidos a nombre de otro
+    usuario_id: Optional[str] = None
     items: List[PedidoItemIn]
-    estado: str = "pendiente"
+    # Solo se acepta "pendiente" (422 si no): pagar, cocinar o anular van por PATCH /estado
+    estado: Literal[EstadoPedido.PENDIENTE] = EstadoPedido.PENDIENTE
 
 class PedidoOut(BaseModel):
     id: str
@@ -284,6 +660,45 @@ class BoletaOut(BaseModel):
     pedido_id: str
     total: float
 
+class ClienteResumenOut(BaseModel):
+    id: str
+    nombre: str
+    email: EmailStr
+
+class PedidoDetalleOut(BaseModel):
+    pedido: PedidoOut
+    cliente: Optional[ClienteResumenOut] = None
+    productos: List[ProductoOut]
+    boleta: Optional[BoletaOut] = None
+
+class VentaReporteOut(BaseModel):
+    producto: str
+    producto_id: Optional[str] = None
+    fecha: Optional[str] = None  # Día (YYYY-MM-DD) cuando se agrupa por día
+    cantidad: int
+    subtotal: float
+
+
+# Operaciones masivas (panel de administración / cocina)
+BULK_MAX = 500
+
+class ResultadoBulkOut(BaseModel):
+    indice: int           # Posición del item en la petición
+    id: Optional[str] = None
+    ok: bool
+    error: Optional[str] = None
+
+class DisponibilidadBulkIn(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BULK_MAX)
+    disponible: bool
+
+class EstadoBulkIn(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BULK_MAX)
+    nuevo_estado: EstadoPedido
+
+
+productos_adapter = TypeAdapter(List[ProductoOut])
+
 
 # ---------------------------------------------------------
 # Endpoints de sistema
@@ -293,29 +708,73 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/", include_in_schema=False)
+async def inicio():
+    if not ESTATICOS:
+        raise HTTPException(status_code=404, detail="Frontend desactivado")
+    return RedirectResponse(f"{ESTATICOS_PREFIJO}/index.html")
+
+
+@app.get("/ready", tags=["sistema"])
+async def ready():
+    """
+    Readiness para el balanceador: solo responde 200 cuando terminó el
+    arranque y el almacenamiento contesta un ping. /health no toca la base.
+    """
+    if not listo:
+        return JSONResponse(status_code=503, content={"status": "iniciando"})
+    inicio = time.perf_counter()
+    try:
+        await asyncio.wait_for(almacen.ping(), READY_TIMEOUT_MS / 1000)
+    except Exception as exc:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "sin_conexion", "error": str(exc) or type(exc).__name__},
+        )
+    return {
+        "status": "ok",
+        "almacenamiento": ALMACENAMIENTO,
+        "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+@app.get("/metrics", tags=["sistema"], include_in_schema=False)
+async def metrics():
+    if not METRICAS:
+        raise HTTPException(status_code=404, detail="Métricas desactivadas")
+    return Response(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ---------------------------------------------------------
 # USUARIOS
 # ---------------------------------------------------------
 @app.post("/usuarios", response_model=UsuarioOut, status_code=201, tags=["usuarios"])
-async def crear_usuario(usuario: UsuarioIn):
+async def crear_usuario(usuario: UsuarioIn, sesion: Optional[Sesion] = Depends(sesion_opcional)):
+    if usuario.is_admin and not (sesion and sesion.is_admin):
+        raise HTTPException(status_code=403, detail="Solo un administrador puede crear administradores")
+
     # Validar email único
-    existente = await usuarios_col.find_one({"email": usuario.email})
+    existente = await almacen.usuarios.por_email(usuario.email)
     if existente:
         raise HTTPException(status_code=400, detail="Correo ya registrado")
 
     # Hashear contraseña
     user_dict = usuario.model_dump()
-    user_dict["password"] = get_password_hash(user_dict["password"])
+    user_dict["password"] = await hash_password_async(user_dict["password"])
 
-    res = await usuarios_col.insert_one(user_dict)
-    doc = await usuarios_col.find_one({"_id": res.inserted_id})
-    return usuario_doc_to_out(doc)
+    try:
+        # crear agrega el _id generado al mismo diccionario
+        await almacen.usuarios.crear(user_dict)
+    except Duplicado:
+        raise HTTPException(status_code=400, detail="Correo ya registrado")
+    return usuario_doc_to_out(user_dict)
 
 
 @app.get("/usuarios/{usuario_id}", response_model=UsuarioOut, tags=["usuarios"])
-async def obtener_usuario(usuario_id: str):
-    oid = ensure_objectid(usuario_id)
-    doc = await usuarios_col.find_one({"_id": oid})
+async def obtener_usuario(usuario_id: str, sesion: Sesion = Depends(sesion_actual)):
+    oid = ensure_id(usuario_id)
+    exigir_propio(sesion, oid)
+    doc = await almacen.usuarios.obtener(oid)
     if not doc:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return usuario_doc_to_out(doc)
@@ -323,26 +782,32 @@ async def obtener_usuario(usuario_id: str):
 
 # --- ACTUALIZAR USUARIO MEJORADO (Soporta edición parcial) ---
 @app.put("/usuarios/{usuario_id}", response_model=UsuarioOut, tags=["usuarios"])
-async def actualizar_usuario(usuario_id: str, usuario: UsuarioUpdate):
-    oid = ensure_objectid(usuario_id)
+async def actualizar_usuario(usuario_id: str, usuario: UsuarioUpdate,
+                             sesion: Sesion = Depends(sesion_actual)):
+    oid = ensure_id(usuario_id)
+    exigir_propio(sesion, oid)
+    if usuario.is_admin and not sesion.is_admin:
+        raise HTTPException(status_code=403, detail="Solo un administrador puede otorgar el rol de administrador")
     
     # 1. Filtramos los datos: Solo usamos lo que no sea None
     user_dict = {k: v for k, v in usuario.model_dump().items() if v is not None}
 
     # 2. Si enviaron password nueva, la encriptamos
     if "password" in user_dict:
-        user_dict["password"] = get_password_hash(user_dict["password"])
+        user_dict["password"] = await hash_password_async(user_dict["password"])
 
     if not user_dict:
         raise HTTPException(status_code=400, detail="No se enviaron datos para actualizar")
 
-    # 3. Actualizamos en Mongo (usando $set)
-    res = await usuarios_col.update_one({"_id": oid}, {"$set": user_dict})
+    # 3. Actualizamos (equivalente a $set) y recibimos el documento final
+    try:
+        doc = await almacen.usuarios.actualizar(oid, user_dict)
+    except Duplicado:
+        raise HTTPException(status_code=400, detail="Correo ya registrado")
     
-    if res.matched_count == 0:
+    if doc is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-    doc = await usuarios_col.find_one({"_id": oid})
     return usuario_doc_to_out(doc)
 
 
@@ -351,7 +816,7 @@ async def login(credentials: LoginRequest):
     """
     Login seguro verificando hash de contraseña.
     """
-    doc = await usuarios_col.find_one({"email": credentials.email})
+    doc = await almacen.usuarios.por_email(credentials.email)
     
     # 1. Verificar usuario
     if not doc:
@@ -359,82 +824,225 @@ async def login(credentials: LoginRequest):
 
     # 2. Verificar contraseña
     # Usamos .get() por compatibilidad con usuarios antiguos sin pass
-    if not verify_password(credentials.password, doc.get("password", "")):
+    hashed = doc.get("password", "")
+    if not await verify_password_async(credentials.password, hashed):
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
+    # 3. Si el hash usa otro costo, se regenera con el configurado
+    if hash_necesita_rehash(hashed):
+        nuevo_hash = await hash_password_async(credentials.password)
+        await almacen.usuarios.actualizar(doc["_id"], {"password": nuevo_hash})
+
     u = usuario_doc_to_out(doc)
     return {
         "status": "ok",
         "usuario_id": u.id,
         "nombre": u.nombre,
         "email": u.email,
-        "is_admin": u.is_admin
+        "is_admin": u.is_admin,
+        **tokens.par(u.id, u.is_admin),
     }
 
 
+async def _revocar(sesion: Sesion) -> bool:
+    """Revoca el token en el almacenamiento y en este proceso; False si ya lo estaba."""
+    nuevo = await almacen.revocaciones.revocar(sesion.jti, expira_en(sesion.exp))
+    tokens.revocar_local(sesion.jti, sesion.exp)
+    return nuevo
+
+
+@app.post("/auth/refresh", tags=["auth"])
+async def refrescar_sesion(body: RefrescoIn):
+    """
+    Cambia un token de refresco por un par nuevo. Cada token de refresco sirve
+    una vez: revocarlo es un insert con el jti como _id, así que si llega dos
+    veces (aunque sea a workers distintos) solo una gana.
+    """
+    try:
+        sesion = tokens.verificar(body.refresh_token, REFRESCO)
+    except TokenInvalido as exc:
+        raise no_autenticado(str(exc))
+    if not await _revocar(sesion):
+        raise no_autenticado("Token revocado")
+
+    # El rol se vuelve a leer: los cambios de is_admin se aplican al refrescar
+    try:
+        doc = await almacen.usuarios.obtener(almacen.parse_id(sesion.usuario_id))
+    except IdInvalido:
+        doc = None
+    if not doc:
+        raise no_autenticado("Usuario no encontrado")
+    return tokens.par(sesion.usuario_id, doc.get("is_admin", False))
+
+
+@app.post("/auth/logout", status_code=204, tags=["auth"])
+async def cerrar_sesion(
+    body: Optional[RefrescoIn] = None,
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+):
+    """Revoca el token de acceso (header) y el de refresco (body) que se envíen."""
+    enviados = [
+        (credenciales.credentials if credenciales else None, ACCESO),
+        (body.refresh_token if body else None, REFRESCO),
+    ]
+    for token, tipo in enviados:
+        if not token:
+            continue
+        try:
+            sesion = tokens.verificar(token, tipo)
+        except TokenInvalido:
+            continue  # vencido o ya revocado: no hay nada que hacer
+        await _revocar(sesion)
+    return Response(status_code=204)
+
+
 # ---------------------------------------------------------
 # PRODUCTOS
 # ---------------------------------------------------------
+async def invalidar_catalogo() -> None:
+    """Descarta la caché de este worker y avisa a los demás subiendo la versión compartida."""
+    catalogo_cache.invalidar()
+    await almacen.versiones.incrementar(VERSION_CATALOGO)
+
+
+async def respuesta_catalogo(request: Request, clave, cargar) -> Response:
+    """
+    Responde desde la caché del catálogo (bytes ya serializados + ETag).
+    Si el cliente ya tiene esa versión (If-None-Match) responde 304 sin cuerpo.
+    Antes se lee la versión compartida (una lectura por _id), así un cambio
+    hecho en otro worker se ve de inmediato y no recién al vencer el TTL.
+    """
+    catalogo_cache.sincronizar(await almacen.versiones.leer(VERSION_CATALOGO))
+    entrada = catalogo_cache.obtener(clave)
+    if entrada is None:
+        version = catalogo_cache.version
+        body = await cargar()
+        entrada = catalogo_cache.guardar(clave, body, version)
+
+    headers = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), entrada.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entrada.body, media_type="application/json", headers=headers)
+
+
+async def respuesta_idempotente(ruta: str, clave: Optional[str], entrada: BaseModel, crear, status_code: int = 201):
+    """
+    Con Idempotency-Key, la primera respuesta se guarda y los reintentos la
+    reciben tal cual (header Idempotent-Replayed) sin volver a ejecutar crear().
+    Sin la clave, crear() se ejecuta normalmente. Los llamadores incluyen al
+    usuario de la sesión en la ruta: la misma clave de otro usuario no recibe
+    la respuesta guardada.
+    """
+    if clave is None:
+        return await crear()
+
+    async def ejecutar():
+        modelo = await crear()
+        return status_code, modelo.model_dump_json().encode("utf-8")
+
+    huella = calcular_huella(entrada.model_dump_json().encode("utf-8"))
+    status, body, repetida = await idempotencia.ejecutar(almacen.idempotencia, f"{ruta}:{clave}", huella, ejecutar)
+    headers = {"Idempotent-Replayed": "true"} if repetida else None
+    return Response(content=body, status_code=status, media_type="application/json", headers=headers)
+
+
 @app.get("/productos", response_model=List[ProductoOut], tags=["productos"])
 async def listar_productos(
+    request: Request,
     q: Optional[str] = Query(None, description="Filtro por nombre"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
 ):
-    query = {}
-    if q:
-        query["nombre"] = {"$regex": q, "$options": "i"}
+    async def cargar() -> bytes:
+        docs = await almacen.productos.listar(q, skip, limit)
+        if SERIALIZACION_RAPIDA:
+            return serializacion.dumps([serializacion.producto_doc_a_dict(doc, manifiesto_estaticos.imagen) for doc in docs])
+        return productos_adapter.dump_json([producto_doc_to_out(doc) for doc in docs])
 
-    cursor = productos_col.find(query).skip(skip).limit(limit)
-    productos = []
-    async for doc in cursor:
-        productos.append(producto_doc_to_out(doc))
-    return productos
+    return await respuesta_catalogo(request, ("lista", q, skip, limit), cargar)
 
 
-@app.post("/productos", response_model=ProductoOut, status_code=201, tags=["productos"])
+@app.post("/productos", response_model=ProductoOut, status_code=201, tags=["productos"], dependencies=[Depends(solo_admin)])
 async def crear_producto(producto: ProductoIn):
-    res = await productos_col.insert_one(producto.model_dump())
-    doc = await productos_col.find_one({"_id": res.inserted_id})
+    doc = await almacen.productos.crear(producto.model_dump())
+    await invalidar_catalogo()
     return producto_doc_to_out(doc)
 
 
+# Las rutas /bulk van antes de /productos/{producto_id} para que "bulk" no se tome como id
+@app.post("/productos/bulk", response_model=List[ResultadoBulkOut], tags=["productos"], dependencies=[Depends(solo_admin)])
+async def crear_productos_bulk(productos: List[Dict[str, Any]] = Body(..., max_length=BULK_MAX)):
+    """
+    Crea varios productos con un solo insert_many. Cada item se valida por
+    separado: los inválidos se informan y el resto se crea igual.
+    """
+    resultados: List[Optional[ResultadoBulkOut]] = [None] * len(productos)
+    validos, posiciones = [], []
+    for i, datos in enumerate(productos):
+        try:
+            validos.append(ProductoIn.model_validate(datos).model_dump())
+            posiciones.append(i)
+        except ValidationError as exc:
+            err = exc.errors()[0]
+            campo = ".".join(str(parte) for parte in err["loc"])
+            resultados[i] = ResultadoBulkOut(indice=i, ok=False, error=f"{campo}: {err['msg']}" if campo else err["msg"])
+
+    if validos:
+        docs = await almacen.productos.crear_varios(validos)
+        await invalidar_catalogo()
+        for i, doc in zip(posiciones, docs):
+            resultados[i] = ResultadoBulkOut(indice=i, id=str(doc["_id"]), ok=True)
+    return resultados
+
+
+@app.patch("/productos/bulk/disponible", response_model=List[ResultadoBulkOut], tags=["productos"], dependencies=[Depends(solo_admin)])
+async def cambiar_disponibilidad_bulk(cambio: DisponibilidadBulkIn):
+    """Marca varios productos como disponibles / no disponibles en un solo update."""
+    unicos, validos = parsear_ids_bulk(cambio.ids)
+    hechos = await almacen.productos.actualizar_varios(list(validos.values()), {"disponible": cambio.disponible})
+    await invalidar_catalogo()
+    return resultados_bulk(unicos, validos, hechos, "Producto no encontrado")
+
+
 @app.get("/productos/{producto_id}", response_model=ProductoOut, tags=["productos"])
-async def obtener_producto(producto_id: str):
-    oid = ensure_objectid(producto_id)
-    doc = await productos_col.find_one({"_id": oid})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return producto_doc_to_out(doc)
+async def obtener_producto(request: Request, producto_id: str):
+    oid = ensure_id(producto_id)
+
+    async def cargar() -> bytes:
+        doc = await almacen.productos.obtener(oid)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        return producto_doc_to_out(doc).model_dump_json().encode("utf-8")
 
+    return await respuesta_catalogo(request, ("producto", oid), cargar)
 
-@app.put("/productos/{producto_id}", response_model=ProductoOut, tags=["productos"])
+
+@app.put("/productos/{producto_id}", response_model=ProductoOut, tags=["productos"], dependencies=[Depends(solo_admin)])
 async def actualizar_producto(producto_id: str, producto: ProductoIn):
-    oid = ensure_objectid(producto_id)
-    res = await productos_col.update_one({"_id": oid}, {"$set": producto.model_dump()})
-    if res.matched_count == 0:
+    oid = ensure_id(producto_id)
+    doc = await almacen.productos.actualizar(oid, producto.model_dump())
+    await invalidar_catalogo()
+    if doc is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    doc = await productos_col.find_one({"_id": oid})
     return producto_doc_to_out(doc)
 
 
-@app.delete("/productos/{producto_id}", status_code=204, tags=["productos"])
+@app.delete("/productos/{producto_id}", status_code=204, tags=["productos"], dependencies=[Depends(solo_admin)])
 async def eliminar_producto(producto_id: str):
-    oid = ensure_objectid(producto_id)
-    res = await productos_col.delete_one({"_id": oid})
-    if res.deleted_count == 0:
+    oid = ensure_id(producto_id)
+    eliminado = await almacen.productos.eliminar(oid)
+    await invalidar_catalogo()
+    if not eliminado:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return None
 
 
-@app.patch("/productos/{producto_id}/disponible", tags=["productos"])
+@app.patch("/productos/{producto_id}/disponible", tags=["productos"], dependencies=[Depends(solo_admin)])
 async def cambiar_disponibilidad(producto_id: str, nuevo_estado: bool = Query(...)):
-    oid = ensure_objectid(producto_id)
-    res = await productos_col.update_one(
-        {"_id": oid},
-        {"$set": {"disponible": nuevo_estado}}
-    )
-    if res.matched_count == 0:
+    oid = ensure_id(producto_id)
+    doc = await almacen.productos.actualizar(oid, {"disponible": nuevo_estado})
+    await invalidar_catalogo()
+    if doc is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     return {
@@ -448,47 +1056,95 @@ async def cambiar_disponibilidad(producto_id: str, nuevo_estado: bool = Query(..
 # PEDIDOS (Carrito + Estado + Reportes)
 # ---------------------------------------------------------
 @app.get("/pedidos", response_model=List[PedidoOut], tags=["pedidos"])
-async def listar_pedidos(usuario_id: Optional[str] = Query(None)):
+async def listar_pedidos(
+    request: Request,
+    response: Response,
+    usuario_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=PEDIDOS_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="Token 'next' de la página anterior"),
+    sesion: Sesion = Depends(sesion_actual),
+):
     """
-    Lista pedidos. Si se da usuario_id, filtra por usuario.
-    Recupera nombres de productos para reportes históricos.
+    Lista pedidos (más recientes primero). Si se da usuario_id, filtra por
+    usuario; un cliente solo ve los suyos (con o sin usuario_id).
+
+    Paginación por cursor: el token de la página siguiente viaja en el
+    header X-Next-Cursor. Con "Accept: application/x-ndjson" se transmiten
+    todos los pedidos línea a línea, sin cargarlos en memoria.
     """
-    query = {}
-    if usuario_id:
-        query["usuario_id"] = ensure_objectid(usuario_id)
-    
-    cursor = pedidos_col.find(query)
-    pedidos_lista = []
-    
-    async for doc in cursor:
-        pedidos_lista.append(pedido_doc_to_out(doc))
-        
-    return pedidos_lista
+    uid = ensure_id(usuario_id) if usuario_id else None
+    if not sesion.is_admin:
+        if uid is not None:
+            exigir_propio(sesion, uid)
+        uid = ensure_id(sesion.usuario_id)
+    despues = decode_cursor(cursor) if cursor else None
+
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        async def stream():
+            async for doc in almacen.pedidos.iterar(uid, despues):
+                if SERIALIZACION_RAPIDA:
+                    yield serializacion.dumps(serializacion.pedido_doc_a_dict(doc)) + b"\n"
+                else:
+                    yield pedido_doc_to_out(doc).model_dump_json() + "\n"
+
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+    # Se pide un documento extra para saber si existe página siguiente
+    docs = await almacen.pedidos.listar(uid, despues, limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1])
+
+    if SERIALIZACION_RAPIDA:
+        return serializacion.JSONRapidoResponse(
+            [serializacion.pedido_doc_a_dict(doc) for doc in docs],
+            headers=dict(response.headers),
+        )
+    return [pedido_doc_to_out(doc) for doc in docs]
+
+
+IdempotencyKey = Header(None, alias="Idempotency-Key", max_length=255, description="Reintentos seguros")
 
 
 @app.post("/pedidos", response_model=PedidoOut, status_code=201, tags=["pedidos"])
-async def crear_pedido(pedido: PedidoIn):
-    usuario_oid = ensure_objectid(pedido.usuario_id)
+async def crear_pedido(pedido: PedidoIn, idempotency_key: Optional[str] = IdempotencyKey,
+                       sesion: Sesion = Depends(sesion_actual)):
+    """El pedido queda a nombre del usuario de la sesión (un administrador puede indicar otro)."""
+    pedido = pedido.model_copy(update={"usuario_id": pedido.usuario_id or sesion.usuario_id})
+    exigir_propio(sesion, pedido.usuario_id)
+    return await respuesta_idempotente(
+        f"pedidos:{sesion.usuario_id}", idempotency_key, pedido, lambda: insertar_pedido(pedido)
+    )
 
-    usuario_doc = await usuarios_col.find_one({"_id": usuario_oid})
+
+async def insertar_pedido(pedido: PedidoIn) -> PedidoOut:
+    usuario_oid = ensure_id(pedido.usuario_id)
+
+    usuario_doc = await almacen.usuarios.obtener(usuario_oid)
     if not usuario_doc:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
+    # Resolver todos los productos en una sola consulta ($in)
+    prod_oids = [ensure_id(item.producto_id) for item in pedido.items]
+    productos = await almacen.productos.obtener_varios(prod_oids)
+
     items_db = []
+    faltantes = []
     total = 0.0
 
-    for item in pedido.items:
-        prod_oid = ensure_objectid(item.producto_id)
-        prod_doc = await productos_col.find_one({"_id": prod_oid})
+    for item, prod_oid in zip(pedido.items, prod_oids):
+        prod_doc = productos.get(prod_oid)
         if not prod_doc:
             raise HTTPException(status_code=404, detail=f"Producto {item.producto_id} no encontrado")
 
         stock_actual = prod_doc.get("stock", 0)
         if stock_actual < item.cantidad:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Stock insuficiente para {prod_doc['nombre']}. Disponible: {stock_actual}",
-            )
+            faltantes.append({
+                "producto_id": item.producto_id,
+                "nombre": prod_doc["nombre"],
+                "pedido": item.cantidad,
+                "disponible": stock_actual,
+            })
 
         precio = float(prod_doc["precio"])
         subtotal = precio * item.cantidad
@@ -504,74 +1160,270 @@ async def crear_pedido(pedido: PedidoIn):
             }
         )
 
+    # Se informan todos los productos sin stock, no solo el primero
+    if faltantes:
+        raise StockInsuficienteError(faltantes, "Stock insuficiente")
+
     doc_insert = {
         "usuario_id": usuario_oid,
         "items": items_db,
-        "estado": pedido.estado,
+        "estado": EstadoPedido.PENDIENTE.value,
         "total": total,
         "fecha": datetime.now().isoformat()
     }
 
-    res = await pedidos_col.insert_one(doc_insert)
-    doc = await pedidos_col.find_one({"_id": res.inserted_id})
+    await almacen.pedidos.crear(doc_insert)
+    return pedido_doc_to_out(doc_insert)
 
-    return pedido_doc_to_out(doc)
+
+async def registrar_pago(oid, estado_anterior: str, nuevo_estado: str, cantidades: dict) -> dict:
+    """
+    Marca el pedido como pagado y descuenta su stock de forma atómica.
+    El cambio de estado se condiciona al estado leído, así dos cajeros
+    no pueden pagar el mismo pedido dos veces. Devuelve el pedido actualizado.
+    """
+    try:
+        return await almacen.pedidos.pagar(oid, estado_anterior, nuevo_estado, cantidades)
+    finally:
+        # El stock es parte del catálogo publicado
+        await invalidar_catalogo()
 
 
 @app.get("/pedidos/{pedido_id}", response_model=PedidoOut, tags=["pedidos"])
-async def obtener_pedido(pedido_id: str):
-    oid = ensure_objectid(pedido_id)
-    doc = await pedidos_col.find_one({"_id": oid})
+async def obtener_pedido(pedido_id: str, sesion: Sesion = Depends(sesion_actual)):
+    oid = ensure_id(pedido_id)
+    doc = await almacen.pedidos.obtener(oid)
     if not doc:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    exigir_propio(sesion, doc["usuario_id"])
     return pedido_doc_to_out(doc)
 
 
-@app.patch("/pedidos/{pedido_id}/estado", response_model=PedidoOut, tags=["pedidos"])
-async def cambiar_estado_pedido(pedido_id: str, nuevo_estado: str = Query(...)):
-    oid = ensure_objectid(pedido_id)
-    doc = await pedidos_col.find_one({"_id": oid})
+@app.get("/pedidos/{pedido_id}/detalle", response_model=PedidoDetalleOut, tags=["pedidos"])
+async def obtener_pedido_detalle(pedido_id: str, sesion: Sesion = Depends(sesion_actual)):
+    """
+    Pedido con su cliente, los productos de cada línea y la boleta (si existe),
+    resuelto en una sola consulta (en Mongo, una agregación con $lookup).
+    """
+    oid = ensure_id(pedido_id)
+    doc = await almacen.pedidos.detalle(oid)
     if not doc:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    exigir_propio(sesion, doc["usuario_id"])
+
+    cliente = doc["cliente"][0] if doc["cliente"] else None
+    return PedidoDetalleOut(
+        pedido=pedido_doc_to_out(doc),
+        cliente=ClienteResumenOut(id=str(cliente["_id"]), nombre=cliente["nombre"], email=cliente["email"]) if cliente else None,
+        productos=[producto_doc_to_out(p) for p in doc["productos"]],
+        boleta=boleta_doc_to_out(doc["boleta"][0]) if doc["boleta"] else None,
+    )
 
-    estado_anterior = doc["estado"]
 
-    # Si pasa a PAGADO, descontar stock
-    if nuevo_estado.lower() == "pagado" and estado_anterior.lower() != "pagado":
+def error_transicion(actual: str, nuevo: EstadoPedido) -> HTTPException:
+    return HTTPException(status_code=409, detail=f"Un pedido {actual} no puede pasar a {nuevo.value}")
+
+
+async def aplicar_estado(oid, nuevo_estado: EstadoPedido, sesion: Optional[Sesion] = None) -> dict:
+    """
+    Cambia el estado de un pedido (pagarlo descuenta stock) y devuelve el
+    pedido actualizado. Solo se permiten las transiciones de TRANSICIONES
+    (models/pedido.py); las demás responden 409. Con la sesión de un
+    cliente, el pedido tiene que ser suyo (403 si no).
+    """
+    # Si pasa a PAGADO, descontar stock (requiere leer los items y el estado previo)
+    if nuevo_estado == EstadoPedido.PAGADO:
+        doc = await almacen.pedidos.obtener(oid)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        if sesion is not None:
+            exigir_propio(sesion, doc["usuario_id"])
+
+        estado_anterior = doc["estado"]
+        if not transicion_valida(estado_anterior, nuevo_estado):
+            raise error_transicion(estado_anterior, nuevo_estado)
+        if estado_anterior.lower() == nuevo_estado:
+            return doc
+
+        # Cantidades agrupadas por producto (un producto puede repetirse en el pedido)
+        cantidades: dict = {}
         for item in doc.get("items", []):
-            prod_oid = item["producto_id"]
-            cantidad = item["cantidad"]
-            prod_doc = await productos_col.find_one({"_id": prod_oid})
-            if not prod_doc:
-                continue
-            
-            stock_actual = prod_doc.get("stock", 0)
-            nuevo_stock = stock_actual - cantidad
-            if nuevo_stock < 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Stock insuficiente al pagar. Producto: {prod_doc['nombre']}",
-                )
-            await productos_col.update_one(
-                {"_id": prod_oid},
-                {"$set": {"stock": nuevo_stock}},
-            )
-
-    await pedidos_col.update_one({"_id": oid}, {"$set": {"estado": nuevo_estado}})
-    doc_actualizado = await pedidos_col.find_one({"_id": oid})
-    return pedido_doc_to_out(doc_actualizado)
+            cantidades[item["producto_id"]] = cantidades.get(item["producto_id"], 0) + item["cantidad"]
+        return await registrar_pago(oid, estado_anterior, nuevo_estado.value, cantidades)
+
+    # Un cliente (solo puede anular) se revisa antes: la lectura extra es solo suya
+    if sesion is not None and not sesion.is_admin:
+        doc = await almacen.pedidos.obtener(oid)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        exigir_propio(sesion, doc["usuario_id"])
+
+    # El resto, en una sola operación condicionada a los estados de origen válidos
+    doc_actualizado = await almacen.pedidos.cambiar_estado(
+        oid, nuevo_estado.value, estado_esperado=estados_origen(nuevo_estado)
+    )
+    if not doc_actualizado:
+        doc = await almacen.pedidos.obtener(oid)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        raise error_transicion(doc["estado"], nuevo_estado)
+    return doc_actualizado
+
+
+@app.patch("/pedidos/bulk/estado", response_model=List[ResultadoBulkOut], tags=["pedidos"], dependencies=[Depends(solo_admin)])
+async def cambiar_estado_pedidos_bulk(cambio: EstadoBulkIn):
+    """
+    Cambia el estado de varios pedidos (ej: despachar un lote) en un solo
+    update. Pagar descuenta stock de cada pedido en su propia operación
+    atómica, así que ese estado se procesa pedido por pedido.
+    """
+    unicos, validos = parsear_ids_bulk(cambio.ids)
+    oids = list(validos.values())
+    errores: dict = {}
+    sin_cambio: List[dict] = []
+
+    if cambio.nuevo_estado == EstadoPedido.PAGADO:
+        docs = []
+        for id_str, oid in validos.items():
+            try:
+                docs.append(await aplicar_estado(oid, cambio.nuevo_estado))
+            except HTTPException as exc:
+                errores[id_str] = exc.detail if isinstance(exc.detail, str) else exc.detail["mensaje"]
+    else:
+        docs, sin_cambio = await almacen.pedidos.cambiar_estado_varios(
+            oids, cambio.nuevo_estado.value, estados_origen(cambio.nuevo_estado)
+        )
+        # Solo se publican los que cambiaron; repetir el estado no es error
+        id_por_oid = {oid: id_str for id_str, oid in validos.items()}
+        for doc in sin_cambio:
+            if doc["estado"] != cambio.nuevo_estado:
+                errores[id_por_oid[doc["_id"]]] = error_transicion(doc["estado"], cambio.nuevo_estado).detail
+
+    if change_stream_task is None:
+        for doc in docs:
+            publicar_cambio_pedido(doc)
+    hechos = {doc["_id"] for doc in docs + sin_cambio}
+    return resultados_bulk(unicos, validos, hechos, "Pedido no encontrado", errores)
+
+
+@app.patch("/pedidos/{pedido_id}/estado", response_model=PedidoOut, tags=["pedidos"])
+async def cambiar_estado_pedido(pedido_id: str, nuevo_estado: EstadoPedido = Query(...),
+                                sesion: Sesion = Depends(sesion_actual)):
+    """El cliente paga o anula sus pedidos; preparar, despachar y entregar es de administradores."""
+    if nuevo_estado not in ESTADOS_CLIENTE and not sesion.is_admin:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    oid = ensure_id(pedido_id)
+    pedido_out = pedido_doc_to_out(await aplicar_estado(oid, nuevo_estado, sesion))
+
+    # Con change stream activo el evento llega desde Mongo a todos los workers
+    if change_stream_task is None:
+        bus_pedidos.publicar(str(oid), pedido_out)
+        aviso_cocina.avisar()
+    return pedido_out
+
+
+@app.get("/pedidos/{pedido_id}/eventos", tags=["pedidos"])
+async def eventos_pedido(pedido_id: str, sesion: Sesion = Depends(sesion_eventos)):
+    """
+    Server-Sent Events con el estado del pedido: envía el pedido actual al
+    conectar y luego un evento por cada cambio. Sin cambios no hay tráfico.
+    Solo para el dueño del pedido o un administrador.
+    """
+    oid = ensure_id(pedido_id)
+
+    # Suscribirse antes de leer para no perder un cambio entre ambos pasos
+    cola = bus_pedidos.suscribir(str(oid))
+    try:
+        doc = await almacen.pedidos.obtener(oid)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        exigir_propio(sesion, doc["usuario_id"])
+    except HTTPException:
+        bus_pedidos.desuscribir(str(oid), cola)
+        raise
+
+    async def stream():
+        try:
+            evento = pedido_doc_to_out(doc)
+            while True:
+                yield f"event: estado\ndata: {evento.model_dump_json()}\n\n"
+                evento = await cola.get()
+        finally:
+            bus_pedidos.desuscribir(str(oid), cola)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------------------------------------
+# COCINA
+# ---------------------------------------------------------
+COLA_COCINA_MAX = 200
+ESPERA_COCINA_MAX = 60
+
+
+def version_cola(docs: List[dict]) -> str:
+    """Identifica el contenido de la cola: cambia si entra, sale o cambia de estado un pedido."""
+    huella = hashlib.blake2b(digest_size=8)
+    for doc in docs:
+        huella.update(f"{doc['_id']}:{doc['estado']};".encode())
+    return huella.hexdigest()
+
+
+@app.get("/cocina/cola", response_model=List[PedidoOut], tags=["cocina"], dependencies=[Depends(solo_admin)])
+async def cola_cocina(
+    response: Response,
+    esperar: int = Query(0, ge=0, le=ESPERA_COCINA_MAX, description="Segundos de espera (long-poll)"),
+    version: Optional[str] = Query(None, description="X-Cola-Version de la respuesta anterior"),
+    limit: int = Query(100, ge=1, le=COLA_COCINA_MAX),
+):
+    """
+    Pedidos pagados y en preparación, los más antiguos primero (índice
+    estado_fecha). Con `esperar` y la `version` recibida antes, la respuesta
+    se retiene hasta que la cola cambie o pase el tiempo: las pantallas de
+    cocina hacen una petición por cambio en vez de sondear /pedidos.
+    """
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + esperar
+    while True:
+        # Tomar el evento antes de leer: un cambio durante la lectura no se pierde
+        evento = aviso_cocina.evento()
+        docs = await almacen.pedidos.cola([e.value for e in ESTADOS_COCINA], limit)
+        actual = version_cola(docs)
+        restante = fin - loop.time()
+        if version is None or actual != version or restante <= 0:
+            break
+        try:
+            await asyncio.wait_for(evento.wait(), restante)
+        except asyncio.TimeoutError:
+            pass
+
+    response.headers["X-Cola-Version"] = actual
+    response.headers["Cache-Control"] = "no-store"
+    return [pedido_doc_to_out(doc) for doc in docs]
 
 
 # ---------------------------------------------------------
 # BOLETAS
 # ---------------------------------------------------------
 @app.post("/boletas", response_model=BoletaOut, status_code=201, tags=["boletas"])
-async def crear_boleta(boleta_in: BoletaIn):
-    pedido_oid = ensure_objectid(boleta_in.pedido_id)
-    pedido_doc = await pedidos_col.find_one({"_id": pedido_oid})
+async def crear_boleta(boleta_in: BoletaIn, idempotency_key: Optional[str] = IdempotencyKey,
+                       sesion: Sesion = Depends(sesion_actual)):
+    return await respuesta_idempotente(
+        f"boletas:{sesion.usuario_id}", idempotency_key, boleta_in, lambda: insertar_boleta(boleta_in, sesion)
+    )
+
+
+async def insertar_boleta(boleta_in: BoletaIn, sesion: Sesion) -> BoletaOut:
+    pedido_oid = ensure_id(boleta_in.pedido_id)
+    pedido_doc = await almacen.pedidos.obtener(pedido_oid)
 
     if not pedido_doc:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    exigir_propio(sesion, pedido_doc["usuario_id"])
 
     estado_actual = pedido_doc.get("estado", "pendiente")
     if estado_actual.lower() != "pagado":
@@ -584,16 +1436,108 @@ async def crear_boleta(boleta_in: BoletaIn):
         "total": total,
     }
 
-    res = await boletas_col.insert_one(doc_insert)
-    doc = await boletas_col.find_one({"_id": res.inserted_id})
+    try:
+        await almacen.boletas.crear(doc_insert)
+    except Duplicado:
+        raise HTTPException(status_code=409, detail="El pedido ya tiene una boleta generada")
 
-    return boleta_doc_to_out(doc)
+    return boleta_doc_to_out(doc_insert)
 
 
 @app.get("/boletas/{boleta_id}", response_model=BoletaOut, tags=["boletas"])
 async def obtener_boleta(boleta_id: str):
-    oid = ensure_objectid(boleta_id)
-    doc = await boletas_col.find_one({"_id": oid})
+    oid = ensure_id(boleta_id)
+    doc = await almacen.boletas.obtener(oid)
     if not doc:
         raise HTTPException(status_code=404, detail="Boleta no encontrada")
-    return boleta_doc_to_out(doc)
\ No newline at end of file
+    return boleta_doc_to_out(doc)
+
+# ---------------------------------------------------------
+# REPORTES
+# ---------------------------------------------------------
+@app.get("/reportes/ventas", response_model=List[VentaReporteOut], tags=["reportes"], dependencies=[Depends(solo_admin)])
+async def reporte_ventas(
+    estado: List[str] = Query(["pagado", "entregado"], description="Estados a considerar"),
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    producto: Optional[str] = Query(None, description="Filtro por nombre de producto"),
+    agrupar: Literal["producto", "dia", "producto_dia"] = Query("producto_dia"),
+):
+    """
+    Resumen de ventas calculado por el almacenamiento (en Mongo, un pipeline
+    de agregación). Solo viajan las filas agrupadas, no los pedidos completos.
+    """
+    # Las fechas se guardan como ISO string, por lo que se comparan como texto.
+    # "hasta" es inclusivo: se corta al inicio del día siguiente.
+    filas = await almacen.pedidos.reporte_ventas(
+        estado,
+        desde.isoformat() if desde else None,
+        (hasta + timedelta(days=1)).isoformat() if hasta else None,
+        producto,
+        agrupar,
+    )
+    return [venta_fila_to_out(f) for f in filas]
+
+
+@app.get("/reportes/ventas/diarias", response_model=List[VentaReporteOut], tags=["reportes"], dependencies=[Depends(solo_admin)])
+async def reporte_ventas_diarias(
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    producto: Optional[str] = Query(None, description="Filtro por nombre de producto"),
+    agrupar: Literal["producto", "dia", "producto_dia"] = Query("producto_dia"),
+):
+    """
+    Ventas (pedidos pagados y no anulados) leídas del rollup ventas_diarias:
+    una fila por día y producto, mantenida al pagar y al anular. Un año son
+    ~365 x productos documentos, sin recorrer los pedidos.
+    """
+    filas = await almacen.ventas.consultar(
+        desde.isoformat() if desde else None,
+        (hasta + timedelta(days=1)).isoformat() if hasta else None,
+        producto,
+        agrupar,
+    )
+    return [venta_fila_to_out(f) for f in filas]
+
+
+# ---------------------------------------------------------
+# Línea de comandos
+# ---------------------------------------------------------
+async def _check_indexes():
+    cliente = AsyncIOMotorClient(MONGODB_URI, **opciones_mongo())
+    try:
+        base = cliente[DB_NAME]
+        await indices.asegurar_indices(base)
+        await indices.revisar_planes(base)
+    finally:
+        cliente.close()
+
+
+async def _backfill_ventas():
+    await almacen.iniciar()
+    try:
+        print(f"📊 ventas_diarias reconstruido: {await almacen.ventas.reconstruir()} registros")
+    finally:
+        await almacen.cerrar()
+
+
+def _build_static():
+    inicio = time.perf_counter()
+    datos = estaticos.construir(FRONTEND_DIR, ESTATICOS_DIR, forzar=True)
+    print(f"🖼️  {len(datos['archivos'])} archivos y "
+          f"{sum(len(m) for m in datos['miniaturas'].values())} miniaturas en {ESTATICOS_DIR} "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    # python main.py --check-indexes  -> verifica índices y muestra los planes de explain()
+    # python main.py --backfill-ventas -> recalcula ventas_diarias desde los pedidos
+    # python main.py --build-static   -> prepara el frontend (hash, .br/.gz, miniaturas)
+    if "--check-indexes" in sys.argv:
+        asyncio.run(_check_indexes())
+    elif "--backfill-ventas" in sys.argv:
+        asyncio.run(_backfill_ventas())
+    elif "--build-static" in sys.argv:
+        _build_static()
+    else:
+        print("Uso: python main.py --check-indexes | --backfill-ventas | --build-static  (para servir la API: uvicorn main:app)")
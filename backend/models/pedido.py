@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, FrozenSet, List, Literal, Optional
 from enum import Enum
 from pydantic import BaseModel, Field
 
@@ -12,18 +12,61 @@ class EstadoPedido(str, Enum):
     ANULADO = "anulado"
 
 
+# Transiciones permitidas: estado actual -> estados a los que puede pasar.
+# Repetir el estado actual se acepta (reintentos) y no cuenta como transición.
+# Es la única tabla: la usan la API de MongoDB (main.py) y la de memoria.
+TRANSICIONES: Dict[EstadoPedido, FrozenSet[EstadoPedido]] = {
+    EstadoPedido.PENDIENTE: frozenset({EstadoPedido.PAGADO, EstadoPedido.ANULADO}),
+    EstadoPedido.PAGADO: frozenset({EstadoPedido.PREPARANDO, EstadoPedido.ANULADO}),
+    EstadoPedido.PREPARANDO: frozenset({EstadoPedido.DESPACHADO, EstadoPedido.ENTREGADO, EstadoPedido.ANULADO}),
+    EstadoPedido.DESPACHADO: frozenset({EstadoPedido.ENTREGADO}),
+    EstadoPedido.ENTREGADO: frozenset(),
+    EstadoPedido.ANULADO: frozenset(),
+}
+
+# Pedidos que la cocina tiene que atender, en orden de llegada
+ESTADOS_COCINA = (EstadoPedido.PAGADO, EstadoPedido.PREPARANDO)
+
+# Lo único que un cliente puede hacer con sus pedidos; el resto es de la cocina
+ESTADOS_CLIENTE = (EstadoPedido.PAGADO, EstadoPedido.ANULADO)
+
+
+def transicion_valida(actual: str, nuevo: str) -> bool:
+    """actual puede ser un estado antiguo fuera del enum: solo se permite repetirlo."""
+    actual = actual.lower()  # pedidos guardados antes del enum ("Pendiente")
+    if actual == nuevo:
+        return True
+    try:
+        return EstadoPedido(nuevo) in TRANSICIONES[EstadoPedido(actual)]
+    except ValueError:
+        return False
+
+
+def estados_origen(nuevo: EstadoPedido) -> List[str]:
+    """Estados desde los que se puede llegar a `nuevo` (incluido él mismo)."""
+    return [nuevo.value] + [e.value for e, destinos in TRANSICIONES.items() if nuevo in destinos]
+
+
 class DetallePedido(BaseModel):
     producto_id: int = Field(description="ID del producto")
     cantidad: int = Field(gt=0, description="Cantidad solicitada")
 
 
+class DetallePedidoOut(DetallePedido):
+    precio_unitario: float = Field(ge=0, description="Precio del producto al momento del pedido")
+    subtotal: float = Field(ge=0, description="precio_unitario * cantidad")
+
+
 class PedidoIn(BaseModel):
     usuario_id: int = Field(description="ID del usuario que realiza el pedido")
     items: List[DetallePedido]
-    estado: EstadoPedido = Field(default=EstadoPedido.PENDIENTE)
+    # Todo pedido nace pendiente: los demás estados llegan por transiciones
+    estado: Literal[EstadoPedido.PENDIENTE] = Field(default=EstadoPedido.PENDIENTE)
     comentario: Optional[str] = Field(default=None, description="Comentarios del cliente")
 
 
 class PedidoOut(PedidoIn):
     id: int
-    total: float = Field(ge=0, description="Total del pedido calculado en base a los productos")
+    items: List[DetallePedidoOut]
+    estado: EstadoPedido = Field(default=EstadoPedido.PENDIENTE)
+    total: float = Field(ge=0, description="Total del pedido con los precios al momento de crearlo")
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 
 from models.pedido import PedidoIn, PedidoOut, EstadoPedido
 from services import pedido_service
@@ -9,8 +9,8 @@ router = APIRouter(prefix="/pedidos", tags=["pedidos"])
 
 
 @router.get("", response_model=List[PedidoOut])
-def listar_pedidos():
-    return pedido_service.listar_pedidos()
+def listar_pedidos(usuario_id: Optional[int] = Query(default=None, description="Solo pedidos de este usuario")):
+    return pedido_service.listar_pedidos(usuario_id)
 
 
 @router.post("", response_model=PedidoOut, status_code=201)
@@ -3,7 +3,7 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Query
 
 from models.producto import ProductoIn, ProductoOut
-from data.db import db_productos, seq_productos
+from data.db import productos, db_productos, seq_productos
 
 router = APIRouter(prefix="/productos", tags=["productos"])
 
@@ -14,11 +14,8 @@ def listar_productos(
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=50, ge=1, le=200),
 ):
-    items: List[ProductoOut] = []
-    for pid, prod in db_productos.items():
-        if q is None or q.lower() in prod.nombre.lower():
-            items.append(ProductoOut(id=pid, **prod.model_dump()))
-    return items[skip : skip + limit]
+    # Se pagina sobre los ids y solo se materializa la página pedida
+    return [ProductoOut(id=pid, **db_productos[pid].model_dump()) for pid in productos.pagina(skip, limit, q)]
 
 
 @router.post("", response_model=ProductoOut, status_code=201)
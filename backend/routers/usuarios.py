@@ -4,7 +4,7 @@ from fastapi import APIRouter, Body, HTTPException, Query
 from pydantic import EmailStr
 
 from models.usuario import UsuarioIn, UsuarioOut
-from data.db import db_usuarios, seq_usuarios
+from data.db import usuarios, db_usuarios, seq_usuarios
 
 router = APIRouter(prefix="/usuarios", tags=["usuarios"])
 
@@ -15,11 +15,8 @@ def listar_usuarios(
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=50, ge=1, le=200),
 ):
-    items: List[UsuarioOut] = []
-    for uid, usr in db_usuarios.items():
-        if q is None or q.lower() in usr.nombre.lower():
-            items.append(UsuarioOut(id=uid, **usr.model_dump()))
-    return items[skip : skip + limit]
+    # Se pagina sobre los ids y solo se materializa la página pedida
+    return [UsuarioOut(id=uid, **db_usuarios[uid].model_dump()) for uid in usuarios.pagina(skip, limit, q)]
 
 
 @router.post("", response_model=UsuarioOut, status_code=201)
@@ -54,12 +51,13 @@ def eliminar_usuario(usuario_id: int):
 
 @router.post("/login", tags=["auth"])
 def login(email: EmailStr = Body(..., embed=True)):
-    for uid, usr in db_usuarios.items():
-        if usr.email == email:
-            return {
-                "status": "ok",
-                "usuario_id": uid,
-                "nombre": usr.nombre,
-                "email": usr.email,
-            }
-    raise HTTPException(status_code=401, detail="Correo no registrado")
+    uid = usuarios.indices["email"].primero(email)
+    if uid is None:
+        raise HTTPException(status_code=401, detail="Correo no registrado")
+    usr = db_usuarios[uid]
+    return {
+        "status": "ok",
+        "usuario_id": uid,
+        "nombre": usr.nombre,
+        "email": usr.email,
+    }
@@ -2,7 +2,6 @@ from fastapi import HTTPException
 
 from models.boleta import Boleta
 from data.db import db_boletas, seq_boletas, db_pedidos
-from .pedido_service import calcular_total
 
 
 def generar_boleta(pedido_id: int) -> Boleta:
@@ -10,9 +9,8 @@ def generar_boleta(pedido_id: int) -> Boleta:
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
 
-    total = calcular_total(pedido.items)
     new_id = next(seq_boletas)
-    boleta = Boleta(id=new_id, pedido_id=pedido_id, total=total)
+    boleta = Boleta(id=new_id, pedido_id=pedido_id, total=pedido.total)
     db_boletas[new_id] = boleta
     return boleta
 
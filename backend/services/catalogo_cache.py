@@ -0,0 +1,71 @@
+import time
+import hashlib
+from typing import Dict, Hashable, NamedTuple, Optional
+
+# Caché en memoria del catálogo de productos.
+# Guarda la respuesta ya serializada (bytes) junto a su ETag, de modo que un
+# acierto no consulta los productos ni pasa por Pydantic. Cualquier escritura
+# sobre productos invalida todo el catálogo: en este proceso con invalidar() y
+# en los demás con la versión compartida del almacén, que cada petición compara
+# con sincronizar(). El TTL es solo una red de seguridad por si algún cambio
+# llega por fuera de la API.
+
+
+class Entrada(NamedTuple):
+    body: bytes
+    etag: str
+    expira: float
+
+
+class CatalogoCache:
+    def __init__(self, ttl: float = 60.0, max_entradas: int = 256):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: Dict[Hashable, Entrada] = {}
+        self.version = 0
+        self.version_compartida: Optional[int] = None
+
+    def obtener(self, clave: Hashable) -> Optional[Entrada]:
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada.expira < time.monotonic():
+            self._entradas.pop(clave, None)
+            return None
+        return entrada
+
+    def guardar(self, clave: Hashable, body: bytes, version: int) -> Entrada:
+        """
+        Guarda la respuesta si el catálogo no cambió desde que se leyó
+        (version es la que tenía la caché antes de consultar Mongo).
+        """
+        entrada = Entrada(body=body, etag=calcular_etag(body), expira=time.monotonic() + self.ttl)
+        if version != self.version:
+            return entrada
+        if len(self._entradas) >= self.max_entradas:
+            # Se descarta la entrada más antigua (orden de inserción)
+            self._entradas.pop(next(iter(self._entradas)))
+        self._entradas[clave] = entrada
+        return entrada
+
+    def invalidar(self) -> None:
+        self.version += 1
+        self._entradas.clear()
+
+    def sincronizar(self, version_compartida: int) -> None:
+        """Si otro proceso cambió el catálogo desde la última vez, se descarta todo."""
+        if version_compartida != self.version_compartida:
+            self.version_compartida = version_compartida
+            self.invalidar()
+
+
+def calcular_etag(body: bytes) -> str:
+    """ETag fuerte: depende exactamente de los bytes de la respuesta."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
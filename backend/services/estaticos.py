@@ -0,0 +1,262 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import mimetypes
+import posixpath
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se generan variantes .gz
+    brotli = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él no hay miniaturas WebP
+    Image = None
+
+# Frontend servido por la API (GET /app/...), preparado una vez:
+#   - los JS, CSS e imágenes se copian con un hash del contenido en el nombre
+#     (menu.3f2a9c01d4.js) y se sirven con caché inmutable de un año;
+#   - los HTML conservan su nombre (son las URLs de entrada), se reescriben
+#     para apuntar a los archivos con hash y se revalidan con ETag;
+#   - HTML/JS/CSS llevan variantes .br y .gz precomprimidas;
+#   - de cada imagen se generan miniaturas WebP en varios anchos para srcset.
+# El resultado y manifest.json quedan en el directorio de salida. Si los
+# archivos de origen no cambiaron desde la última vez, no se reconstruye.
+
+VERSION = 1  # subir si cambia la forma de construir
+ANCHOS_MINIATURA = (160, 320, 640)
+CALIDAD_WEBP = 80
+COMPRIMIBLES = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+IMAGENES = {".jpg", ".jpeg", ".png"}
+MANIFIESTO = "manifest.json"
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+_REFERENCIA_HTML = re.compile(r"""(\b(?:src|href)\s*=\s*["'])([^"'#?]+)""", re.IGNORECASE)
+_REFERENCIA_CSS = re.compile(r"""(url\(\s*["']?)([^"')#?]+)""", re.IGNORECASE)
+
+
+def _hash(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()[:10]
+
+
+def _con_hash(ruta: str, datos: bytes) -> str:
+    base, ext = posixpath.splitext(ruta)
+    return f"{base}.{_hash(datos)}{ext}"
+
+
+def _huella_origen(origen: Path) -> dict:
+    """Tamaño y fecha de cada archivo: decide si hace falta reconstruir."""
+    huella = {}
+    for archivo in sorted(origen.rglob("*")):
+        if archivo.is_file():
+            st = archivo.stat()
+            huella[archivo.relative_to(origen).as_posix()] = [st.st_size, st.st_mtime_ns]
+    return huella
+
+
+def _es_local(url: str) -> bool:
+    return not (url.startswith(("/", "data:", "mailto:", "javascript:")) or "://" in url or url.startswith("${"))
+
+
+def _reescribir(texto: str, ruta: str, patron: re.Pattern, nombres: Dict[str, str]) -> str:
+    """Cambia las referencias relativas a archivos con hash por su nombre nuevo."""
+    carpeta = posixpath.dirname(ruta)
+
+    def cambiar(m: re.Match) -> str:
+        url = m.group(2).strip()
+        if not _es_local(url):
+            return m.group(0)
+        destino = posixpath.normpath(posixpath.join(carpeta, url))
+        if destino not in nombres:
+            return m.group(0)
+        return m.group(1) + posixpath.relpath(nombres[destino], carpeta or ".")
+
+    return patron.sub(cambiar, texto)
+
+
+class Manifiesto:
+    def __init__(self, datos: Optional[dict] = None, prefijo: str = "/app"):
+        self.prefijo = prefijo.rstrip("/")
+        self.cargar(datos or {})
+
+    def cargar(self, datos: dict) -> None:
+        """Reemplaza el contenido (el lifespan lo llena después de construir)."""
+        self.archivos: Dict[str, str] = datos.get("archivos", {})        # ruta original -> ruta con hash
+        self.miniaturas: Dict[str, Dict[str, str]] = datos.get("miniaturas", {})  # ruta -> {ancho: ruta}
+        self.inmutables = set(self.archivos.values())
+        for variantes in self.miniaturas.values():
+            self.inmutables.update(variantes.values())
+
+    def url(self, ruta: str) -> str:
+        return f"{self.prefijo}/{ruta}"
+
+    def imagen(self, img: Optional[str]) -> dict:
+        """URLs para un campo img de producto ("hotdog1.jpg"): original con hash y miniaturas."""
+        if not img:
+            return {"img_url": None, "miniaturas": []}
+        ruta = posixpath.normpath(img.lstrip("./"))
+        if ruta not in self.archivos:
+            return {"img_url": None, "miniaturas": []}
+        return {
+            "img_url": self.url(self.archivos[ruta]),
+            "miniaturas": [
+                {"ancho": int(ancho), "url": self.url(variante)}
+                for ancho, variante in sorted(self.miniaturas.get(ruta, {}).items(), key=lambda x: int(x[0]))
+            ],
+        }
+
+
+def _comprimir(destino: Path) -> None:
+    datos = destino.read_bytes()
+    variantes = [(".gz", gzip.compress(datos, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variantes.append((".br", brotli.compress(datos, quality=11)))
+    for ext, comprimido in variantes:
+        if len(comprimido) < len(datos):
+            destino.with_name(destino.name + ext).write_bytes(comprimido)
+
+
+def _miniaturas(archivo: Path, ruta: str, salida: Path) -> Dict[str, str]:
+    variantes: Dict[str, str] = {}
+    with Image.open(archivo) as imagen:
+        # JPEG: decodificar ya reducido (PNG no lo admite y se ignora)
+        imagen.draft("RGB", (max(ANCHOS_MINIATURA) * 2, max(ANCHOS_MINIATURA) * 2))
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode not in ("RGB", "RGBA"):
+            imagen = imagen.convert("RGBA" if "transparency" in imagen.info else "RGB")
+        base = posixpath.splitext(ruta)[0]
+        for ancho in ANCHOS_MINIATURA:
+            if ancho >= imagen.width and variantes:
+                break  # no se agranda; la más grande disponible ya está
+            alto = max(1, round(imagen.height * min(ancho, imagen.width) / imagen.width))
+            reducida = imagen.resize((min(ancho, imagen.width), alto), Image.LANCZOS, reducing_gap=3.0)
+            buffer = BytesIO()
+            reducida.save(buffer, "WEBP", quality=CALIDAD_WEBP, method=4)  # 6 comprime ~3% más y tarda 30x
+            datos = buffer.getvalue()
+            nombre = _con_hash(f"{base}-{ancho}.webp", datos)
+            (salida / nombre).parent.mkdir(parents=True, exist_ok=True)
+            (salida / nombre).write_bytes(datos)
+            variantes[str(ancho)] = nombre
+    return variantes
+
+
+def construir(origen: Path, salida: Path, forzar: bool = False) -> dict:
+    """Prepara origen en salida y devuelve el manifiesto (sin trabajo si nada cambió)."""
+    huella = {"version": VERSION, "brotli": brotli is not None, "pillow": Image is not None,
+              "archivos": _huella_origen(origen)}
+    ruta_manifiesto = salida / MANIFIESTO
+    if not forzar and ruta_manifiesto.exists():
+        anterior = json.loads(ruta_manifiesto.read_text(encoding="utf-8"))
+        if anterior.get("origen") == huella:
+            return anterior
+
+    # Se arma en un directorio aparte y se reemplaza al final
+    temporal = salida.with_name(f"{salida.name}.tmp{os.getpid()}")
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir(parents=True)
+
+    rutas = sorted(huella["archivos"])
+    archivos: Dict[str, str] = {}
+    miniaturas: Dict[str, Dict[str, str]] = {}
+
+    def escribir(ruta: str, datos: bytes) -> Path:
+        destino = temporal / ruta
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_bytes(datos)
+        return destino
+
+    # 1. Todo lo que no referencia a otros archivos: nombre con hash tal cual
+    for ruta in rutas:
+        ext = posixpath.splitext(ruta)[1].lower()
+        if ext in (".html", ".css"):
+            continue
+        datos = (origen / ruta).read_bytes()
+        archivos[ruta] = _con_hash(ruta, datos)
+        destino = escribir(archivos[ruta], datos)
+        if ext in COMPRIMIBLES:
+            _comprimir(destino)
+        if ext in IMAGENES and Image is not None:
+            miniaturas[ruta] = _miniaturas(origen / ruta, ruta, temporal)
+
+    # 2. CSS: se reescriben sus url(...) y después se calcula su hash
+    for ruta in rutas:
+        if posixpath.splitext(ruta)[1].lower() == ".css":
+            texto = _reescribir((origen / ruta).read_text(encoding="utf-8"), ruta, _REFERENCIA_CSS, archivos)
+            datos = texto.encode("utf-8")
+            archivos[ruta] = _con_hash(ruta, datos)
+            _comprimir(escribir(archivos[ruta], datos))
+
+    # 3. HTML: mismo nombre, apuntando a los archivos con hash
+    for ruta in rutas:
+        if posixpath.splitext(ruta)[1].lower() == ".html":
+            texto = _reescribir((origen / ruta).read_text(encoding="utf-8"), ruta, _REFERENCIA_HTML, archivos)
+            _comprimir(escribir(ruta, texto.encode("utf-8")))
+
+    manifiesto = {"origen": huella, "archivos": archivos, "miniaturas": miniaturas}
+    (temporal / MANIFIESTO).write_text(json.dumps(manifiesto, indent=1), encoding="utf-8")
+    shutil.rmtree(salida, ignore_errors=True)
+    os.replace(temporal, salida)
+    return manifiesto
+
+
+def _codificaciones(aceptadas: str) -> set:
+    resultado = set()
+    for parte in aceptadas.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        resultado.add(nombre.strip().lower())
+    return resultado
+
+
+class Estaticos(StaticFiles):
+    """
+    StaticFiles con caché según el tipo de archivo y variantes precomprimidas:
+    si el cliente acepta br o gzip y existe archivo.br / archivo.gz, se
+    envía ese (sin comprimir en cada petición).
+    """
+
+    def __init__(self, directorio: Path, manifiesto: Manifiesto):
+        # check_dir=False: el directorio se crea en el lifespan
+        super().__init__(directory=directorio, html=True, check_dir=False)
+        self.raiz = Path(directorio).resolve()
+        self.manifiesto = manifiesto
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        ruta = Path(full_path).resolve().relative_to(self.raiz).as_posix()
+        cabeceras = {
+            "Cache-Control": CACHE_INMUTABLE if ruta in self.manifiesto.inmutables else "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+
+        aceptadas = _codificaciones(request_headers.get("accept-encoding", ""))
+        for codificacion, ext in (("br", ".br"), ("gzip", ".gz")):
+            variante = f"{full_path}{ext}"
+            if codificacion in aceptadas and os.path.isfile(variante):
+                response = FileResponse(
+                    variante, status_code=status_code, stat_result=os.stat(variante),
+                    media_type=mimetypes.guess_type(str(full_path))[0] or "application/octet-stream",
+                    headers={**cabeceras, "Content-Encoding": codificacion},
+                )
+                break
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=cabeceras)
+
+        if self.is_not_modified(response.headers, request_headers):
+            no_modificado = NotModifiedResponse(response.headers)
+            no_modificado.headers.update(cabeceras)
+            return no_modificado
+        return response
+
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Dict, Set
+
+# Pub/sub en proceso para los cambios de estado de pedidos.
+# Cada cliente conectado a /pedidos/{id}/eventos tiene su propia cola; publicar
+# no bloquea nunca: si un cliente lento llena su cola se descarta el evento más
+# antiguo, ya que solo importa el último estado.
+
+
+class BusPedidos:
+    def __init__(self, max_cola: int = 16):
+        self.max_cola = max_cola
+        self._suscriptores: Dict[str, Set[asyncio.Queue]] = {}
+
+    def suscribir(self, pedido_id: str) -> asyncio.Queue:
+        cola: asyncio.Queue = asyncio.Queue(maxsize=self.max_cola)
+        self._suscriptores.setdefault(pedido_id, set()).add(cola)
+        return cola
+
+    def desuscribir(self, pedido_id: str, cola: asyncio.Queue) -> None:
+        colas = self._suscriptores.get(pedido_id)
+        if not colas:
+            return
+        colas.discard(cola)
+        if not colas:
+            del self._suscriptores[pedido_id]
+
+    def publicar(self, pedido_id: str, evento) -> None:
+        for cola in self._suscriptores.get(pedido_id, ()):
+            if cola.full():
+                cola.get_nowait()
+            cola.put_nowait(evento)
+
+
+async def escuchar_change_stream(pedidos_col, publicar) -> None:
+    """
+    Llama publicar(doc) por cada cambio de estado visto por el change stream
+    de Mongo (requiere replica set). Así cada worker ve los cambios hechos
+    por los demás.
+    """
+    pipeline = [
+        {"$match": {
+            "operationType": "update",
+            "updateDescription.updatedFields.estado": {"$exists": True},
+        }}
+    ]
+    while True:
+        try:
+            async with pedidos_col.watch(pipeline, full_document="updateLookup") as stream:
+                async for cambio in stream:
+                    doc = cambio.get("fullDocument")
+                    if doc:
+                        publicar(doc)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"⚠️  Change stream de pedidos interrumpido: {exc}. Reintentando...")
+            await asyncio.sleep(1)
+
+
+class Aviso:
+    """
+    Avisa "algo cambió" a quienes esperan (long-poll). Quien espera toma el
+    evento actual antes de leer los datos: un cambio entre la lectura y la
+    espera lo despierta igual.
+    """
+
+    def __init__(self):
+        self._evento = asyncio.Event()
+
+    def evento(self) -> asyncio.Event:
+        return self._evento
+
+    def avisar(self) -> None:
+        self._evento.set()
+        self._evento = asyncio.Event()
@@ -0,0 +1,110 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Tuple
+
+from fastapi import HTTPException
+
+# Respuestas guardadas por Idempotency-Key para los POST que crean cosas.
+# La primera respuesta exitosa queda en el almacenamiento (en Mongo, una
+# colección con índice TTL) y en una LRU acotada en proceso. Un reintento con
+# la misma clave recibe la respuesta guardada sin volver a ejecutar nada; si
+# el original sigue en curso, el reintento lo espera en vez de duplicarlo
+# (en este proceso con un Future, entre workers con la reserva en la base).
+
+
+class Guardada(NamedTuple):
+    status: int
+    body: bytes
+    huella: str
+    expira: float  # time.monotonic()
+
+
+def calcular_huella(contenido: bytes) -> str:
+    """Identifica el contenido de la petición: la clave no se puede reutilizar con otro."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+class Idempotencia:
+    def __init__(self, ttl: float = 24 * 3600, max_entradas: int = 10_000,
+                 reserva: float = 30.0, espera: float = 0.05):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.reserva = reserva  # cuánto dura la reserva de una petición en curso
+        self.espera = espera    # pausa entre consultas si el original está en otro worker
+        self._lru: "OrderedDict[str, Guardada]" = OrderedDict()
+        self._en_curso: Dict[str, asyncio.Future] = {}
+
+    def _lru_obtener(self, clave: str):
+        guardada = self._lru.get(clave)
+        if guardada is None:
+            return None
+        if guardada.expira < time.monotonic():
+            del self._lru[clave]
+            return None
+        self._lru.move_to_end(clave)
+        return guardada
+
+    def _lru_guardar(self, clave: str, status: int, body: bytes, huella: str, ttl: float) -> Guardada:
+        guardada = Guardada(status, body, huella, time.monotonic() + ttl)
+        self._lru[clave] = guardada
+        self._lru.move_to_end(clave)
+        while len(self._lru) > self.max_entradas:
+            self._lru.popitem(last=False)
+        return guardada
+
+    @staticmethod
+    def _verificar(guardada_huella: str, huella: str) -> None:
+        if guardada_huella != huella:
+            raise HTTPException(status_code=422, detail="La Idempotency-Key ya se usó con otro contenido")
+
+    async def ejecutar(
+        self, repo, clave: str, huella: str, funcion: Callable[[], Awaitable[Tuple[int, bytes]]]
+    ) -> Tuple[int, bytes, bool]:
+        """
+        Devuelve (status, body, repetida). funcion() hace el trabajo real y
+        devuelve (status, body) ya serializado; solo se llama una vez por clave.
+        """
+        while True:
+            guardada = self._lru_obtener(clave)
+            if guardada is not None:
+                self._verificar(guardada.huella, huella)
+                return guardada.status, guardada.body, True
+
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                await asyncio.shield(futuro)
+                continue
+
+            futuro = asyncio.get_running_loop().create_future()
+            self._en_curso[clave] = futuro
+            try:
+                ahora = datetime.now(timezone.utc)
+                existente = await repo.reservar(clave, huella, ahora + timedelta(seconds=self.reserva))
+                if existente is None:
+                    try:
+                        status, body = await funcion()
+                    except BaseException:
+                        await repo.liberar(clave)
+                        raise
+                    await repo.completar(clave, status, body, ahora + timedelta(seconds=self.ttl))
+                    self._lru_guardar(clave, status, body, huella, self.ttl)
+                    return status, body, False
+
+                self._verificar(existente["huella"], huella)
+                if existente["status"] is not None:
+                    # La LRU solo la guarda por lo que le queda de vida
+                    expira_en = existente["expira_en"]
+                    if expira_en.tzinfo is None:
+                        expira_en = expira_en.replace(tzinfo=timezone.utc)
+                    restante = max(0.0, (expira_en - ahora).total_seconds())
+                    self._lru_guardar(clave, existente["status"], bytes(existente["body"]), huella, restante)
+                    return existente["status"], bytes(existente["body"]), True
+            finally:
+                del self._en_curso[clave]
+                futuro.set_result(None)
+
+            # El original está en curso en otro worker
+            await asyncio.sleep(self.espera)
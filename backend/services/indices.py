@@ -0,0 +1,101 @@
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Índices declarados para las colecciones de MongoDB.
+# Se aseguran al iniciar la API; los que faltan se crean y los que existen
+# con otra definición solo se informan (cambiarlos requiere intervención manual).
+INDICES = {
+    "usuarios": [
+        IndexModel([("email", ASCENDING)], name="email_unico", unique=True),
+    ],
+    "pedidos": [
+        IndexModel([("usuario_id", ASCENDING), ("fecha", DESCENDING), ("_id", DESCENDING)], name="usuario_fecha"),
+        IndexModel([("estado", ASCENDING), ("fecha", ASCENDING)], name="estado_fecha"),
+        IndexModel([("fecha", DESCENDING), ("_id", DESCENDING)], name="fecha"),
+    ],
+    "boletas": [
+        IndexModel([("pedido_id", ASCENDING)], name="pedido_unico", unique=True),
+    ],
+    "idempotencia": [
+        # TTL: Mongo borra cada documento cuando pasa su expira_en
+        IndexModel([("expira_en", ASCENDING)], name="expira_en", expireAfterSeconds=0),
+    ],
+    "ventas_diarias": [
+        IndexModel([("fecha", ASCENDING), ("producto_id", ASCENDING)], name="fecha_producto", unique=True),
+    ],
+    "candados": [
+        IndexModel([("expira_en", ASCENDING)], name="expira_en", expireAfterSeconds=0),
+    ],
+    "tokens_revocados": [
+        IndexModel([("expira_en", ASCENDING)], name="expira_en", expireAfterSeconds=0),
+    ],
+}
+
+# Consultas frecuentes cuyo plan se revisa con --check-indexes
+CONSULTAS = [
+    ("login por email", "usuarios", {"email": "admin@doggys.com"}, None),
+    ("pedidos de un usuario", "pedidos", {"usuario_id": ObjectId()}, {"fecha": -1, "_id": -1}),
+    ("listado de pedidos", "pedidos", {}, {"fecha": -1, "_id": -1}),
+    ("pedidos por estado", "pedidos", {"estado": {"$in": ["pagado", "entregado"]}}, {"fecha": 1}),
+    ("cola de cocina", "pedidos", {"estado": {"$in": ["pagado", "preparando"]}}, {"fecha": 1}),
+    ("boleta de un pedido", "boletas", {"pedido_id": ObjectId()}, None),
+]
+
+
+def _definicion(indice: dict) -> tuple:
+    return (tuple(dict(indice["key"]).items()), bool(indice.get("unique", False)))
+
+
+async def asegurar_indices(db) -> None:
+    """Crea los índices que faltan e informa los que no calzan con la declaración."""
+    print("--- Verificando índices ---")
+    for coleccion, modelos in INDICES.items():
+        existentes = [ix async for ix in db[coleccion].list_indexes()]
+        por_nombre = {ix["name"]: ix for ix in existentes}
+        por_clave = {tuple(dict(ix["key"]).items()): ix for ix in existentes}
+
+        for modelo in modelos:
+            esperado = modelo.document
+            clave, unico = _definicion(esperado)
+            actual = por_nombre.get(esperado["name"]) or por_clave.get(clave)
+
+            if actual is None:
+                print(f"⚠️  Falta índice {coleccion}.{esperado['name']}, creando...")
+                try:
+                    await db[coleccion].create_indexes([modelo])
+                except OperationFailure as exc:
+                    print(f"❌ No se pudo crear {coleccion}.{esperado['name']}: {exc}")
+            elif _definicion(actual) != (clave, unico):
+                print(
+                    f"⚠️  Índice {coleccion}.{actual['name']} no coincide: "
+                    f"existe {dict(actual['key'])} unique={bool(actual.get('unique'))}, "
+                    f"se esperaba {dict(clave)} unique={unico}"
+                )
+
+
+def _resumir_plan(plan: dict) -> str:
+    """Recorre el árbol del plan ganador y devuelve las etapas, ej: FETCH > IXSCAN(email_unico)."""
+    etapas = []
+    while plan:
+        etapa = plan.get("stage", "?")
+        if "indexName" in plan:
+            etapa += f"({plan['indexName']})"
+        etapas.append(etapa)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(etapas)
+
+
+async def revisar_planes(db) -> None:
+    """Imprime el plan ganador de explain() para las consultas frecuentes."""
+    print("--- Planes de consultas frecuentes ---")
+    for descripcion, coleccion, filtro, orden in CONSULTAS:
+        find = {"find": coleccion, "filter": filtro}
+        if orden:
+            find["sort"] = orden
+        res = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        ganador = res["queryPlanner"]["winningPlan"]
+        # Con el motor SBE el plan clásico viene anidado en "queryPlan"
+        resumen = _resumir_plan(ganador.get("queryPlan", ganador))
+        marca = "❌" if "COLLSCAN" in resumen else "✅"
+        print(f"{marca} {descripcion}: {resumen}")
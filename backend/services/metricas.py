@@ -0,0 +1,224 @@
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Métricas en formato de texto de Prometheus, sin dependencias externas.
+# Se expone en GET /metrics:
+#   - peticiones por ruta, método y status, con histograma de latencia
+#   - peticiones en curso
+#   - retraso del event loop
+#   - comandos de Mongo (por comando y por petición), vía command monitoring
+# Las series se etiquetan con la plantilla de la ruta (/pedidos/{pedido_id}),
+# nunca con la URL real, para que la cantidad de series quede acotada.
+
+LATENCIA_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COMANDOS_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores: Dict[tuple, float] = {}
+        self._candado = threading.Lock()  # también se usa desde los hilos de Motor
+
+    def inc(self, valores: tuple = (), cantidad: float = 1) -> None:
+        with self._candado:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self) -> List[str]:
+        with self._candado:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {v}" for k, v in valores]
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+    def set(self, valores: tuple, valor: float) -> None:
+        with self._candado:
+            self._valores[valores] = valor
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, buckets: Tuple[float, ...], etiquetas: Tuple[str, ...] = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.buckets = buckets
+        # por serie: [conteo por bucket (no acumulado) ..., +Inf], suma
+        self._series: Dict[tuple, Tuple[List[int], List[float]]] = {}
+        self._candado = threading.Lock()
+
+    def observar(self, valores: tuple, valor: float) -> None:
+        i = bisect_left(self.buckets, valor)
+        with self._candado:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = ([0] * (len(self.buckets) + 1), [0.0])
+            serie[0][i] += 1
+            serie[1][0] += valor
+
+    def exponer(self) -> List[str]:
+        with self._candado:
+            series = [(k, list(conteos), suma[0]) for k, (conteos, suma) in self._series.items()]
+        lineas = []
+        for valores, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                etiquetas = _etiquetas(self.etiquetas, valores, 'le="' + le + '"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class _ConsultaActual:
+    """Comandos de Mongo hechos durante la petición en curso."""
+    __slots__ = ("comandos", "segundos")
+
+    def __init__(self):
+        self.comandos = 0
+        self.segundos = 0.0
+
+
+# Motor copia el contexto al ejecutar en sus hilos, así que el listener ve
+# la petición que originó cada comando.
+_consulta_actual: ContextVar[Optional[_ConsultaActual]] = ContextVar("consulta_actual", default=None)
+
+
+class Metricas:
+    def __init__(self):
+        self.peticiones = Contador(
+            "doggys_http_peticiones_total", "Peticiones HTTP por ruta, método y status", ("ruta", "metodo", "status"))
+        self.latencia = Histograma(
+            "doggys_http_latencia_segundos", "Latencia de las peticiones HTTP", LATENCIA_BUCKETS, ("ruta", "metodo"))
+        self.en_curso = Medidor("doggys_http_peticiones_en_curso", "Peticiones HTTP en curso")
+        self.lag = Histograma("doggys_event_loop_lag_segundos", "Retraso del event loop", LAG_BUCKETS)
+        self.lag_actual = Medidor("doggys_event_loop_lag_actual_segundos", "Último retraso medido del event loop")
+        self.mongo_comandos = Contador(
+            "doggys_mongo_comandos_total", "Comandos de Mongo por comando y resultado", ("comando", "resultado"))
+        self.mongo_duracion = Histograma(
+            "doggys_mongo_comando_segundos", "Duración de los comandos de Mongo", MONGO_BUCKETS, ("comando",))
+        self.mongo_por_peticion = Histograma(
+            "doggys_mongo_comandos_por_peticion", "Comandos de Mongo por petición HTTP", COMANDOS_BUCKETS, ("ruta",))
+        self.mongo_segundos_por_peticion = Histograma(
+            "doggys_mongo_segundos_por_peticion", "Tiempo en Mongo por petición HTTP", LATENCIA_BUCKETS, ("ruta",))
+        self._todas = [
+            self.peticiones, self.latencia, self.en_curso, self.lag, self.lag_actual,
+            self.mongo_comandos, self.mongo_duracion, self.mongo_por_peticion, self.mongo_segundos_por_peticion,
+        ]
+        self.en_curso.set((), 0)
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._todas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+    def monitor_mongo(self) -> "MonitorMongo":
+        return MonitorMongo(self)
+
+    async def medir_event_loop(self, intervalo: float = 0.5) -> None:
+        """Tarea de fondo: cuánto más de lo pedido tarda en despertar un sleep."""
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(intervalo)
+            lag = max(0.0, time.perf_counter() - inicio - intervalo)
+            self.lag.observar((), lag)
+            self.lag_actual.set((), lag)
+
+
+class MonitorMongo(monitoring.CommandListener):
+    def __init__(self, metricas: Metricas):
+        self.metricas = metricas
+
+    def _registrar(self, event, resultado: str) -> None:
+        segundos = event.duration_micros / 1_000_000
+        self.metricas.mongo_comandos.inc((event.command_name, resultado))
+        self.metricas.mongo_duracion.observar((event.command_name,), segundos)
+        consulta = _consulta_actual.get()
+        if consulta is not None:
+            consulta.comandos += 1
+            consulta.segundos += segundos
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._registrar(event, "ok")
+
+    def failed(self, event) -> None:
+        self._registrar(event, "error")
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI (sin BaseHTTPMiddleware, para no agregar una tarea por
+    petición). En respuestas text/event-stream la latencia se mide hasta los
+    headers: el stream dura lo que el cliente esté conectado.
+    """
+
+    def __init__(self, app, metricas: Metricas, excluir: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.metricas = metricas
+        self.excluir = excluir
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluir:
+            await self.app(scope, receive, send)
+            return
+
+        m = self.metricas
+        inicio = time.perf_counter()
+        estado = {"status": 500, "fin": None}
+        consulta = _ConsultaActual()
+        token = _consulta_actual.set(consulta)
+        m.en_curso.inc(())
+
+        async def send_medido(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+                for nombre, valor in mensaje.get("headers", ()):
+                    if nombre == b"content-type" and valor.startswith(b"text/event-stream"):
+                        estado["fin"] = time.perf_counter()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            fin = estado["fin"] or time.perf_counter()
+            m.en_curso.inc((), -1)
+            _consulta_actual.reset(token)
+
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", None) or "sin_ruta"  # 404: no se usa la URL real
+            metodo = scope["method"]
+            m.peticiones.inc((plantilla, metodo, estado["status"]))
+            m.latencia.observar((plantilla, metodo), fin - inicio)
+            if consulta.comandos:
+                m.mongo_por_peticion.observar((plantilla,), consulta.comandos)
+                m.mongo_segundos_por_peticion.observar((plantilla,), consulta.segundos)
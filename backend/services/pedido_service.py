@@ -1,11 +1,15 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import HTTPException
 
-from models.pedido import PedidoIn, PedidoOut, DetallePedido, EstadoPedido
-from data.db import db_pedidos, seq_pedidos, db_usuarios, db_productos
+from models.pedido import PedidoIn, PedidoOut, DetallePedido, DetallePedidoOut, EstadoPedido, transicion_valida
+from data.db import pedidos, db_pedidos, seq_pedidos, db_usuarios, db_productos
 from models.producto import ProductoIn
 
+# Los pedidos se guardan ya calculados (PedidoOut): precio unitario, subtotal
+# y total se fijan al crear el pedido, igual que en Mongo (main.py). Leer un
+# pedido no consulta productos, y editar un precio no cambia pedidos antiguos.
+
 
 def calcular_total(items: List[DetallePedido]) -> float:
     total = 0.0
@@ -17,6 +21,24 @@ def calcular_total(items: List[DetallePedido]) -> float:
     return total
 
 
+def detallar_items(items: List[DetallePedido]) -> List[DetallePedidoOut]:
+    """Copia el precio actual de cada producto en la línea del pedido."""
+    detalles: List[DetallePedidoOut] = []
+    for item in items:
+        producto: ProductoIn | None = db_productos.get(item.producto_id)
+        if not producto:
+            raise HTTPException(status_code=400, detail=f"Producto {item.producto_id} no existe")
+        detalles.append(
+            DetallePedidoOut(
+                producto_id=item.producto_id,
+                cantidad=item.cantidad,
+                precio_unitario=producto.precio,
+                subtotal=producto.precio * item.cantidad,
+            )
+        )
+    return detalles
+
+
 def crear_pedido(pedido_in: PedidoIn) -> PedidoOut:
     # Validar usuario
     if pedido_in.usuario_id not in db_usuarios:
@@ -25,32 +47,42 @@ def crear_pedido(pedido_in: PedidoIn) -> PedidoOut:
     if not pedido_in.items:
         raise HTTPException(status_code=400, detail="El pedido debe tener al menos un producto")
 
-    total = calcular_total(pedido_in.items)
+    items = detallar_items(pedido_in.items)
     new_id = next(seq_pedidos)
-    db_pedidos[new_id] = pedido_in
-    return PedidoOut(id=new_id, total=total, **pedido_in.model_dump())
+    pedido = PedidoOut(
+        id=new_id,
+        usuario_id=pedido_in.usuario_id,
+        items=items,
+        estado=EstadoPedido.PENDIENTE,
+        comentario=pedido_in.comentario,
+        total=sum(item.subtotal for item in items),
+    )
+    db_pedidos[new_id] = pedido
+    return pedido
 
 
 def obtener_pedido(pedido_id: int) -> PedidoOut:
-    pedido: PedidoIn | None = db_pedidos.get(pedido_id)
+    pedido: PedidoOut | None = db_pedidos.get(pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
-    total = calcular_total(pedido.items)
-    return PedidoOut(id=pedido_id, total=total, **pedido.model_dump())
+    return pedido
 
 
-def listar_pedidos() -> list[PedidoOut]:
-    resultados: list[PedidoOut] = []
-    for pid, pedido in db_pedidos.items():
-        total = calcular_total(pedido.items)
-        resultados.append(PedidoOut(id=pid, total=total, **pedido.model_dump()))
-    return resultados
+def listar_pedidos(usuario_id: Optional[int] = None) -> list[PedidoOut]:
+    # Con usuario_id se usan solo los pedidos del índice, sin recorrer todos
+    if usuario_id is None:
+        return list(db_pedidos.values())
+    return [db_pedidos[pid] for pid in sorted(pedidos.indices["usuario_id"].buscar(usuario_id))]
 
 
 def actualizar_estado(pedido_id: int, nuevo_estado: EstadoPedido) -> PedidoOut:
-    pedido: PedidoIn | None = db_pedidos.get(pedido_id)
+    pedido: PedidoOut | None = db_pedidos.get(pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    if not transicion_valida(pedido.estado, nuevo_estado):
+        raise HTTPException(
+            status_code=409, detail=f"Un pedido {pedido.estado.value} no puede pasar a {nuevo_estado.value}"
+        )
 
     # Si el pedido pasa a PAGADO por primera vez, validar y descontar stock
     if nuevo_estado == EstadoPedido.PAGADO and pedido.estado != EstadoPedido.PAGADO:
@@ -72,5 +104,4 @@ def actualizar_estado(pedido_id: int, nuevo_estado: EstadoPedido) -> PedidoOut:
 
     pedido.estado = nuevo_estado
     db_pedidos[pedido_id] = pedido
-    total = calcular_total(pedido.items)
-    return PedidoOut(id=pedido_id, total=total, **pedido.model_dump())
+    return pedido
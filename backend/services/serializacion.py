@@ -0,0 +1,67 @@
+from typing import Any
+
+from bson import ObjectId
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él la API usa la serialización normal
+    orjson = None
+
+# Ruta rápida de serialización.
+# Los documentos leídos desde Mongo ya son confiables, así que aquí se pasan
+# directo a dicts con la misma forma que PedidoOut/ProductoOut y se serializan
+# una sola vez con orjson, sin construir ni validar modelos Pydantic.
+
+
+def _default(obj: Any):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+
+class JSONRapidoResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def producto_doc_a_dict(doc, imagen=None) -> dict:
+    """imagen: img -> {"img_url", "miniaturas"} (ver services/estaticos.py)."""
+    d = {
+        "nombre": doc["nombre"],
+        "descripcion": doc.get("descripcion"),
+        "precio": float(doc["precio"]),
+        "stock": doc.get("stock", 0),
+        "img": doc.get("img"),
+        "disponible": doc.get("disponible", True),
+        "id": str(doc["_id"]),
+    }
+    if imagen is not None:
+        d.update(imagen(doc.get("img")))
+    return d
+
+
+def pedido_doc_a_dict(doc) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "usuario_id": str(doc["usuario_id"]),
+        "items": [
+            {
+                "producto_id": str(item["producto_id"]),
+                "cantidad": item["cantidad"],
+                "nombre": item.get("nombre", "Producto sin nombre"),
+                "precio_unitario": float(item["precio_unitario"]),
+                "subtotal": float(item["subtotal"]),
+            }
+            for item in doc.get("items", [])
+        ],
+        "estado": doc["estado"],
+        "fecha": doc.get("fecha", doc.get("fecha_pedido")),
+        "total": float(doc["total"]),
+    }
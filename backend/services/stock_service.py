@@ -0,0 +1,122 @@
+from typing import Dict, List
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+# Motor de stock para MongoDB.
+# Cada línea se descuenta con un $inc condicionado a "stock >= cantidad", por lo
+# que dos pagos simultáneos nunca pueden dejar el stock negativo. Cada producto
+# descontado queda marcado con el _id del pedido en "reservas": así se sabe qué
+# líneas se aplicaron (para compensarlas si otra falla) y un reintento del mismo
+# pedido no descuenta dos veces.
+
+
+class StockInsuficienteError(HTTPException):
+    """
+    Uno o más productos del pedido no tienen stock suficiente. El detail va
+    estructurado para que el cliente sepa qué productos fallaron:
+    {"mensaje", "faltantes": [{"producto_id", "nombre", "pedido", "disponible"}]}
+    """
+
+    def __init__(self, faltantes: List[dict], mensaje: str = "Stock insuficiente al pagar"):
+        self.faltantes = faltantes
+        resumen = ", ".join(
+            f"{f['nombre']} (pedido: {f['pedido']}, disponible: {f['disponible']})"
+            for f in faltantes
+        )
+        super().__init__(
+            status_code=400,
+            detail={"mensaje": f"{mensaje}: {resumen}", "faltantes": faltantes},
+        )
+
+
+async def soporta_transacciones(client) -> bool:
+    """True si el despliegue es replica set o sharded (admite transacciones)."""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+async def _faltantes(productos_col, pedido_id: ObjectId, cantidades: Dict[ObjectId, int], session=None) -> List[dict]:
+    """Productos existentes cuyo descuento no se aplicó (sin la marca del pedido)."""
+    cursor = productos_col.find(
+        {"_id": {"$in": list(cantidades)}, "reservas": {"$ne": pedido_id}},
+        {"nombre": 1, "stock": 1},
+        session=session,
+    )
+    faltantes = []
+    async for doc in cursor:
+        faltantes.append(
+            {
+                "producto_id": str(doc["_id"]),
+                "nombre": doc.get("nombre", "Producto sin nombre"),
+                "pedido": cantidades[doc["_id"]],
+                "disponible": doc.get("stock", 0),
+            }
+        )
+    return faltantes
+
+
+async def revertir_reservas(productos_col, pedido_id: ObjectId, cantidades: Dict[ObjectId, int]) -> None:
+    """
+    Devuelve el stock de las líneas que sí alcanzaron a descontarse (las que
+    tienen la marca del pedido). Repetirlo no devuelve dos veces.
+    """
+    operaciones = [
+        UpdateOne(
+            {"_id": oid, "reservas": pedido_id},
+            {"$inc": {"stock": cantidad}, "$pull": {"reservas": pedido_id}},
+        )
+        for oid, cantidad in cantidades.items()
+    ]
+    await productos_col.bulk_write(operaciones, ordered=False)
+
+
+async def reservar_stock(productos_col, pedido_id: ObjectId, cantidades: Dict[ObjectId, int], session=None) -> None:
+    """
+    Descuenta el stock de todo el pedido en un solo bulk_write y deja la marca
+    del pedido en cada producto descontado (ver liberar_reservas).
+
+    Si alguna línea no tiene stock se lanza StockInsuficienteError con todos
+    los productos faltantes. Sin sesión, las líneas ya aplicadas se compensan;
+    con sesión, el llamador aborta la transacción. Los productos que ya no
+    existen se ignoran, igual que antes.
+    """
+    if not cantidades:
+        return
+
+    operaciones = [
+        UpdateOne(
+            {"_id": oid, "stock": {"$gte": cantidad}, "reservas": {"$ne": pedido_id}},
+            {"$inc": {"stock": -cantidad}, "$addToSet": {"reservas": pedido_id}},
+        )
+        for oid, cantidad in cantidades.items()
+    ]
+    res = await productos_col.bulk_write(operaciones, ordered=False, session=session)
+
+    if res.modified_count < len(operaciones):
+        faltantes = await _faltantes(productos_col, pedido_id, cantidades, session=session)
+        if faltantes:
+            if session is None:
+                await revertir_reservas(productos_col, pedido_id, cantidades)
+            raise StockInsuficienteError(faltantes)
+
+
+async def liberar_reservas(productos_col, pedido_id: ObjectId, cantidades: Dict[ObjectId, int], session=None) -> None:
+    """Quita las marcas del pedido cuando el pago ya quedó firme."""
+    if not cantidades:
+        return
+    await productos_col.update_many(
+        {"_id": {"$in": list(cantidades)}, "reservas": pedido_id},
+        {"$pull": {"reservas": pedido_id}},
+        session=session,
+    )
+
+
+async def descontar_stock(productos_col, pedido_id: ObjectId, cantidades: Dict[ObjectId, int], session=None) -> None:
+    """reservar_stock + liberar_reservas, para cuando nada más puede fallar entremedio (transacciones)."""
+    await reservar_stock(productos_col, pedido_id, cantidades, session=session)
+    await liberar_reservas(productos_col, pedido_id, cantidades, session=session)
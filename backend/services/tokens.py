@@ -0,0 +1,121 @@
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from datetime import datetime, timezone
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+# Tokens de sesión firmados con HMAC-SHA256 (la misma idea que un JWT HS256):
+#   base64url(payload JSON) + "." + base64url(firma)
+# con payload {"sub": usuario_id, "adm": es admin, "typ": "acceso" | "refresco",
+# "jti": id único, "exp": vencimiento en segundos epoch}.
+#
+# Verificar un token de acceso no hace I/O: firma, vencimiento y un set en
+# memoria con los jti revocados (cierre de sesión, refrescos ya usados). El
+# set se sincroniza periódicamente desde el almacenamiento, así que una
+# revocación hecha en otro worker tarda a lo más un intervalo en aplicarse;
+# los tokens de acceso duran pocos minutos para acotar ese margen.
+
+ACCESO = "acceso"
+REFRESCO = "refresco"
+
+
+class TokenInvalido(Exception):
+    """Firma incorrecta, formato inválido, tipo equivocado, vencido o revocado."""
+
+
+class Sesion(NamedTuple):
+    usuario_id: str
+    is_admin: bool
+    jti: str
+    exp: int
+
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+class Tokens:
+    def __init__(self, secreto: bytes, ttl_acceso: float = 15 * 60, ttl_refresco: float = 7 * 24 * 3600):
+        self.secreto = secreto
+        self.ttl_acceso = ttl_acceso
+        self.ttl_refresco = ttl_refresco
+        self._revocados: Dict[str, int] = {}  # jti -> exp (se olvida cuando el token ya venció)
+
+    def _firmar(self, cuerpo: str) -> str:
+        return _b64(hmac.new(self.secreto, cuerpo.encode("ascii"), hashlib.sha256).digest())
+
+    def emitir(self, usuario_id: str, is_admin: bool, tipo: str = ACCESO) -> str:
+        ttl = self.ttl_acceso if tipo == ACCESO else self.ttl_refresco
+        payload = {
+            "sub": usuario_id,
+            "adm": is_admin,
+            "typ": tipo,
+            "jti": secrets.token_urlsafe(12),
+            "exp": int(time.time() + ttl),
+        }
+        cuerpo = _b64(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        return f"{cuerpo}.{self._firmar(cuerpo)}"
+
+    def par(self, usuario_id: str, is_admin: bool) -> dict:
+        """Respuesta de login y refresco: token de acceso + token de refresco."""
+        return {
+            "access_token": self.emitir(usuario_id, is_admin, ACCESO),
+            "refresh_token": self.emitir(usuario_id, is_admin, REFRESCO),
+            "token_type": "bearer",
+            "expires_in": int(self.ttl_acceso),
+        }
+
+    def verificar(self, token: str, tipo: str = ACCESO) -> Sesion:
+        if not token.isascii():
+            raise TokenInvalido("Token mal formado")
+        cuerpo, _, firma = token.partition(".")
+        if not firma or not hmac.compare_digest(firma, self._firmar(cuerpo)):
+            raise TokenInvalido("Firma inválida")
+        try:
+            payload = json.loads(_desde_b64(cuerpo))
+            sesion = Sesion(str(payload["sub"]), bool(payload["adm"]), str(payload["jti"]), int(payload["exp"]))
+        except (ValueError, KeyError, TypeError):
+            raise TokenInvalido("Token mal formado")
+        if payload.get("typ") != tipo:
+            raise TokenInvalido("Tipo de token incorrecto")
+        if sesion.exp <= time.time():
+            raise TokenInvalido("Token vencido")
+        if sesion.jti in self._revocados:
+            raise TokenInvalido("Token revocado")
+        return sesion
+
+    # ----- Revocaciones -----
+    def revocar_local(self, jti: str, exp: int) -> None:
+        self._revocados[jti] = exp
+
+    def cargar_revocados(self, registros: Iterable[Tuple[str, int]]) -> None:
+        """Suma las revocaciones leídas del almacenamiento y olvida las vencidas."""
+        ahora = time.time()
+        revocados = {jti: exp for jti, exp in self._revocados.items() if exp > ahora}
+        revocados.update(registros)
+        self._revocados = revocados
+
+    @property
+    def cantidad_revocados(self) -> int:
+        return len(self._revocados)
+
+    async def sincronizar(self, repo, intervalo: float = 10.0) -> None:
+        """Tarea de fondo: trae los jti revocados por cualquier worker."""
+        while True:
+            try:
+                self.cargar_revocados(await repo.vigentes())
+            except Exception as exc:  # la base caída no debe matar la tarea
+                print(f"⚠️  No se pudieron sincronizar los tokens revocados: {exc}")
+            await asyncio.sleep(intervalo)
+
+
+def expira_en(exp: int) -> datetime:
+    return datetime.fromtimestamp(exp, timezone.utc)
@@ -0,0 +1,175 @@
+import os
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# La API se importa sin frontend estático ni variables de producción
+os.environ.setdefault("ESTATICOS", "0")
+os.environ.setdefault("METRICAS", "1")
+os.environ.setdefault("TOKENS_SECRETO", "pruebas")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("mongomock_motor")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from data.memoria import MemoriaAlmacen  # noqa: E402
+from data.mongo import MongoAlmacen  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+import mongomock.collection  # noqa: E402
+from services.idempotencia import Idempotencia  # noqa: E402
+
+MOTORES = ["mongomock", "memoria"]
+
+# mongomock no emite eventos de command monitoring. Para contar comandos por
+# petición con el mismo camino que en producción (MonitorMongo de
+# services/metricas.py + MiddlewareMetricas), las colecciones se envuelven y
+# cada operación avisa al listener con el nombre del comando que enviaría
+# pymongo. Un find cuenta una vez aunque el cursor traiga varios lotes.
+COMANDOS = {
+    "find": "find",
+    "find_one": "find",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "find_one_and_replace": "findAndModify",
+    "count_documents": "aggregate",
+    "aggregate": "aggregate",
+}
+
+# bulk_write envía un comando por tipo de operación
+COMANDOS_BULK = {"InsertOne": "insert", "UpdateOne": "update", "UpdateMany": "update",
+                 "ReplaceOne": "update", "DeleteOne": "delete", "DeleteMany": "delete"}
+
+
+class ColeccionContada:
+    def __init__(self, coleccion, monitor):
+        self._coleccion = coleccion
+        self._monitor = monitor
+
+    def _avisar(self, comando: str) -> None:
+        self._monitor.succeeded(SimpleNamespace(command_name=comando, duration_micros=0))
+
+    def bulk_write(self, operaciones, *args, **kwargs):
+        for comando in {COMANDOS_BULK.get(type(op).__name__, "update") for op in operaciones}:
+            self._avisar(comando)
+        return self._coleccion.bulk_write(operaciones, *args, **kwargs)
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._coleccion, nombre)
+        if nombre not in COMANDOS:
+            return atributo
+
+        def contado(*args, **kwargs):
+            self._avisar(COMANDOS[nombre])
+            return atributo(*args, **kwargs)
+
+        return contado
+
+
+class BaseContada:
+    def __init__(self, base, monitor):
+        self._base = base
+        self._monitor = monitor
+
+    def __getitem__(self, nombre):
+        return ColeccionContada(self._base[nombre], self._monitor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._base, nombre)
+
+
+class ClienteContado:
+    def __init__(self, cliente, monitor):
+        self._cliente = cliente
+        self._monitor = monitor
+
+    def __getitem__(self, nombre):
+        return BaseContada(self._cliente[nombre], self._monitor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
+
+
+class Api:
+    """Cliente ASGI en proceso que informa cuántos comandos de Mongo hizo cada petición."""
+
+    def __init__(self, cliente: httpx.AsyncClient):
+        self.cliente = cliente
+
+    @staticmethod
+    def _comandos_de(ruta: str) -> float:
+        serie = main.metricas.mongo_por_peticion._series.get((ruta,))
+        return serie[1][0] if serie else 0
+
+    async def pedir(self, metodo: str, url: str, ruta: str, **kwargs):
+        """Hace la petición y devuelve (respuesta, comandos); ruta es la plantilla (/pedidos/{pedido_id})."""
+        antes = self._comandos_de(ruta)
+        respuesta = await self.cliente.request(metodo, url, **kwargs)
+        return respuesta, int(self._comandos_de(ruta) - antes)
+
+
+def correr(escenario, envolver=lambda cliente: cliente):
+    """Corre escenario(cliente) con un cliente ASGI sobre main.app (sin lifespan)."""
+    async def envoltorio():
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as cliente:
+            return await escenario(envolver(cliente))
+
+    return asyncio.run(envoltorio())
+
+
+@pytest.fixture
+def usar_almacen(monkeypatch):
+    """
+    Devuelve una función que instala un almacenamiento nuevo en main.almacen
+    ("mongomock" o "memoria"). Al terminar la prueba vuelve el original y
+    la caché del catálogo queda vacía. Las respuestas idempotentes guardadas
+    en proceso tampoco pasan de una prueba a otra (los ids de memoria se repiten).
+    """
+    # pymongo >= 4.11 envía "sort" en UpdateOne y mongomock aún no lo acepta
+    builder = mongomock.collection.BulkOperationBuilder
+    original = builder.add_update
+    monkeypatch.setattr(builder, "add_update",
+                        lambda self, *args, sort=None, **kwargs: original(self, *args, **kwargs))
+
+    def instalar(motor: str, contar: bool = False):
+        if motor == "memoria":
+            almacen = MemoriaAlmacen()
+        else:
+            cliente = AsyncMongoMockClient()
+            if contar:
+                cliente = ClienteContado(cliente, main.metricas.monitor_mongo())
+            almacen = MongoAlmacen(main.MONGODB_URI, "DoggysPruebas", client=cliente)
+        monkeypatch.setattr(main, "almacen", almacen)
+        monkeypatch.setattr(main, "idempotencia", Idempotencia(ttl=main.idempotencia.ttl))
+        main.catalogo_cache.invalidar()
+        return almacen
+
+    yield instalar
+    main.catalogo_cache.invalidar()
+
+
+@pytest.fixture(params=MOTORES)
+def app(request, usar_almacen):
+    """Corre escenario(cliente) contra la API sobre cada motor de almacenamiento."""
+    usar_almacen(request.param)
+    return correr
+
+
+@pytest.fixture
+def api(usar_almacen):
+    """Almacenamiento mongomock con contadores; corre el escenario con asyncio.run."""
+    if not main.METRICAS:
+        pytest.skip("METRICAS=0")
+    usar_almacen("mongomock", contar=True)
+    return lambda escenario: correr(escenario, Api)
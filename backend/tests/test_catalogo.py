@@ -0,0 +1,76 @@
+"""
+Caché del catálogo: ETag/304 y que una escritura (en este worker o en otro)
+no deje respuestas viejas.
+"""
+import main
+from utiles import crear_pedido, sembrar
+
+
+def test_etag_y_304(app):
+    async def escenario(http):
+        await sembrar()
+        primera = await http.get("/productos")
+        assert primera.status_code == 200
+        etag = primera.headers["ETag"]
+
+        respuesta = await http.get("/productos", headers={"If-None-Match": etag})
+        assert respuesta.status_code == 304
+        assert respuesta.content == b""
+        assert respuesta.headers["ETag"] == etag
+
+        respuesta = await http.get("/productos", headers={"If-None-Match": '"otro"'})
+        assert respuesta.status_code == 200
+        assert respuesta.content == primera.content
+
+    app(escenario)
+
+
+def test_put_invalida(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pid = datos.productos[0]
+        antes = await http.get(f"/productos/{pid}")
+        lista = await http.get("/productos")
+
+        cambios = {"nombre": "Italiano", "precio": 3000.0, "stock": 100, "disponible": True}
+        respuesta = await http.put(f"/productos/{pid}", json=cambios, headers=datos.h_admin)
+        assert respuesta.status_code == 200
+
+        despues = await http.get(f"/productos/{pid}", headers={"If-None-Match": antes.headers["ETag"]})
+        assert despues.status_code == 200
+        assert despues.json()["nombre"] == "Italiano"
+        respuesta = await http.get("/productos", headers={"If-None-Match": lista.headers["ETag"]})
+        assert respuesta.status_code == 200
+        assert "Italiano" in {p["nombre"] for p in respuesta.json()}
+
+    app(escenario)
+
+
+def test_pagar_invalida_el_stock(app):
+    async def escenario(http):
+        datos = await sembrar(stock=10)
+        pid = datos.productos[0]
+        assert (await http.get(f"/productos/{pid}")).json()["stock"] == 10
+        pedido = await crear_pedido(http, datos, {pid: 3})
+        await http.patch(f"/pedidos/{pedido['id']}/estado?nuevo_estado=pagado", headers=datos.h_cliente)
+
+        assert (await http.get(f"/productos/{pid}")).json()["stock"] == 7
+
+    app(escenario)
+
+
+def test_cambio_en_otro_worker(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pid = datos.productos[0]
+        oid = main.almacen.parse_id(pid)
+        await http.get(f"/productos/{pid}")
+
+        # Otro worker escribe directo en el almacén: sin la versión, sigue la caché
+        await main.almacen.productos.actualizar(oid, {"nombre": "Italiano"})
+        assert (await http.get(f"/productos/{pid}")).json()["nombre"] == "Producto 0"
+
+        await main.almacen.versiones.incrementar(main.VERSION_CATALOGO)
+        assert (await http.get(f"/productos/{pid}")).json()["nombre"] == "Italiano"
+
+    app(escenario)
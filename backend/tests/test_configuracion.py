@@ -0,0 +1,25 @@
+"""Configuración que se valida al importar main (en un proceso aparte)."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def _importar_main(**entorno) -> subprocess.CompletedProcess:
+    env = {k: v for k, v in os.environ.items() if k != "TOKENS_SECRETO"}
+    env.update(entorno)
+    return subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND, env=env,
+                          capture_output=True, text=True)
+
+
+def test_varios_workers_sin_secreto_no_arranca():
+    resultado = _importar_main(WEB_CONCURRENCY="2")
+    assert resultado.returncode != 0
+    assert "TOKENS_SECRETO" in resultado.stderr
+
+
+def test_un_worker_sin_secreto_solo_avisa():
+    assert _importar_main(WEB_CONCURRENCY="1").returncode == 0
+    assert _importar_main(WEB_CONCURRENCY="2", TOKENS_SECRETO="secreto").returncode == 0
@@ -0,0 +1,95 @@
+"""
+Presupuesto de comandos de Mongo por petición en los endpoints de pedidos.
+Si un cambio agrega una lectura extra (p. ej. volver a leer lo que se acaba
+de escribir), la prueba falla; si se baja un presupuesto, actualizarlo aquí.
+"""
+import main
+
+PRESUPUESTO = {
+    "POST /pedidos": 3,             # usuario + productos ($in) + insert
+    "GET /pedidos": 1,              # un find paginado
+    "GET /pedidos/{pedido_id}/detalle": 1,  # aggregate con $lookup
+    "PATCH pagado": 6,              # lectura + estado + stock (bulk + limpieza) + rollup + versión del catálogo
+    "PATCH preparando": 1,          # findAndModify condicionado al estado de origen
+}
+
+
+async def _datos(api):
+    almacen = main.almacen
+    productos = await almacen.productos.crear_varios([
+        {"nombre": "Hot Dog", "precio": 2500.0, "stock": 100, "disponible": True},
+        {"nombre": "Completo", "precio": 2800.0, "stock": 100, "disponible": True},
+    ])
+    usuario = await almacen.usuarios.crear(
+        {"nombre": "Cliente", "email": "cliente@doggys.com", "password": "x", "is_admin": False}
+    )
+    admin = await almacen.usuarios.crear(
+        {"nombre": "Admin", "email": "admin@doggys.com", "password": "x", "is_admin": True}
+    )
+    cliente = {"Authorization": "Bearer " + main.tokens.emitir(str(usuario["_id"]), False)}
+    administrador = {"Authorization": "Bearer " + main.tokens.emitir(str(admin["_id"]), True)}
+    return [str(p["_id"]) for p in productos], str(usuario["_id"]), cliente, administrador
+
+
+async def _crear_pedido(api, productos, usuario_id, headers):
+    payload = {"usuario_id": usuario_id, "items": [{"producto_id": pid, "cantidad": 2} for pid in productos]}
+    return await api.pedir("POST", "/pedidos", "/pedidos", json=payload, headers=headers)
+
+
+def test_crear_pedido(api):
+    async def escenario(api):
+        productos, usuario_id, cliente, _ = await _datos(api)
+        respuesta, comandos = await _crear_pedido(api, productos, usuario_id, cliente)
+        assert respuesta.status_code == 201
+        assert comandos <= PRESUPUESTO["POST /pedidos"]
+
+    api(escenario)
+
+
+def test_listar_pedidos(api):
+    async def escenario(api):
+        productos, usuario_id, cliente, _ = await _datos(api)
+        for _ in range(3):
+            await _crear_pedido(api, productos, usuario_id, cliente)
+        respuesta, comandos = await api.pedir(
+            "GET", f"/pedidos?usuario_id={usuario_id}", "/pedidos", headers=cliente
+        )
+        assert respuesta.status_code == 200
+        assert len(respuesta.json()) == 3
+        assert comandos <= PRESUPUESTO["GET /pedidos"]
+
+    api(escenario)
+
+
+def test_detalle_pedido(api):
+    async def escenario(api):
+        productos, usuario_id, cliente, _ = await _datos(api)
+        pedido = (await _crear_pedido(api, productos, usuario_id, cliente))[0].json()
+        respuesta, comandos = await api.pedir(
+            "GET", f"/pedidos/{pedido['id']}/detalle", "/pedidos/{pedido_id}/detalle", headers=cliente
+        )
+        assert respuesta.status_code == 200
+        assert comandos <= PRESUPUESTO["GET /pedidos/{pedido_id}/detalle"]
+
+    api(escenario)
+
+
+def test_cambiar_estado(api):
+    async def escenario(api):
+        productos, usuario_id, cliente, administrador = await _datos(api)
+        pedido = (await _crear_pedido(api, productos, usuario_id, cliente))[0].json()
+        ruta = "/pedidos/{pedido_id}/estado"
+
+        respuesta, comandos = await api.pedir(
+            "PATCH", f"/pedidos/{pedido['id']}/estado?nuevo_estado=pagado", ruta, headers=cliente
+        )
+        assert respuesta.status_code == 200
+        assert comandos <= PRESUPUESTO["PATCH pagado"]
+
+        respuesta, comandos = await api.pedir(
+            "PATCH", f"/pedidos/{pedido['id']}/estado?nuevo_estado=preparando", ruta, headers=administrador
+        )
+        assert respuesta.status_code == 200
+        assert comandos <= PRESUPUESTO["PATCH preparando"]
+
+    api(escenario)
@@ -0,0 +1,98 @@
+"""
+Máquina de estados de los pedidos (TRANSICIONES en models/pedido.py): 409
+para transiciones inválidas, 422 para estados desconocidos, resultado por
+pedido en el cambio masivo y migración de estados antiguos en mayúsculas.
+"""
+from datetime import datetime
+
+import main
+from data.mongo import MongoAlmacen
+from utiles import crear_pedido, sembrar
+
+
+def _estado(pedido, nuevo):
+    return f"/pedidos/{pedido['id']}/estado?nuevo_estado={nuevo}"
+
+
+def test_transicion_invalida_es_409(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pedido = await crear_pedido(http, datos)
+
+        respuesta = await http.patch(_estado(pedido, "entregado"), headers=datos.h_admin)
+        assert respuesta.status_code == 409
+
+        await http.patch(_estado(pedido, "anulado"), headers=datos.h_cliente)
+        respuesta = await http.patch(_estado(pedido, "pagado"), headers=datos.h_cliente)
+        assert respuesta.status_code == 409
+
+    app(escenario)
+
+
+def test_estado_desconocido_es_422(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pedido = await crear_pedido(http, datos)
+
+        respuesta = await http.patch(_estado(pedido, "volando"), headers=datos.h_admin)
+        assert respuesta.status_code == 422
+        # Un pedido nuevo solo puede nacer pendiente
+        cuerpo = {"items": [{"producto_id": datos.productos[0], "cantidad": 1}], "estado": "pagado"}
+        respuesta = await http.post("/pedidos", json=cuerpo, headers=datos.h_cliente)
+        assert respuesta.status_code == 422
+        respuesta = await http.patch(
+            "/pedidos/bulk/estado", json={"ids": [pedido["id"]], "nuevo_estado": "volando"}, headers=datos.h_admin
+        )
+        assert respuesta.status_code == 422
+
+    app(escenario)
+
+
+def test_bulk_informa_los_pedidos_sin_cambio(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pagado, pendiente, preparando = [await crear_pedido(http, datos) for _ in range(3)]
+        for pedido in (pagado, preparando):
+            await http.patch(_estado(pedido, "pagado"), headers=datos.h_cliente)
+        await http.patch(_estado(preparando, "preparando"), headers=datos.h_admin)
+        inexistente = "f" * 24 if isinstance(main.almacen, MongoAlmacen) else "999999"
+
+        ids = [pagado["id"], pendiente["id"], preparando["id"], "no-es-id", inexistente]
+        respuesta = await http.patch(
+            "/pedidos/bulk/estado", json={"ids": ids, "nuevo_estado": "preparando"}, headers=datos.h_admin
+        )
+        assert respuesta.status_code == 200
+        resultados = {r["id"]: r for r in respuesta.json()}
+
+        assert resultados[pagado["id"]]["ok"]
+        assert resultados[preparando["id"]]["ok"]  # ya estaba: no es error
+        assert not resultados[pendiente["id"]]["ok"]
+        assert "no puede pasar a preparando" in resultados[pendiente["id"]]["error"]
+        assert resultados["no-es-id"]["error"] == "ID inválido"
+        assert resultados[inexistente]["error"] == "Pedido no encontrado"
+
+        pedido = await http.get(f"/pedidos/{pendiente['id']}", headers=datos.h_cliente)
+        assert pedido.json()["estado"] == "pendiente"
+
+    app(escenario)
+
+
+def test_normalizar_estados_migra_mayusculas(app):
+    async def escenario(http):
+        pedidos = main.almacen.pedidos
+        fecha = datetime.now().isoformat()
+        docs = [
+            await pedidos.crear({"usuario_id": None, "items": [], "total": 0.0, "fecha": fecha, "estado": estado})
+            for estado in ("Pagado", "PENDIENTE", "pendiente", "Desconocido")
+        ]
+
+        cambiados = await pedidos.normalizar_estados([e.value for e in main.EstadoPedido])
+
+        assert cambiados == 2
+        estados = [(await pedidos.obtener(doc["_id"]))["estado"] for doc in docs]
+        assert estados == ["pagado", "pendiente", "pendiente", "Desconocido"]
+        # Los índices / consultas por estado ven el estado nuevo
+        assert [d["_id"] for d in await pedidos.cola(["pagado"], 10)] == [docs[0]["_id"]]
+        assert await pedidos.normalizar_estados([e.value for e in main.EstadoPedido]) == 0
+
+    app(escenario)
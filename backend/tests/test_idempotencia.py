@@ -0,0 +1,121 @@
+"""
+Idempotency-Key en POST /pedidos y POST /boletas (services/idempotencia.py):
+repetición de la respuesta, clave reutilizada con otro contenido, peticiones
+concurrentes con la misma clave y reserva vencida de un worker caído.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from services.idempotencia import Idempotencia
+from utiles import sembrar
+
+
+def _cuerpo(datos, cantidad=1) -> dict:
+    return {"items": [{"producto_id": datos.productos[0], "cantidad": cantidad}]}
+
+
+async def _cantidad_pedidos(http, datos) -> int:
+    return len((await http.get("/pedidos", headers=datos.h_cliente)).json())
+
+
+def test_misma_clave_devuelve_la_respuesta_guardada(app):
+    async def escenario(http):
+        datos = await sembrar()
+        headers = {**datos.h_cliente, "Idempotency-Key": "pedido-1"}
+
+        primera = await http.post("/pedidos", json=_cuerpo(datos), headers=headers)
+        repetida = await http.post("/pedidos", json=_cuerpo(datos), headers=headers)
+
+        assert primera.status_code == repetida.status_code == 201
+        assert "Idempotent-Replayed" not in primera.headers
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+        assert repetida.json() == primera.json()
+        assert await _cantidad_pedidos(http, datos) == 1
+
+    app(escenario)
+
+
+def test_misma_clave_con_otro_contenido_es_422(app):
+    async def escenario(http):
+        datos = await sembrar()
+        headers = {**datos.h_cliente, "Idempotency-Key": "pedido-1"}
+
+        await http.post("/pedidos", json=_cuerpo(datos), headers=headers)
+        respuesta = await http.post("/pedidos", json=_cuerpo(datos, cantidad=2), headers=headers)
+
+        assert respuesta.status_code == 422
+        assert await _cantidad_pedidos(http, datos) == 1
+
+    app(escenario)
+
+
+async def _trabajo_lento(llamadas: list, liberar: asyncio.Event):
+    llamadas.append(1)
+    await liberar.wait()
+    return 201, b'{"id": "1"}'
+
+
+@pytest.mark.parametrize("workers", [1, 2], ids=["mismo_worker", "otro_worker"])
+def test_peticiones_concurrentes_ejecutan_una_vez(app, workers):
+    async def escenario(http):
+        # Con dos workers cada uno tiene su Idempotencia y solo comparten el repo
+        instancias = [Idempotencia(espera=0.01) for _ in range(workers)]
+        repo = main.almacen.idempotencia
+        llamadas, liberar = [], asyncio.Event()
+
+        primera = asyncio.ensure_future(
+            instancias[0].ejecutar(repo, "clave", "huella", lambda: _trabajo_lento(llamadas, liberar))
+        )
+        await asyncio.sleep(0.02)
+        segunda = asyncio.ensure_future(
+            instancias[-1].ejecutar(repo, "clave", "huella", lambda: _trabajo_lento(llamadas, liberar))
+        )
+        await asyncio.sleep(0.05)
+        assert not segunda.done()  # espera al original en vez de ejecutarlo otra vez
+
+        liberar.set()
+        assert await primera == (201, b'{"id": "1"}', False)
+        assert await segunda == (201, b'{"id": "1"}', True)
+        assert len(llamadas) == 1
+
+    app(escenario)
+
+
+def test_reserva_vencida_se_toma(app):
+    async def escenario(http):
+        repo = main.almacen.idempotencia
+        # Un worker reservó la clave y se cayó antes de completarla
+        vencida = datetime.now(timezone.utc) - timedelta(seconds=1)
+        assert await repo.reservar("clave", "huella", vencida) is None
+
+        llamadas = []
+
+        async def trabajo():
+            llamadas.append(1)
+            return 201, b"{}"
+
+        resultado = await Idempotencia().ejecutar(repo, "clave", "huella", trabajo)
+        assert resultado == (201, b"{}", False)
+        assert len(llamadas) == 1
+
+    app(escenario)
+
+
+def test_reserva_vigente_con_otro_contenido_es_422(app):
+    async def escenario(http):
+        repo = main.almacen.idempotencia
+        vigente = datetime.now(timezone.utc) + timedelta(seconds=30)
+        await repo.reservar("clave", "huella", vigente)
+
+        async def trabajo():
+            raise AssertionError("no se debe ejecutar")
+
+        with pytest.raises(HTTPException) as error:
+            await Idempotencia().ejecutar(repo, "clave", "otra", trabajo)
+        assert error.value.status_code == 422
+
+    app(escenario)
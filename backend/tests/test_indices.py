@@ -0,0 +1,65 @@
+"""
+Los índices de data/db.py siguen a los registros al reemplazarlos,
+modificarlos en el lugar (tabla.guardar) o borrarlos.
+"""
+import asyncio
+
+from data.db import IndiceHash, IndiceTexto, Tabla
+from data.memoria import MemoriaAlmacen
+
+
+def _tabla() -> Tabla:
+    return Tabla(email=IndiceHash("email"), nombre=IndiceTexto("nombre"))
+
+
+def _usuario(nombre: str, email: str) -> dict:
+    return {"nombre": nombre, "email": email}
+
+
+def test_indices_al_reemplazar_modificar_y_borrar():
+    tabla = _tabla()
+    email, nombre = tabla.indices["email"], tabla.indices["nombre"]
+    a, b = tabla.nuevo_id(), tabla.nuevo_id()
+    tabla.filas[a] = _usuario("Ana Pérez", "ana@doggys.com")
+    tabla.filas[b] = _usuario("Beto Soto", "beto@doggys.com")
+
+    tabla.filas[a] = _usuario("Ana Rojas", "ana.rojas@doggys.com")
+    assert email.buscar("ana@doggys.com") == set()
+    assert email.primero("ana.rojas@doggys.com") == a
+    assert nombre.buscar("pérez") == []
+    assert nombre.buscar("rojas") == [a]
+
+    # Cambio en el lugar: solo se ve en los índices después de guardar()
+    tabla.filas[b]["nombre"] = "Beto Lagos"
+    tabla.guardar(b)
+    assert nombre.buscar("soto") == []
+    assert nombre.buscar("lagos") == [b]
+
+    del tabla.filas[a]
+    assert email.buscar("ana.rojas@doggys.com") == set()
+    assert nombre.buscar("ana") == []
+    assert tabla.filas.pop(b)["nombre"] == "Beto Lagos"
+    assert nombre.buscar("beto") == []
+
+    tabla.filas[tabla.nuevo_id()] = _usuario("Caro", "caro@doggys.com")
+    tabla.filas.clear()
+    assert email.buscar("caro@doggys.com") == set()
+    assert nombre.buscar("car") == []
+
+
+def test_repos_en_memoria_mantienen_los_indices():
+    async def escenario():
+        almacen = MemoriaAlmacen()
+        producto = await almacen.productos.crear({"nombre": "Hot Dog", "precio": 2500.0, "stock": 1})
+        await almacen.productos.actualizar(producto["_id"], {"nombre": "Italiano"})
+        assert await almacen.productos.listar("hot", 0, 10) == []
+        assert [p["_id"] for p in await almacen.productos.listar("ital", 0, 10)] == [producto["_id"]]
+        await almacen.productos.eliminar(producto["_id"])
+        assert await almacen.productos.listar("ital", 0, 10) == []
+
+        usuario = await almacen.usuarios.crear({"nombre": "Ana", "email": "ana@doggys.com", "password": "x"})
+        await almacen.usuarios.actualizar(usuario["_id"], {"email": "ana.rojas@doggys.com"})
+        assert await almacen.usuarios.por_email("ana@doggys.com") is None
+        assert (await almacen.usuarios.por_email("ana.rojas@doggys.com"))["_id"] == usuario["_id"]
+
+    asyncio.run(escenario())
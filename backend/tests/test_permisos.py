@@ -0,0 +1,83 @@
+"""
+Los datos de un cliente (su usuario, sus pedidos, sus boletas y los eventos
+de sus pedidos) solo los ven él y los administradores.
+"""
+from utiles import crear_pedido, sembrar
+
+
+def test_sin_sesion_responde_401(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pedido = await crear_pedido(http, datos)
+        rutas = [
+            ("POST", "/pedidos", {"items": [{"producto_id": datos.productos[0], "cantidad": 1}]}),
+            ("GET", f"/pedidos/{pedido['id']}", None),
+            ("GET", f"/pedidos/{pedido['id']}/detalle", None),
+            ("GET", f"/pedidos/{pedido['id']}/eventos", None),
+            ("GET", f"/usuarios/{datos.cliente['_id']}", None),
+            ("POST", "/boletas", {"pedido_id": pedido["id"]}),
+        ]
+        for metodo, ruta, cuerpo in rutas:
+            respuesta = await http.request(metodo, ruta, json=cuerpo)
+            assert respuesta.status_code == 401, ruta
+
+    app(escenario)
+
+
+def test_otro_cliente_responde_403(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pedido = await crear_pedido(http, datos)
+        await http.patch(f"/pedidos/{pedido['id']}/estado?nuevo_estado=pagado", headers=datos.h_cliente)
+        token = datos.h_otro["Authorization"].split()[1]
+        rutas = [
+            ("GET", f"/pedidos/{pedido['id']}", None),
+            ("GET", f"/pedidos/{pedido['id']}/detalle", None),
+            ("GET", f"/pedidos/{pedido['id']}/eventos?access_token={token}", None),
+            ("GET", f"/usuarios/{datos.cliente['_id']}", None),
+            ("POST", "/boletas", {"pedido_id": pedido["id"]}),
+        ]
+        for metodo, ruta, cuerpo in rutas:
+            headers = None if "access_token" in ruta else datos.h_otro
+            respuesta = await http.request(metodo, ruta, json=cuerpo, headers=headers)
+            assert respuesta.status_code == 403, ruta
+
+        for headers in (datos.h_cliente, datos.h_admin):
+            respuesta = await http.get(f"/pedidos/{pedido['id']}/detalle", headers=headers)
+            assert respuesta.status_code == 200
+
+    app(escenario)
+
+
+def test_el_pedido_queda_a_nombre_de_la_sesion(app):
+    async def escenario(http):
+        datos = await sembrar()
+        items = [{"producto_id": datos.productos[0], "cantidad": 1}]
+
+        respuesta = await http.post("/pedidos", json={"items": items}, headers=datos.h_cliente)
+        assert respuesta.status_code == 201
+        assert respuesta.json()["usuario_id"] == str(datos.cliente["_id"])
+
+        ajeno = {"usuario_id": str(datos.otro["_id"]), "items": items}
+        respuesta = await http.post("/pedidos", json=ajeno, headers=datos.h_cliente)
+        assert respuesta.status_code == 403
+        respuesta = await http.post("/pedidos", json=ajeno, headers=datos.h_admin)
+        assert respuesta.status_code == 201
+        assert respuesta.json()["usuario_id"] == str(datos.otro["_id"])
+
+    app(escenario)
+
+
+def test_idempotencia_por_usuario(app):
+    async def escenario(http):
+        datos = await sembrar()
+        pedido = await crear_pedido(http, datos)
+        await http.patch(f"/pedidos/{pedido['id']}/estado?nuevo_estado=pagado", headers=datos.h_cliente)
+        clave = {"Idempotency-Key": f"boleta-{pedido['id']}"}
+
+        respuesta = await http.post("/boletas", json={"pedido_id": pedido["id"]}, headers={**datos.h_cliente, **clave})
+        assert respuesta.status_code == 201
+        respuesta = await http.post("/boletas", json={"pedido_id": pedido["id"]}, headers={**datos.h_otro, **clave})
+        assert respuesta.status_code == 403
+
+    app(escenario)
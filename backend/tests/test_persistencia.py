@@ -0,0 +1,140 @@
+"""
+data/persistencia.py recupera el estado después de una caída: reproduce el
+journal (descartando un frame incompleto o corrupto al final) encima del
+último snapshot, y reconstruye los índices.
+"""
+import os
+
+from data.db import IndiceHash, IndiceTexto, Tabla
+from data.persistencia import SNAPSHOT, Persistencia
+
+
+def _tabla() -> Tabla:
+    return Tabla(email=IndiceHash("email"), nombre=IndiceTexto("nombre"))
+
+
+def _usuario(nombre: str, email: str) -> dict:
+    return {"nombre": nombre, "email": email}
+
+
+def _abrir(directorio, fsync_ms: float = 0) -> tuple:
+    tablas = {"usuarios": _tabla()}
+    persistencia = Persistencia(str(directorio), tablas, fsync_ms=fsync_ms, snapshot_cada=10_000)
+    stats = persistencia.abrir()
+    return tablas["usuarios"], persistencia, stats
+
+
+def _caer(persistencia: Persistencia) -> None:
+    """Como si el proceso muriera: sin snapshot de cierre ni escribir lo pendiente."""
+    persistencia._detener.set()
+    if persistencia._hilo:
+        persistencia._hilo.join()
+    persistencia._journal.close()
+    persistencia._liberar_directorio()
+
+
+def _journal(directorio) -> str:
+    nombres = [n for n in os.listdir(directorio) if n.startswith("journal-")]
+    assert len(nombres) == 1
+    return os.path.join(directorio, nombres[0])
+
+
+def _cargar_ejemplo(tabla: Tabla) -> None:
+    for nombre in ("Ana", "Beto", "Caro"):
+        tabla.filas[tabla.nuevo_id()] = _usuario(nombre, f"{nombre.lower()}@doggys.com")
+    tabla.filas[1]["nombre"] = "Ana Rojas"
+    tabla.guardar(1)
+    del tabla.filas[3]  # el último: su id no se tiene que reutilizar
+
+
+def test_journal_se_reproduce_despues_de_una_caida(tmp_path):
+    tabla, persistencia, _ = _abrir(tmp_path)
+    _cargar_ejemplo(tabla)
+    _caer(persistencia)
+
+    tabla, persistencia, stats = _abrir(tmp_path)
+    assert stats["snapshot"] == 0 and stats["journal"] == 5
+    assert dict(tabla.filas) == {
+        1: _usuario("Ana Rojas", "ana@doggys.com"),
+        2: _usuario("Beto", "beto@doggys.com"),
+    }
+    assert tabla.indices["nombre"].buscar("rojas") == [1]
+    assert tabla.indices["email"].buscar("caro@doggys.com") == set()
+    assert tabla.nuevo_id() == 4
+    persistencia.cerrar()
+
+
+def test_frame_incompleto_al_final_se_descarta(tmp_path):
+    tabla, persistencia, _ = _abrir(tmp_path)
+    _cargar_ejemplo(tabla)
+    tabla.filas[tabla.nuevo_id()] = _usuario("Dani", "dani@doggys.com")
+    _caer(persistencia)
+
+    # La caída cortó la escritura del último frame
+    ruta = _journal(tmp_path)
+    tamano = os.path.getsize(ruta)
+    with open(ruta, "r+b") as f:
+        f.truncate(tamano - 5)
+
+    tabla, persistencia, stats = _abrir(tmp_path)
+    assert stats["journal"] == 5
+    assert sorted(tabla.filas) == [1, 2]
+    assert tabla.indices["email"].buscar("dani@doggys.com") == set()
+    # El resto del frame se recorta: lo que se escriba ahora queda legible
+    assert os.path.getsize(ruta) < tamano - 5
+    tabla.filas[tabla.nuevo_id()] = _usuario("Eli", "eli@doggys.com")
+    _caer(persistencia)
+
+    tabla, persistencia, _ = _abrir(tmp_path)
+    assert [r["nombre"] for r in tabla.filas.values()] == ["Ana Rojas", "Beto", "Eli"]
+    persistencia.cerrar()
+
+
+def test_frame_corrupto_al_final_se_descarta(tmp_path):
+    tabla, persistencia, _ = _abrir(tmp_path)
+    _cargar_ejemplo(tabla)
+    tabla.filas[tabla.nuevo_id()] = _usuario("Dani", "dani@doggys.com")
+    _caer(persistencia)
+
+    ruta = _journal(tmp_path)
+    with open(ruta, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        ultimo = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([ultimo[0] ^ 0xFF]))
+
+    tabla, persistencia, _ = _abrir(tmp_path)
+    assert sorted(tabla.filas) == [1, 2]
+    persistencia.cerrar()
+
+
+def test_snapshot_mas_journal_despues_de_una_caida(tmp_path):
+    tabla, persistencia, _ = _abrir(tmp_path)
+    _cargar_ejemplo(tabla)
+    persistencia.snapshot()
+    tabla.filas[2] = _usuario("Beto Lagos", "beto@doggys.com")
+    tabla.filas[tabla.nuevo_id()] = _usuario("Dani", "dani@doggys.com")
+    _caer(persistencia)
+    # Un snapshot a medio escribir cuando se cayó no se usa
+    with open(os.path.join(tmp_path, SNAPSHOT + ".tmp"), "wb") as f:
+        f.write(b"\x80incompleto")
+
+    tabla, persistencia, stats = _abrir(tmp_path)
+    assert stats["snapshot"] == 2 and stats["journal"] == 2
+    assert [r["nombre"] for r in tabla.filas.values()] == ["Ana Rojas", "Beto Lagos", "Dani"]
+    assert tabla.indices["nombre"].buscar("lagos") == [2]
+    assert list(tabla.filas) == [1, 2, 4]
+    persistencia.cerrar()
+
+
+def test_commit_en_grupo_pierde_solo_lo_no_sincronizado(tmp_path):
+    # fsync_ms grande: el hilo no alcanza a escribir, solo el sincronizar() explícito
+    tabla, persistencia, _ = _abrir(tmp_path, fsync_ms=60_000)
+    _cargar_ejemplo(tabla)
+    persistencia.sincronizar()
+    tabla.filas[tabla.nuevo_id()] = _usuario("Dani", "dani@doggys.com")
+    _caer(persistencia)
+
+    tabla, persistencia, _ = _abrir(tmp_path)
+    assert sorted(tabla.filas) == [1, 2]
+    persistencia.cerrar()
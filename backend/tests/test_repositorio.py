@@ -0,0 +1,23 @@
+"""Las interfaces de data/repositorio.py obligan a los motores a implementarlas completas."""
+import pytest
+
+from data.repositorio import Almacen, PedidosRepo
+
+
+def test_motor_incompleto_falla_al_construir():
+    class PedidosIncompleto(PedidosRepo):
+        async def crear(self, doc: dict) -> dict:
+            return doc
+
+    with pytest.raises(TypeError, match="pagar"):
+        PedidosIncompleto()
+    with pytest.raises(TypeError):
+        Almacen()
+
+
+def test_motores_completos(usar_almacen):
+    for motor in ("memoria", "mongomock"):
+        almacen = usar_almacen(motor)
+        for repo in ("usuarios", "productos", "pedidos", "boletas", "idempotencia",
+                     "candados", "ventas", "revocaciones", "versiones"):
+            assert getattr(almacen, repo) is not None
@@ -0,0 +1,138 @@
+"""
+Reserva de stock al pagar: sin sobreventa con pagos concurrentes y con
+compensación (stock, marcas y estado) cuando el pago falla a medias.
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import main
+from utiles import crear_pedido, sembrar, stock
+
+
+async def _pagar(http, pedido, headers):
+    return await http.patch(f"/pedidos/{pedido['id']}/estado?nuevo_estado=pagado", headers=headers)
+
+
+async def _estado(pedido) -> str:
+    return (await main.almacen.pedidos.obtener(main.almacen.parse_id(pedido["id"])))["estado"]
+
+
+def test_pagos_concurrentes_no_sobrevenden(app):
+    async def escenario(http):
+        datos = await sembrar(stock=5, n_productos=1)
+        producto = datos.productos[0]
+        pedidos = [await crear_pedido(http, datos, {producto: 1}) for _ in range(10)]
+
+        respuestas = await asyncio.gather(*(_pagar(http, p, datos.h_cliente) for p in pedidos))
+        codigos = sorted(r.status_code for r in respuestas)
+
+        assert codigos == [200] * 5 + [400] * 5
+        assert await stock(producto) == 0
+        pagados = [p for p, r in zip(pedidos, respuestas) if r.status_code == 200]
+        for pedido in pedidos:
+            assert await _estado(pedido) == ("pagado" if pedido in pagados else "pendiente")
+
+    app(escenario)
+
+
+def test_pago_sin_stock_en_una_linea_devuelve_las_demas(app):
+    async def escenario(http):
+        datos = await sembrar(stock=10)
+        con_stock, sin_stock = datos.productos
+        pedido = await crear_pedido(http, datos, {con_stock: 3, sin_stock: 3})
+        await main.almacen.productos.actualizar(main.almacen.parse_id(sin_stock), {"stock": 2})
+
+        respuesta = await _pagar(http, pedido, datos.h_cliente)
+
+        assert respuesta.status_code == 400
+        assert await stock(con_stock) == 10
+        assert await stock(sin_stock) == 2
+        assert await _estado(pedido) == "pendiente"
+
+    app(escenario)
+
+
+class _BulkCortado:
+    """
+    Colección de productos cuyo primer bulk_write aplica solo la primera
+    operación y pierde la respuesta; los siguientes funcionan normal.
+    """
+
+    def __init__(self, col):
+        self._col = col
+        self.cortes = 1
+
+    def __getattr__(self, nombre):
+        return getattr(self._col, nombre)
+
+    async def bulk_write(self, operaciones, **kwargs):
+        if not self.cortes:
+            return await self._col.bulk_write(operaciones, **kwargs)
+        self.cortes -= 1
+        await self._col.bulk_write(operaciones[:1], **kwargs)
+        raise AutoReconnect("conexión perdida")
+
+
+class _DbCortada:
+    def __init__(self, db):
+        self._db = db
+        self.productos = _BulkCortado(db["productos"])
+
+    def __getattr__(self, nombre):
+        return getattr(self._db, nombre)
+
+    def __getitem__(self, nombre):
+        return self.productos if nombre == "productos" else self._db[nombre]
+
+
+@pytest.fixture
+def mongo(usar_almacen):
+    return usar_almacen("mongomock")
+
+
+def _ejecutar(escenario):
+    from conftest import correr
+    correr(escenario)
+
+
+def test_bulk_write_parcial_se_compensa(mongo):
+    async def escenario(http):
+        datos = await sembrar(stock=10)
+        pedido = await crear_pedido(http, datos, {pid: 2 for pid in datos.productos})
+        db = mongo.db
+        mongo.db = _DbCortada(db)
+        try:
+            with pytest.raises(AutoReconnect):
+                await _pagar(http, pedido, datos.h_cliente)
+            assert mongo.db.productos.cortes == 0
+        finally:
+            mongo.db = db
+
+        for pid in datos.productos:
+            doc = await mongo.db["productos"].find_one({"_id": mongo.parse_id(pid)})
+            assert doc["stock"] == 10
+            assert not doc.get("reservas")
+        assert await _estado(pedido) == "pendiente"
+
+    _ejecutar(escenario)
+
+
+def test_falla_en_el_rollup_devuelve_stock_y_estado(mongo, monkeypatch):
+    async def escenario(http):
+        datos = await sembrar(stock=10)
+        pedido = await crear_pedido(http, datos)
+
+        async def sumar_roto(*args, **kwargs):
+            raise RuntimeError("rollup caído")
+
+        monkeypatch.setattr(mongo.ventas, "sumar", sumar_roto)
+        with pytest.raises(RuntimeError):
+            await _pagar(http, pedido, datos.h_cliente)
+
+        for pid in datos.productos:
+            assert await stock(pid) == 10
+        assert await _estado(pedido) == "pendiente"
+
+    _ejecutar(escenario)
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import main
+
+# Datos de prueba comunes: se crean directo en main.almacen y los tokens se
+# firman con main.tokens, sin pasar por el login (bcrypt es lento a propósito).
+
+
+def bearer(usuario: dict) -> dict:
+    token = main.tokens.emitir(str(usuario["_id"]), bool(usuario.get("is_admin")))
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def sembrar(stock: int = 100, n_productos: int = 2) -> SimpleNamespace:
+    almacen = main.almacen
+    productos = await almacen.productos.crear_varios([
+        {"nombre": f"Producto {i}", "precio": 2500.0, "stock": stock, "disponible": True}
+        for i in range(n_productos)
+    ])
+    cliente = await almacen.usuarios.crear(
+        {"nombre": "Cliente", "email": "cliente@doggys.com", "password": "x", "is_admin": False}
+    )
+    otro = await almacen.usuarios.crear(
+        {"nombre": "Otro", "email": "otro@doggys.com", "password": "x", "is_admin": False}
+    )
+    admin = await almacen.usuarios.crear(
+        {"nombre": "Admin", "email": "admin@doggys.com", "password": "x", "is_admin": True}
+    )
+    return SimpleNamespace(
+        productos=[str(p["_id"]) for p in productos],
+        cliente=cliente, otro=otro, admin=admin,
+        h_cliente=bearer(cliente), h_otro=bearer(otro), h_admin=bearer(admin),
+    )
+
+
+async def crear_pedido(http, datos, cantidades=None, headers=None) -> dict:
+    """Pedido del cliente con {producto_id: cantidad} (por defecto, 1 de cada producto)."""
+    cantidades = cantidades or {pid: 1 for pid in datos.productos}
+    respuesta = await http.post("/pedidos", headers=headers or datos.h_cliente, json={
+        "usuario_id": str(datos.cliente["_id"]),
+        "items": [{"producto_id": pid, "cantidad": c} for pid, c in cantidades.items()],
+    })
+    assert respuesta.status_code == 201, respuesta.text
+    return respuesta.json()
+
+
+async def stock(producto_id: str) -> int:
+    return (await main.almacen.productos.obtener(main.almacen.parse_id(producto_id)))["stock"]
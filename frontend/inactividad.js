@@ -32,6 +32,8 @@ function cerrarSesion() {
   localStorage.removeItem('usuario_rol');
   localStorage.removeItem('carrito');
   localStorage.removeItem('pedido_id');
+  localStorage.removeItem('access_token');
+  localStorage.removeItem('refresh_token');
 
   // Redirigir al inicio (puede ser login.html si prefieres)
   window.location.href = 'index.html';
@@ -20,41 +20,36 @@ async function cargarDatosBoleta() {
   }
 
   try {
-    // ===== 1. OBTENER PEDIDO =====
-    const resPedido = await fetch(`http://127.0.0.1:8000/pedidos/${pedidoId}`);
-    if (!resPedido.ok) throw new Error("Error al cargar pedido.");
+    // ===== 1. OBTENER PEDIDO + CLIENTE + PRODUCTOS + BOLETA (una sola llamada) =====
+    const resDetalle = await fetchAutenticado(`http://127.0.0.1:8000/pedidos/${pedidoId}/detalle`);
+    if (!resDetalle.ok) throw new Error("Error al cargar pedido.");
 
-    const pedido = await resPedido.json();
+    const { pedido, cliente, productos, boleta } = await resDetalle.json();
 
     document.getElementById("fechaBoleta").textContent = new Date().toLocaleString();
 
-    // ===== 2. OBTENER INFO DEL USUARIO =====
-    const usuarioRes = await fetch(`http://127.0.0.1:8000/usuarios/${pedido.usuario_id}`);
-    const usuario = await usuarioRes.json();
+    // ===== 2. INFO DEL USUARIO =====
+    document.getElementById("nombreCliente").value = (cliente && cliente.nombre) || "";
+    document.getElementById("correoCliente").value = (cliente && cliente.email) || "";
 
-    document.getElementById("nombreCliente").value = usuario.nombre || "";
-    document.getElementById("correoCliente").value = usuario.email || "";
+    // ===== 3. DETALLE DE CADA PRODUCTO =====
+    const productosPorId = {};
+    productos.forEach(p => { productosPorId[p.id] = p; });
 
-    // ===== 3. OBTENER INFO COMPLETA DE CADA PRODUCTO =====
     const tbody = document.getElementById("tablaPedido").querySelector("tbody");
     tbody.innerHTML = "";
 
     let total = 0;
 
     for (const item of pedido.items) {
-      // Intentamos usar el nombre guardado, si no, lo buscamos
+      // Usamos el nombre guardado en el pedido; si no, el del producto actual
       let nombre = item.nombre;
       let precio = item.precio_unitario || 0;
-      
+
       if (!nombre) {
-          try {
-            const resProd = await fetch(`http://127.0.0.1:8000/productos/${item.producto_id}`);
-            const producto = await resProd.json();
-            nombre = producto.nombre;
-            precio = producto.precio;
-          } catch {
-            nombre = "Producto";
-          }
+        const producto = productosPorId[item.producto_id];
+        nombre = producto ? producto.nombre : "Producto";
+        precio = producto ? producto.precio : precio;
       }
 
       const cantidad = item.cantidad;
@@ -73,6 +68,13 @@ async function cargarDatosBoleta() {
       tbody.appendChild(tr);
     }
 
+    // Si la boleta ya fue generada, se muestra su número
+    if (boleta) {
+      document.getElementById("numBoleta").textContent = boleta.id;
+      const btnGenerar = document.getElementById("btnGenerar");
+      if (btnGenerar) btnGenerar.disabled = true;
+    }
+
     document.getElementById("totalPedido").textContent = total;
 
   } catch (err) {
@@ -93,9 +95,13 @@ async function generarBoleta() {
   const pedidoId = obtenerPedidoId();
 
   try {
-    const res = await fetch("http://127.0.0.1:8000/boletas", {
+    const res = await fetchAutenticado("http://127.0.0.1:8000/boletas", {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        // Un reintento de la misma boleta devuelve la ya generada
+        "Idempotency-Key": `boleta-${pedidoId}`
+      },
       body: JSON.stringify({ pedido_id: pedidoId })
     });
 
@@ -16,7 +16,11 @@ async function cargarPedidos() {
   }
 
   try {
-    const res = await fetch(`${API}/pedidos?usuario_id=${usuarioId}`);
+    const res = await fetchAutenticado(`${API}/pedidos?usuario_id=${usuarioId}`);
+    if (res.status === 401) {
+      window.location.href = "login.html";  // sesión vencida
+      return;
+    }
     const pedidos = await res.json();
 
     tabla.innerHTML = "";
@@ -59,7 +63,7 @@ async function cancelarPedido(pedidoId) {
     const confirmacion = confirm("¿Cancelar este pedido?");
     if (!confirmacion) return;
 
-    const res = await fetch(`${API}/pedidos/${pedidoId}/estado?nuevo_estado=cancelado`, {
+    const res = await fetchAutenticado(`${API}/pedidos/${pedidoId}/estado?nuevo_estado=anulado`, {
       method: "PATCH"
     });
 
@@ -37,6 +37,25 @@ function mostrarCarritoEnCheckout() {
   document.getElementById("totalCarrito").textContent = total;
 }
 
+// =====================================================
+// Idempotency-Key del pedido
+// Se reutiliza mientras el contenido no cambie: si se reintenta el pago
+// (red lenta, doble clic) el backend devuelve el mismo pedido.
+// =====================================================
+function claveIdempotencia(payload) {
+  const contenido = JSON.stringify(payload);
+  try {
+    const guardada = JSON.parse(sessionStorage.getItem('checkout_idempotencia'));
+    if (guardada && guardada.contenido === contenido) return guardada.clave;
+  } catch {}
+
+  const clave = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+  sessionStorage.setItem('checkout_idempotencia', JSON.stringify({ contenido, clave }));
+  return clave;
+}
+
 // =====================================================
 // Procesar pago (crear pedido + marcar pagado)
 // =====================================================
@@ -67,24 +86,27 @@ async function procesarPago() {
     cantidad: item.cantidad
   }));
 
+  // El pedido queda a nombre del usuario de la sesión
   const payload = {
-    usuario_id: usuarioId,
     items: items,
     estado: 'pendiente'
   };
 
   try {
     // Crear pedido
-    const res = await fetch('http://127.0.0.1:8000/pedidos', {
+    const res = await fetchAutenticado('http://127.0.0.1:8000/pedidos', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: {
+        'Content-Type': 'application/json',
+        'Idempotency-Key': claveIdempotencia(payload)
+      },
       body: JSON.stringify(payload)
     });
 
     const pedido = await res.json();
 
     if (!res.ok) {
-      mensajeError.textContent = pedido.detail || 'Error al crear el pedido.';
+      mensajeError.textContent = (pedido.detail && pedido.detail.mensaje) || pedido.detail || 'Error al crear el pedido.';
       mensajeError.classList.remove('d-none');
       mensajeExito.classList.add('d-none');
       return false;
@@ -93,14 +115,15 @@ async function procesarPago() {
     localStorage.setItem('pedido_id', pedido.id);
 
     // Cambiar estado a pagado (descuenta stock)
-    const resEstado = await fetch(
+    const resEstado = await fetchAutenticado(
       `http://127.0.0.1:8000/pedidos/${pedido.id}/estado?nuevo_estado=pagado`,
       { method: 'PATCH' }
     );
 
     if (!resEstado.ok) {
       const err = await resEstado.json();
-      mensajeError.textContent = err.detail || 'Error al cambiar estado del pedido.';
+      // Stock insuficiente: detail = { mensaje, faltantes: [{ producto_id, nombre, pedido, disponible }] }
+      mensajeError.textContent = (err.detail && err.detail.mensaje) || err.detail || 'Error al cambiar estado del pedido.';
       mensajeError.classList.remove('d-none');
       mensajeExito.classList.add('d-none');
       return false;
@@ -108,6 +131,7 @@ async function procesarPago() {
 
     // Limpiar carrito local
     localStorage.removeItem('carrito');
+    sessionStorage.removeItem('checkout_idempotencia');
 
     mensajeExito.textContent = `Pago realizado con éxito. Pedido N° ${pedido.id}`;
     mensajeExito.classList.remove('d-none');
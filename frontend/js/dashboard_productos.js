@@ -89,14 +89,14 @@ form.addEventListener("submit", async (e) => {
 
     if (id) {
       // EDITAR (PUT)
-      res = await fetch(`${API}/${id}`, {
+      res = await fetchAutenticado(`${API}/${id}`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(payload),
       });
     } else {
       // CREAR (POST)
-      res = await fetch(API, {
+      res = await fetchAutenticado(API, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(payload),
@@ -148,7 +148,7 @@ async function eliminarProducto(id) {
   if (!confirm("¿Eliminar producto?")) return;
 
   try {
-    const res = await fetch(`${API}/${id}`, { method: "DELETE" });
+    const res = await fetchAutenticado(`${API}/${id}`, { method: "DELETE" });
     if (!res.ok) throw new Error();
 
     cargarProductos();
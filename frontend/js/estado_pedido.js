@@ -40,46 +40,72 @@ function renderItems(items) {
 }
 
 // =====================================================
-// Cargar datos iniciales
+// Mostrar un pedido recibido del backend
 // =====================================================
-async function cargarPedido() {
-  const pedidoId = obtenerPedidoId();
-  if (!pedidoId) return alert("No se encontró el ID del pedido.");
+function mostrarPedido(pedido) {
+  renderItems(pedido.items);
+  marcarEstado(pedido.estado);
+
+  // Detectar cambios
+  if (estadoAnterior && estadoAnterior !== pedido.estado) {
+    const msg = document.getElementById("msgCambio");
+    msg.classList.remove("d-none");
+    setTimeout(() => msg.classList.add("d-none"), 3000);
+  }
 
-  document.getElementById("pedidoIdTexto").textContent = pedidoId;
+  estadoAnterior = pedido.estado;
+}
 
-  try {
-    const res = await fetch(`${API_URL}/pedidos/${pedidoId}`);
-    const pedido = await res.json();
+// =====================================================
+// Nombre del cliente (se consulta una sola vez)
+// =====================================================
+let usuarioCargado = false;
+
+async function cargarUsuario(usuarioId) {
+  if (usuarioCargado) return;
+  usuarioCargado = true;
 
-    // Nombre del cliente
-    const usuarioRes = await fetch(`${API_URL}/usuarios/${pedido.usuario_id}`);
+  try {
+    const usuarioRes = await fetchAutenticado(`${API_URL}/usuarios/${usuarioId}`);
     const usuario = await usuarioRes.json();
     document.getElementById("nombreCliente").textContent = usuario.nombre;
-
-    // Tabla y estado
-    renderItems(pedido.items);
-    marcarEstado(pedido.estado);
-
-    // Detectar cambios
-    if (estadoAnterior && estadoAnterior !== pedido.estado) {
-      const msg = document.getElementById("msgCambio");
-      msg.classList.remove("d-none");
-      setTimeout(() => msg.classList.add("d-none"), 3000);
-    }
-
-    estadoAnterior = pedido.estado;
-
   } catch (err) {
     console.error(err);
-    alert("Error al cargar el pedido.");
   }
 }
 
 // =====================================================
-// Polling cada 5 segundos
+// Suscripción a eventos del pedido (Server-Sent Events)
+// El backend envía el pedido al conectar y luego solo cuando cambia.
 // =====================================================
-setInterval(cargarPedido, 5000);
+function escucharPedido() {
+  const pedidoId = obtenerPedidoId();
+  if (!pedidoId) return alert("No se encontró el ID del pedido.");
+
+  document.getElementById("pedidoIdTexto").textContent = pedidoId;
+
+  conectarEventos(pedidoId);
+}
+
+// EventSource no envía headers: el token de acceso va en la URL
+function conectarEventos(pedidoId) {
+  const token = encodeURIComponent(localStorage.getItem("access_token") || "");
+  const eventos = new EventSource(`${API_URL}/pedidos/${pedidoId}/eventos?access_token=${token}`);
+
+  eventos.addEventListener("estado", (e) => {
+    const pedido = JSON.parse(e.data);
+    cargarUsuario(pedido.usuario_id);
+    mostrarPedido(pedido);
+  });
+
+  // EventSource se reconecta solo (y vuelve a llegar el estado actual), salvo
+  // si la API la rechazó: con el token vencido se refresca y se reconecta
+  eventos.onerror = async (err) => {
+    console.error("Conexión de eventos interrumpida", err);
+    if (eventos.readyState === EventSource.CLOSED && await refrescarSesion()) {
+      conectarEventos(pedidoId);
+    }
+  };
+}
 
-// Inicial
-document.addEventListener("DOMContentLoaded", cargarPedido);
+document.addEventListener("DOMContentLoaded", escucharPedido);
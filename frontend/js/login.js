@@ -35,6 +35,7 @@ if (loginForm) {
       localStorage.setItem('usuario_id', data.usuario_id);
       localStorage.setItem('usuario_nombre', data.nombre || "");
       localStorage.setItem('usuario_email', data.email || "");
+      guardarTokens(data);  // js/sesion.js
 
       const adminFlag = data.is_admin === true;
       localStorage.setItem('is_admin', adminFlag);
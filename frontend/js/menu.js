@@ -95,7 +95,7 @@ function agregarAlCarrito(producto) {
       producto_id: producto.id,
       nombre: producto.nombre,
       precio: producto.precio,
-      img: producto.img || "",
+      img: producto.img_url ? API_BASE + producto.img_url : (producto.img || ""),
       cantidad: 1,
       subtotal: producto.precio
     });
@@ -106,6 +106,20 @@ function agregarAlCarrito(producto) {
   mostrarNotificacion(`¡${producto.nombre} agregado al carrito!`);
 }
 
+// =====================================================
+// Imagen del producto: versión servida por la API (con hash) y miniaturas
+// WebP para srcset; si no hay, el campo img tal cual
+// =====================================================
+const API_BASE = "http://127.0.0.1:8000";
+
+function imagenProducto(p, clase = "img-fluid mb-2") {
+  const src = p.img_url ? API_BASE + p.img_url : (p.img || "placeholder.jpg");
+  const srcset = (p.miniaturas || []).map(m => `${API_BASE}${m.url} ${m.ancho}w`).join(", ");
+  return `<img src="${src}" ${srcset ? `srcset="${srcset}" sizes="(max-width: 576px) 50vw, 200px"` : ""}
+               alt="${p.nombre}" loading="lazy" decoding="async"
+               class="${clase}" style="max-height: 150px; object-fit: contain;">`;
+}
+
 // =====================================================
 // Renderizar productos en el HTML
 // =====================================================
@@ -121,9 +135,7 @@ function renderProductos() {
 
     col.innerHTML = `
       <div class="product-card text-center h-100">
-          <img src="${p.img || 'placeholder.jpg'}" 
-               alt="${p.nombre}" 
-               class="img-fluid mb-2 product-img" style="max-height: 150px; object-fit: contain;">
+          ${imagenProducto(p, "img-fluid mb-2 product-img")}
 
           <h5>${p.nombre}</h5>
           <p class="fw-bold">$${p.precio}</p>
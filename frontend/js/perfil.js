@@ -13,7 +13,7 @@ async function cargarPerfil() {
   }
 
   try {
-    const res = await fetch(`http://127.0.0.1:8000/usuarios/${usuarioId}`);
+    const res = await fetchAutenticado(`http://127.0.0.1:8000/usuarios/${usuarioId}`);
     if (!res.ok) throw new Error('No se pudo obtener el usuario');
     
     const data = await res.json();
@@ -67,7 +67,7 @@ if (perfilForm) {
     };
 
     try {
-      const res = await fetch(`http://127.0.0.1:8000/usuarios/${usuarioId}`, {
+      const res = await fetchAutenticado(`http://127.0.0.1:8000/usuarios/${usuarioId}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(payload)
@@ -20,7 +20,7 @@ document.addEventListener("DOMContentLoaded", () => {
 // Cargar productos
 // ============================
 async function cargarProductos() {
-  tabla.innerHTML = "<tr><td colspan='5'>Cargando...</td></tr>";
+  tabla.innerHTML = "<tr><td colspan='6'>Cargando...</td></tr>";
 
   try {
     const res = await fetch(`${API}/productos`);
@@ -32,6 +32,7 @@ async function cargarProductos() {
       const tr = document.createElement("tr");
 
       tr.innerHTML = `
+        <td><input type="checkbox" class="seleccion" value="${prod.id}"></td>
         <td>${prod.nombre}</td>
         <td>$${prod.precio}</td>
         <td>${prod.stock}</td>
@@ -48,7 +49,7 @@ async function cargarProductos() {
 
   } catch (err) {
     console.error(err);
-    tabla.innerHTML = "<tr><td colspan='5'>Error al cargar productos</td></tr>";
+    tabla.innerHTML = "<tr><td colspan='6'>Error al cargar productos</td></tr>";
   }
 }
 
@@ -59,7 +60,7 @@ async function toggleDisponibilidad(id, estadoActual) {
   try {
     const nuevoEstado = !estadoActual;
 
-    const res = await fetch(`${API}/productos/${id}/disponible?nuevo_estado=${nuevoEstado}`, {
+    const res = await fetchAutenticado(`${API}/productos/${id}/disponible?nuevo_estado=${nuevoEstado}`, {
       method: "PATCH"
     });
 
@@ -75,3 +76,44 @@ async function toggleDisponibilidad(id, estadoActual) {
     alert("Error al actualizar disponibilidad.");
   }
 }
+
+// ============================
+// Cambio masivo de disponibilidad
+// ============================
+function seleccionarTodos(marcado) {
+  document.querySelectorAll(".seleccion").forEach(chk => (chk.checked = marcado));
+}
+
+async function cambiarSeleccionados(disponible) {
+  const ids = [...document.querySelectorAll(".seleccion:checked")].map(chk => chk.value);
+  if (!ids.length) {
+    alert("Seleccione al menos un producto.");
+    return;
+  }
+
+  try {
+    const res = await fetchAutenticado(`${API}/productos/bulk/disponible`, {
+      method: "PATCH",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ ids, disponible })
+    });
+
+    if (!res.ok) throw new Error("Error en backend");
+
+    const resultados = await res.json();
+    const fallidos = resultados.filter(r => !r.ok);
+    if (fallidos.length) {
+      alert(`No se pudieron actualizar ${fallidos.length} producto(s).`);
+    } else {
+      msg.classList.remove("d-none");
+      setTimeout(() => msg.classList.add("d-none"), 3000);
+    }
+
+    document.getElementById("seleccionarTodos").checked = false;
+    cargarProductos();
+
+  } catch (err) {
+    console.error(err);
+    alert("Error al actualizar disponibilidad.");
+  }
+}
@@ -69,6 +69,16 @@ if (registroForm) {
       localStorage.setItem('usuario_direccion', data.direccion || direccion);
       localStorage.setItem('usuario_telefono', data.telefono || telefono);
 
+      // Tokens de la sesión (js/sesion.js): el perfil y los pedidos los piden
+      const resLogin = await fetch('http://127.0.0.1:8000/usuarios/login', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ email, password })
+      });
+      if (resLogin.ok) {
+        guardarTokens(await resLogin.json());
+      }
+
       alertSuccess.textContent = 'Registro exitoso. ¡Bienvenido, ' + data.nombre + '!';
       alertSuccess.classList.remove('d-none');
       alertError.classList.add('d-none');
@@ -24,15 +24,17 @@ async function cargarReporte(filtros = {}) {
   tabla.innerHTML = "<tr><td colspan='4'>Cargando...</td></tr>";
 
   try {
-    const res = await fetch(`${API}/pedidos`);
-    const pedidos = await res.json();
+    // Rollup de ventas por día y producto (pedidos pagados, sin los anulados)
+    const params = new URLSearchParams();
 
-    // Filtrar solo pedidos válidos
-    const procesables = pedidos.filter(p =>
-      ["pagado", "entregado"].includes(p.estado)
-    );
+    const { tipo, desde, hasta } = filtros;
+    if (tipo && tipo !== "todos") params.append("producto", tipo);
+    if (desde) params.append("desde", desde);
+    if (hasta) params.append("hasta", hasta);
 
-    const filas = procesarPedidos(procesables, filtros);
+    const res = await fetchAutenticado(`${API}/reportes/ventas/diarias?${params.toString()}`);
+    if (!res.ok) throw new Error("Error al obtener reporte");
+    const filas = await res.json();
 
     tabla.innerHTML = "";
 
@@ -49,7 +51,7 @@ async function cargarReporte(filtros = {}) {
         <td>${f.producto}</td>
         <td>${f.cantidad}</td>
         <td>$${f.subtotal}</td>
-        <td>${f.fecha}</td>
+        <td>${f.fecha || "-"}</td>
       `;
       tabla.appendChild(tr);
     });
@@ -60,41 +62,6 @@ async function cargarReporte(filtros = {}) {
   }
 }
 
-// ==========================
-// Procesar pedidos -> reportes
-// ==========================
-function procesarPedidos(pedidos, filtros) {
-  const { tipo, desde, hasta } = filtros;
-
-  const filas = [];
-
-  pedidos.forEach(pedido => {
-    const fecha = pedido.fecha || pedido.fecha_pedido || "2025-01-01";
-
-    // Filtro fecha
-    if (desde && fecha < desde) return;
-    if (hasta && fecha > hasta) return;
-
-    pedido.items.forEach(item => {
-
-      // Filtro por tipo
-      if (tipo !== "todos") {
-        const nombre = item.nombre.toLowerCase();
-        if (!nombre.includes(tipo)) return;
-      }
-
-      filas.push({
-        producto: item.nombre,
-        cantidad: item.cantidad,
-        subtotal: item.subtotal,
-        fecha
-      });
-    });
-  });
-
-  return filas;
-}
-
 // ==========================
 // Manejo de filtros
 // ==========================
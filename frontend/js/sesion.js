@@ -0,0 +1,81 @@
+// =====================================================
+// Sesión: tokens de la API
+// El de acceso dura pocos minutos; cuando vence, se pide uno nuevo con el
+// de refresco (que sirve una sola vez) y se reintenta la petición.
+// =====================================================
+const API_SESION = "http://127.0.0.1:8000";
+
+function guardarTokens(data) {
+  localStorage.setItem("access_token", data.access_token);
+  localStorage.setItem("refresh_token", data.refresh_token);
+}
+
+function borrarTokens() {
+  localStorage.removeItem("access_token");
+  localStorage.removeItem("refresh_token");
+}
+
+let refrescoEnCurso = null;
+
+async function pedirRefresco() {
+  const refresh = localStorage.getItem("refresh_token");
+  if (!refresh) return false;
+  try {
+    const res = await fetch(`${API_SESION}/auth/refresh`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refresh })
+    });
+    if (!res.ok) {
+      borrarTokens();
+      return false;
+    }
+    guardarTokens(await res.json());
+    return true;
+  } catch (err) {
+    console.error("Error al refrescar la sesión:", err);
+    return false;
+  }
+}
+
+// Varias peticiones con el token vencido comparten un solo refresco
+function refrescarSesion() {
+  if (!refrescoEnCurso) {
+    refrescoEnCurso = pedirRefresco().finally(() => { refrescoEnCurso = null; });
+  }
+  return refrescoEnCurso;
+}
+
+// fetch con Authorization: Bearer; ante un 401 refresca una vez y reintenta
+async function fetchAutenticado(url, opciones = {}) {
+  const enviar = () => fetch(url, {
+    ...opciones,
+    headers: {
+      ...(opciones.headers || {}),
+      Authorization: `Bearer ${localStorage.getItem("access_token") || ""}`
+    }
+  });
+
+  let res = await enviar();
+  if (res.status === 401 && await refrescarSesion()) {
+    res = await enviar();
+  }
+  return res;
+}
+
+// Revoca los tokens en la API (si falla, igual se borran localmente)
+async function cerrarSesionApi() {
+  const refresh = localStorage.getItem("refresh_token");
+  const headers = { Authorization: `Bearer ${localStorage.getItem("access_token") || ""}` };
+  const opciones = { method: "POST", headers };
+  if (refresh) {
+    headers["Content-Type"] = "application/json";
+    opciones.body = JSON.stringify({ refresh_token: refresh });
+  }
+  try {
+    await fetch(`${API_SESION}/auth/logout`, opciones);
+  } catch (err) {
+    console.error("Error al cerrar sesión:", err);
+  }
+  borrarTokens();
+}